@@ -0,0 +1,55 @@
+"""
+Construcción del dataset YOLO a partir de las carpetas por clase.
+
+Valida cada imagen en paralelo, genera los splits train/val/test con sus
+etiquetas y un manifiesto para que las siguientes ejecuciones solo procesen
+los archivos nuevos o modificados.
+
+Uso:
+    python build_dataset.py
+    python build_dataset.py --workers 8 --purge-corrupt
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Agregar el directorio de control_residuos al path
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'control_residuos'))
+
+from settings import *
+from core.dataset_builder import build_dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construcción del dataset YOLO")
+    parser.add_argument('--source', default=DATASET_SOURCE_DIR,
+                        help="Carpeta con una subcarpeta por clase")
+    parser.add_argument('--index-dir', default=DATASET_DIR,
+                        help="Carpeta con zero-indexed-files.txt y las listas por split")
+    parser.add_argument('--output', default=DATASET_BUILD_DIR)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--val-ratio', type=float, default=0.15)
+    parser.add_argument('--test-ratio', type=float, default=0.15)
+    parser.add_argument('--purge-corrupt', action='store_true',
+                        help="Borrar del origen las imágenes que no se pueden decodificar")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = build_dataset(args.source, args.index_dir, args.output,
+                            workers=args.workers,
+                            val_ratio=args.val_ratio,
+                            test_ratio=args.test_ratio,
+                            purge_corrupt=args.purge_corrupt)
+    elapsed = time.perf_counter() - start
+
+    print(f"✅ Dataset construido en {elapsed:.1f}s: {summary['yaml']}")
+    print(f"   Splits: {summary['splits']}")
+    print(f"   Nuevas/modificadas: {summary.get('built', 0)}, sin cambios: {summary.get('unchanged', 0)}, "
+          f"corruptas: {summary.get('corrupt', 0)}, eliminadas: {summary.get('removed', 0)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,459 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de extremo a extremo del pipeline de detección.
+
+Ejecuta el pipeline real (CameraCapture -> preprocesado -> inferencia de
+WasteDetector -> postproceso -> dibujo -> codificación JPEG) con una fuente
+sintética o basada en archivos, para 1..N cámaras simuladas, y escribe un
+JSON con latencias por etapa (p50/p95/p99), FPS sostenido, CPU y RSS para
+poder comparar resultados entre commits.
+
+Uso:
+    python benchmark.py --cameras 4 --duration 30 --output bench.json
+    python benchmark.py --source video.mp4 --cameras 2
+    python benchmark.py --cameras 4 --only --thread-sweep
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+import platform
+import subprocess
+import logging
+import traceback
+from datetime import datetime
+from threading import Thread, Event, Lock
+
+import cv2
+import numpy as np
+
+from settings import *
+
+# Añadir el directorio padre al path
+PARENT_DIR = os.path.dirname(BASE_DIR)
+sys.path.insert(0, PARENT_DIR)
+
+from core.capture_optimized import CameraCapture
+from core.detection import WasteDetector
+from core.thread_budget import ThreadBudget, apply_thread_limits
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format=LOG_FORMAT
+)
+logger = logging.getLogger(__name__)
+
+# Etapas medidas, en orden del pipeline. 'read_copy' es solo la copia del
+# frame sintético en memoria: no incluye la espera ni el coste de una cámara real
+STAGES = ['read_copy', 'preprocess', 'inference', 'postprocess', 'draw', 'encode']
+
+
+class SyntheticSource:
+    """
+    Fuente de frames compatible con la interfaz de cv2.VideoCapture usada por
+    CameraCapture (read/isOpened/get/set/release).
+
+    Los frames se cargan una sola vez en memoria (ruido, imágenes del dataset
+    o un video) y se reproducen en bucle, de modo que la lectura no añade
+    coste de disco al benchmark.
+    """
+
+    def __init__(self, resolution=(640, 480), source=None, max_frames=120):
+        self.resolution = resolution
+        self.frames = self._load_frames(source, max_frames)
+        self.index = 0
+        self.opened = True
+        self.read_times = []
+
+    def _load_frames(self, source, max_frames):
+        width, height = self.resolution
+        frames = []
+
+        if source is None or source == 'synthetic':
+            rng = np.random.default_rng(0)
+            for _ in range(min(max_frames, 30)):
+                frames.append(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+            return frames
+
+        if os.path.isdir(source):
+            paths = sorted(glob.glob(os.path.join(source, '**', '*.jpg'), recursive=True))
+            for path in paths[:max_frames]:
+                img = cv2.imread(path)
+                if img is not None:
+                    frames.append(cv2.resize(img, (width, height)))
+        else:
+            cap = cv2.VideoCapture(source)
+            while len(frames) < max_frames:
+                ret, img = cap.read()
+                if not ret:
+                    break
+                frames.append(cv2.resize(img, (width, height)))
+            cap.release()
+
+        if not frames:
+            raise RuntimeError(f"No se pudieron cargar frames desde {source}")
+        return frames
+
+    def read(self):
+        start = time.perf_counter()
+        frame = self.frames[self.index % len(self.frames)].copy()
+        self.index += 1
+        self.read_times.append(time.perf_counter() - start)
+        return True, frame
+
+    def isOpened(self):
+        return self.opened
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.resolution[0]
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.resolution[1]
+        return 0
+
+    def set(self, prop, value):
+        return True
+
+    def release(self):
+        self.opened = False
+
+
+class StageRecorder:
+    """Acumula duraciones (en segundos) por etapa para una cámara simulada."""
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self.lock = Lock()
+
+    def add(self, stage, duration):
+        with self.lock:
+            self.samples[stage].append(duration)
+
+    def timed(self, stage, func):
+        """Envuelve func para registrar su duración en la etapa indicada."""
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return wrapper
+
+
+def summarize(samples):
+    """Devuelve p50/p95/p99/media en milisegundos para una lista de duraciones."""
+    if not samples:
+        return {'count': 0}
+    values = np.asarray(samples) * 1000.0
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'count': int(values.size),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+    }
+
+
+def get_rss_bytes():
+    """RSS actual del proceso; usa psutil si está disponible."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        import resource
+        # ru_maxrss es el pico (KB en Linux, bytes en macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if platform.system() == 'Darwin' else peak * 1024
+    except ImportError:
+        return None
+
+
+def get_git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=BASE_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def pipeline_worker(camera, detector, recorder, stop_event, counters, quality):
+    """Bucle equivalente a _detection_loop + detection_stream para una cámara."""
+    while not stop_event.is_set():
+        frame = camera.get_frame(processed=True)
+        if frame is None:
+            time.sleep(0.005)
+            continue
+
+        start = time.perf_counter()
+        results = detector._infer(frame)
+        recorder.add('inference', time.perf_counter() - start)
+
+        start = time.perf_counter()
+        detector._process_results(results, frame)
+        recorder.add('postprocess', time.perf_counter() - start)
+
+        start = time.perf_counter()
+        overlay = detector.draw_detections(frame)
+        recorder.add('draw', time.perf_counter() - start)
+
+        start = time.perf_counter()
+        ok, _ = cv2.imencode('.jpg', overlay, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        recorder.add('encode', time.perf_counter() - start)
+
+        if ok:
+            counters['frames'] += 1
+
+
+def thread_plan(num_cameras, threads, pin=False):
+    """
+    Reparto de threads para el escenario: None (sin límites), 'auto'
+    (ThreadBudget) o un número fijo de threads por detector.
+    """
+    if threads is None:
+        return None
+    if threads == 'auto':
+        return ThreadBudget(reserved=THREAD_BUDGET_RESERVED, pin=pin).allocation(num_cameras)
+    return [(int(threads), None)] * num_cameras
+
+
+def get_thread_defaults():
+    """Threads por defecto de OpenCV, torch y BLAS, antes de aplicar ningún límite."""
+    defaults = {'cv2': cv2.getNumThreads(), 'torch': None, 'blas': None}
+    try:
+        import torch
+        defaults['torch'] = torch.get_num_threads()
+    except ImportError:
+        pass
+    try:
+        from threadpoolctl import threadpool_info
+        blas = {}
+        for info in threadpool_info():
+            api = info['user_api']
+            blas[api] = max(blas.get(api, 1), info['num_threads'])
+        defaults['blas'] = blas
+    except ImportError:
+        pass
+    return defaults
+
+
+def restore_thread_defaults(defaults):
+    """
+    Deshace los límites de apply_thread_limits de escenarios anteriores.
+
+    En modo thread los límites son del proceso y persisten entre escenarios,
+    así que los escenarios sin límites deben volver a los valores iniciales.
+    """
+    cv2.setNumThreads(defaults['cv2'])
+    if defaults['torch'] is not None:
+        import torch
+        torch.set_num_threads(defaults['torch'])
+    if defaults['blas']:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=defaults['blas'])
+
+
+def run_scenario(num_cameras, args, threads=None, thread_defaults=None):
+    """Ejecuta el pipeline con num_cameras cámaras simuladas y devuelve métricas."""
+    logger.warning(f"Escenario: {num_cameras} cámara(s), {args.duration}s, threads={threads}")
+    resolution = (CAMERA_WIDTH, CAMERA_HEIGHT)
+    cameras, detectors, recorders, sources, counters = [], [], [], [], []
+
+    for cam_id in range(num_cameras):
+        source = SyntheticSource(resolution, args.source)
+        camera = CameraCapture(camera_id=cam_id, resolution=resolution, fps=args.fps)
+        camera.cap = source  # start() no abre la cámara física si ya hay fuente
+        recorder = StageRecorder()
+        camera._preprocess_frame = recorder.timed('preprocess', camera._preprocess_frame)
+
+        detector = WasteDetector(
+            camera_id=cam_id,
+            confidence_threshold=args.confidence,
+            model_path=args.model,
+            execution_mode=args.mode
+        )
+
+        cameras.append(camera)
+        detectors.append(detector)
+        recorders.append(recorder)
+        sources.append(source)
+        counters.append({'frames': 0})
+
+    plan = thread_plan(num_cameras, threads, args.pin)
+    if plan is None:
+        if thread_defaults is not None:
+            restore_thread_defaults(thread_defaults)
+    else:
+        if args.mode == 'process':
+            for detector, (count, cpus) in zip(detectors, plan):
+                detector.set_thread_budget(count, cpus)
+        else:
+            # Modo thread: los límites son del proceso, se aplica el total una vez
+            apply_thread_limits(sum(count for count, _ in plan))
+
+    # Calentamiento del modelo para no medir la primera inferencia
+    warmup = sources[0].frames[0]
+    for detector in detectors:
+        for _ in range(args.warmup):
+            detector._infer(warmup)
+
+    stop_event = Event()
+    workers = []
+    for camera in cameras:
+        camera.start()
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+
+    for camera, detector, recorder, counter in zip(cameras, detectors, recorders, counters):
+        worker = Thread(
+            target=pipeline_worker,
+            args=(camera, detector, recorder, stop_event, counter, args.quality),
+            daemon=True
+        )
+        worker.start()
+        workers.append(worker)
+
+    time.sleep(args.duration)
+    stop_event.set()
+    for worker in workers:
+        worker.join(timeout=10)
+
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    for camera in cameras:
+        camera.stop()
+    for detector in detectors:
+        detector.stop()
+
+    per_camera = []
+    merged = {stage: [] for stage in STAGES}
+    for cam_id, (recorder, source, counter) in enumerate(zip(recorders, sources, counters)):
+        # Intervalo entre lecturas de la fuente = etapa de captura
+        recorder.samples['read_copy'] = list(source.read_times)
+        for stage in STAGES:
+            merged[stage].extend(recorder.samples[stage])
+        per_camera.append({
+            'camera_id': cam_id,
+            'fps': round(counter['frames'] / wall, 2),
+            'stages': {stage: summarize(recorder.samples[stage]) for stage in STAGES},
+        })
+
+    total_frames = sum(c['frames'] for c in counters)
+    return {
+        'cameras': num_cameras,
+        'threads': [p[0] for p in plan] if plan is not None else None,
+        'duration_s': round(wall, 3),
+        'frames': total_frames,
+        'fps_total': round(total_frames / wall, 2),
+        'fps_per_camera': round(total_frames / wall / num_cameras, 2),
+        'cpu_percent': round(100.0 * cpu / wall, 1),
+        'rss_bytes': get_rss_bytes(),
+        'stages': {stage: summarize(merged[stage]) for stage in STAGES},
+        'per_camera': per_camera,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline de detección")
+    parser.add_argument('--cameras', type=int, default=1,
+                        help="Número máximo de cámaras simuladas (se ejecuta 1..N)")
+    parser.add_argument('--only', action='store_true',
+                        help="Ejecutar solo el escenario con N cámaras")
+    parser.add_argument('--duration', type=float, default=20.0,
+                        help="Segundos de medición por escenario")
+    parser.add_argument('--warmup', type=int, default=3,
+                        help="Inferencias de calentamiento por detector")
+    parser.add_argument('--source', default='synthetic',
+                        help="'synthetic', un directorio de imágenes o un video")
+    parser.add_argument('--model', default=YOLO_MODEL_PATH)
+    parser.add_argument('--confidence', type=float, default=YOLO_CONFIDENCE)
+    parser.add_argument('--mode', choices=['thread', 'process'], default=INFERENCE_MODE,
+                        help="Ejecución de la inferencia en threads o en procesos dedicados")
+    parser.add_argument('--fps', type=int, default=CAMERA_FPS)
+    parser.add_argument('--threads', default=None,
+                        help="Threads por detector: un número o 'auto' (por defecto sin límite)")
+    parser.add_argument('--thread-sweep', action='store_true',
+                        help="Probar todos los repartos de threads y reportar el mejor")
+    parser.add_argument('--pin', action='store_true',
+                        help="Fijar cada detector a núcleos disjuntos en el modo 'auto'")
+    parser.add_argument('--quality', type=int, default=80,
+                        help="Calidad JPEG del stream")
+    parser.add_argument('--output', default=None,
+                        help="Archivo JSON de salida")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # Capturar antes de que ningún escenario limite los threads del proceso
+    thread_defaults = get_thread_defaults()
+    counts = [args.cameras] if args.only else list(range(1, args.cameras + 1))
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'commit': get_git_commit(),
+        'host': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            'model': args.model,
+            'mode': args.mode,
+            'source': args.source,
+            'resolution': [CAMERA_WIDTH, CAMERA_HEIGHT],
+            'fps': args.fps,
+            'duration_s': args.duration,
+            'quality': args.quality,
+        },
+        'scenarios': [],
+    }
+
+    try:
+        for count in counts:
+            if args.thread_sweep:
+                available = max(1, (os.cpu_count() or 1) - THREAD_BUDGET_RESERVED)
+                candidates = [None, 'auto'] + list(range(1, max(1, available // count) + 1))
+            else:
+                candidates = [args.threads]
+
+            results = []
+            for threads in candidates:
+                scenario = run_scenario(count, args, threads, thread_defaults)
+                results.append(scenario)
+                report['scenarios'].append(scenario)
+                print(f"{count} cámara(s), threads={threads}: {scenario['fps_total']} FPS total, "
+                      f"{scenario['fps_per_camera']} FPS/cámara, "
+                      f"CPU {scenario['cpu_percent']}%, "
+                      f"inferencia p95 {scenario['stages']['inference'].get('p95_ms')} ms")
+
+            if args.thread_sweep:
+                best = max(results, key=lambda r: r['fps_total'])
+                best['best'] = True
+                print(f"Mejor reparto para {count} cámara(s): threads={best['threads']} "
+                      f"({best['fps_total']} FPS total)")
+    except Exception as e:
+        logger.error(f"Error durante el benchmark: {str(e)}")
+        logger.error(traceback.format_exc())
+        sys.exit(1)
+
+    output = args.output or os.path.join(
+        LOG_DIR, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultados guardados en {output}")
+
+
+if __name__ == '__main__':
+    main()
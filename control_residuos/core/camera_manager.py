@@ -5,7 +5,6 @@ import json
 from typing import List, Dict, Tuple, Optional, Any
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class CameraManager:
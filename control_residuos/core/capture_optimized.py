@@ -5,11 +5,59 @@ import time
 import traceback
 import logging
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+from . import metrics
+from .profiling import tracer
+from .clip_recorder import ClipRecorder, jpeg_size
+
+# Importar configuración central
+from settings import *
+
+logger = logging.getLogger(__name__)
+
+# Decodificación con escalado DCT de libjpeg (factor de reducción -> flag)
+_REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+def reduction_factor(source_size, target_size):
+    """Mayor reducción (8, 4, 2) que no deja el JPEG por debajo de target_size."""
+    if source_size is None or target_size is None:
+        return 1
+    for factor in (8, 4, 2):
+        if (source_size[0] // factor >= target_size[0]
+                and source_size[1] // factor >= target_size[1]):
+            return factor
+    return 1
+
+def decode_jpeg(data, target_size=None):
+    """
+    Decodifica un JPEG directamente a la menor escala DCT que cubre
+    target_size y ajusta el resto con INTER_AREA.
+    """
+    factor = reduction_factor(jpeg_size(data), target_size)
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), _REDUCED_FLAGS[factor])
+    if frame is not None and target_size is not None and frame.shape[1::-1] != tuple(target_size):
+        frame = cv2.resize(frame, tuple(target_size), interpolation=cv2.INTER_AREA)
+    return frame
+
+def has_huffman_tables(data):
+    """
+    Indica si el JPEG incluye tablas Huffman (DHT) antes del inicio de los
+    datos; muchas cámaras MJPEG las omiten y los navegadores no siempre
+    pueden mostrarlo tal cual.
+    """
+    i = 2
+    while i + 4 <= len(data) and data[i] == 0xFF:
+        marker = data[i + 1]
+        if marker == 0xC4:
+            return True
+        if marker == 0xDA:
+            return False
+        i += 2 + int.from_bytes(data[i + 2:i + 4], 'big')
+    return False
 
 class CameraCapture:
     def __init__(self, camera_id=0, resolution=(640,480), fps=30):
@@ -26,6 +74,11 @@ class CameraCapture:
         self.cap = None
         self.frame = None
         self.processed_frame = None
+        self.raw_jpeg = None  # JPEG de la cámara sin decodificar (modo MJPEG directo)
+        self.raw_mode = False
+        self.raw_passthrough = False  # Enviar el JPEG de la cámara tal cual a los clientes
+        self.detection_size = None  # (ancho, alto) del frame de detección; None = resolución de captura
+        self._default_format = cv2.CV_8UC3  # CAP_PROP_FORMAT previo al modo MJPEG directo
         self.running = False
         self.lock = Lock()
         self.processed_lock = Lock()
@@ -33,20 +86,28 @@ class CameraCapture:
         self.frame_interval = 1.0 / fps
         self.frame_skip = 2  # Procesar 1 de cada N frames
         self.frame_count = 0
+        self.processed_pending = False  # Frame preprocesado aún no consumido
+        self.processed_seq = 0  # Número de frame del último frame preprocesado
+        self.frame_seq = 0  # Número del último frame capturado
+        self.jpeg_lock = Lock()
+        self._jpeg_locks = {}  # (calidad, tamaño) -> Lock de esa codificación
+        self._jpeg_cache = {}  # (calidad, tamaño) -> (frame_seq, bytes)
+        self.recorder = None
+        self.h264 = None  # Codificador H.264 (ver core.h264_stream), creado bajo demanda
         self.capture_thread = None
         self.process_thread = None
         
-        logging.info("\n=== Inicializando CameraCapture ===")
-        logging.info(f"- ID de cámara: {camera_id}")
-        logging.info(f"- Configuración optimizada para detección: {resolution[0]}x{resolution[1]} @ {fps}fps")
-        logging.info(f"- Frame skip: {self.frame_skip} (procesando 1 de cada {self.frame_skip} frames)")
+        logger.info("\n=== Inicializando CameraCapture ===")
+        logger.info(f"- ID de cámara: {camera_id}")
+        logger.info(f"- Configuración optimizada para detección: {resolution[0]}x{resolution[1]} @ {fps}fps")
+        logger.info(f"- Frame skip: {self.frame_skip} (procesando 1 de cada {self.frame_skip} frames)")
 
     def _configure_camera(self, cap):
         """
         Configura los parámetros de la cámara optimizados para detección.
         """
         try:
-            logging.info("Configurando propiedades optimizadas de la cámara...")
+            logger.info("Configurando propiedades optimizadas de la cámara...")
             
             # Buffer mínimo para menor latencia
             cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
@@ -61,26 +122,33 @@ class CameraCapture:
             # Formato MJPG para mejor rendimiento
             cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
             
+            if CAMERA_RAW_MJPEG:
+                # Pedir el JPEG sin decodificar (soportado por el backend V4L2);
+                # se guarda el formato original para restaurarlo si no funciona
+                self._default_format = cap.get(cv2.CAP_PROP_FORMAT)
+                cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+                cap.set(cv2.CAP_PROP_FORMAT, -1)
+            
             # Verificar configuración actual
             actual_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             actual_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
             actual_fps = int(cap.get(cv2.CAP_PROP_FPS))
             
-            logging.info("Configuración actual de la cámara:")
-            logging.info(f"- Resolución: {actual_width}x{actual_height}")
-            logging.info(f"- FPS: {actual_fps}")
-            logging.info("- Buffer Size: 1")
-            logging.info("- Formato: MJPG")
+            logger.info("Configuración actual de la cámara:")
+            logger.info(f"- Resolución: {actual_width}x{actual_height}")
+            logger.info(f"- FPS: {actual_fps}")
+            logger.info("- Buffer Size: 1")
+            logger.info("- Formato: MJPG")
             
             return True
         except Exception as e:
-            logging.error(f"Error al configurar la cámara: {str(e)}")
+            logger.error(f"Error al configurar la cámara: {str(e)}")
             return False
 
     def start(self):
         """Inicia la captura de la cámara."""
         try:
-            logging.info(f"\n=== Iniciando cámara {self.camera_id} ===")
+            logger.info(f"\n=== Iniciando cámara {self.camera_id} ===")
             
             if self.cap is None:
                 # Probar diferentes backends
@@ -91,7 +159,7 @@ class CameraCapture:
                         self.cap = cv2.VideoCapture(self.camera_id + backend)
                         
                     if self.cap.isOpened():
-                        logging.info(f"Cámara abierta con backend {backend}")
+                        logger.info(f"Cámara abierta con backend {backend}")
                         break
 
                 if not self.cap.isOpened():
@@ -102,37 +170,80 @@ class CameraCapture:
                     raise RuntimeError("Error al configurar la cámara")
 
                 # Realizar lectura de prueba
-                logging.info("Realizando lectura de prueba...")
+                logger.info("Realizando lectura de prueba...")
                 ret, frame = self.cap.read()
                 if not ret or frame is None:
                     raise RuntimeError("No se pudo obtener imagen de la cámara")
                 
-                logging.info(f"Lectura exitosa, dimensiones del frame: {frame.shape}")
+                logger.info(f"Lectura exitosa, dimensiones del frame: {frame.shape}")
+                if not self._detect_raw_mode(frame):
+                    ret, frame = self.cap.read()
+                    if not ret or frame is None or frame.ndim != 3:
+                        raise RuntimeError("No se pudo obtener imagen de la cámara tras desactivar el MJPEG directo")
             
             # Iniciar thread de captura
-            logging.info("Iniciando thread de captura...")
+            logger.info("Iniciando thread de captura...")
             self.running = True
-            self.capture_thread = Thread(target=self._capture_loop)
+            self.capture_thread = Thread(target=self._capture_loop,
+                                         name=f'capture-{self.camera_id}')
             self.capture_thread.daemon = True
             self.capture_thread.start()
             
-            logging.info("=== Cámara iniciada exitosamente ===\n")
+            if CLIPS_ENABLED and self.recorder is None:
+                self.recorder = ClipRecorder(
+                    self, CLIPS_DIR,
+                    pre_roll=CLIP_PRE_ROLL,
+                    post_roll=CLIP_POST_ROLL,
+                    fps=CLIP_FPS,
+                    quality=CLIP_JPEG_QUALITY,
+                    max_buffer_bytes=CLIP_BUFFER_MB * 1024 * 1024
+                )
+                self.recorder.start()
+            
+            logger.info("=== Cámara iniciada exitosamente ===\n")
             
         except Exception as e:
-            logging.error("\n!!! Error al iniciar la cámara !!!")
-            logging.error(f"Detalles del error: {str(e)}")
-            logging.error(traceback.format_exc())
+            logger.error("\n!!! Error al iniciar la cámara !!!")
+            logger.error(f"Detalles del error: {str(e)}")
+            logger.error(traceback.format_exc())
             if self.cap is not None:
                 self.cap.release()
                 self.cap = None
             raise RuntimeError(f"Error al iniciar la cámara: {str(e)}")
 
+    def _detect_raw_mode(self, frame):
+        """
+        Activa el modo MJPEG directo si la cámara entrega el JPEG sin decodificar.
+        
+        Si no lo entrega, restaura la conversión y el formato de self.cap para
+        que las lecturas siguientes devuelvan imágenes BGR.
+        
+        Returns:
+            bool: False si se restauró la configuración y `frame` ya no es válido
+        """
+        self.raw_mode = False
+        self.raw_passthrough = False
+        if not CAMERA_RAW_MJPEG:
+            return True
+        data = frame.tobytes()
+        if frame.ndim == 3 or data[:2] != b'\xff\xd8':
+            logger.warning("La cámara no entrega MJPEG sin decodificar; se usa la decodificación completa")
+            self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+            self.cap.set(cv2.CAP_PROP_FORMAT, self._default_format)
+            return frame.ndim == 3
+        self.raw_mode = True
+        self.raw_passthrough = has_huffman_tables(data)
+        logger.info(f"- MJPEG directo: {jpeg_size(data)}, reenvío a clientes: "
+                    f"{'sí' if self.raw_passthrough else 'no (sin tablas Huffman)'}")
+        return True
+
     def _preprocess_frame(self, frame):
         """Preprocesa el frame para detección."""
         try:
             # Mantener en BGR para la visualización, YOLO convertirá internamente
-            if frame.shape[:2] != self.resolution[::-1]:
-                frame = cv2.resize(frame, self.resolution, 
+            size = tuple(self.detection_size or self.resolution)
+            if frame.shape[1::-1] != size:
+                frame = cv2.resize(frame, size, 
                                 interpolation=cv2.INTER_AREA)
             
             # Normalizar contraste
@@ -141,7 +252,7 @@ class CameraCapture:
             return frame
             
         except Exception as e:
-            logging.error(f"Error en preprocesamiento: {str(e)}")
+            logger.error(f"Error en preprocesamiento: {str(e)}")
             return frame
 
     def _capture_loop(self):
@@ -149,6 +260,9 @@ class CameraCapture:
         frame_count = 0
         start_time = time.time()
         last_fps_time = start_time
+        last_read = None
+        camera_label = str(self.camera_id)
+        metrics.QUEUE_DEPTH.set_function(lambda: int(self.processed_pending), camera=camera_label)
         
         while self.running:
             current_time = time.time()
@@ -156,29 +270,58 @@ class CameraCapture:
             if current_time - self.last_frame_time >= self.frame_interval:
                 ret, frame = self.cap.read()
                 if ret:
+                    read_time = time.perf_counter()
+                    if last_read is not None:
+                        metrics.CAPTURE_INTERVAL.observe(read_time - last_read, camera=camera_label)
+                    last_read = read_time
+                    
+                    self.frame_count += 1
+                    raw = None
+                    if self.raw_mode:
+                        # Solo se decodifica bajo demanda y a la escala necesaria
+                        raw = frame.tobytes()
+                        frame = None
                     with self.lock:
                         self.frame = frame
+                        self.raw_jpeg = raw
+                        self.frame_seq = self.frame_count
                         
                     # Procesar solo 1 de cada N frames
-                    self.frame_count += 1
                     if self.frame_count % self.frame_skip == 0:
-                        processed = self._preprocess_frame(frame)
-                        with self.processed_lock:
-                            self.processed_frame = processed
+                        with metrics.PREPROCESS_SECONDS.time(camera=camera_label), \
+                                tracer.span('preprocess', self.frame_count, self.camera_id):
+                            if raw is not None:
+                                # Directamente al tamaño de entrada de la detección
+                                frame = decode_jpeg(raw, self.detection_size or self.resolution)
+                            processed = self._preprocess_frame(frame) if frame is not None else None
+                        if processed is None:
+                            # JPEG de la cámara corrupto
+                            metrics.CAPTURE_ERRORS.inc(camera=camera_label)
+                        else:
+                            with self.processed_lock:
+                                # El detector no llegó a consumir el frame anterior
+                                if self.processed_pending:
+                                    metrics.DROPPED_FRAMES.inc(camera=camera_label)
+                                self.processed_frame = processed
+                                self.processed_pending = True
+                                self.processed_seq = self.frame_count
                     
                     self.last_frame_time = current_time
                     
-                    # Calcular y mostrar FPS cada segundo
+                    # Calcular y mostrar FPS cada 10 segundos
                     frame_count += 1
-                    if current_time - last_fps_time >= 1.0:
+                    if current_time - last_fps_time >= 10.0:
                         fps = frame_count / (current_time - last_fps_time)
-                        logging.info(f"\rFPS captura: {fps:.1f}, " + 
-                                   f"FPS proceso: {fps/self.frame_skip:.1f}")
+                        logger.info("Cámara %s - FPS captura: %.1f, FPS proceso: %.1f",
+                                    self.camera_id, fps, fps / self.frame_skip)
                         frame_count = 0
                         last_fps_time = current_time
                         
                 else:
-                    logging.warning("No se pudo leer frame")
+                    metrics.CAPTURE_ERRORS.inc(camera=camera_label)
+                    logger.warning("No se pudo leer frame de cámara %s", self.camera_id)
+        
+        metrics.QUEUE_DEPTH.remove(camera=camera_label)
 
     def get_frame(self, processed=False):
         """
@@ -190,12 +333,40 @@ class CameraCapture:
             with self.processed_lock:
                 if self.processed_frame is None:
                     return None
+                self.processed_pending = False
                 return self.processed_frame.copy()
         else:
+            _, frame = self.latest_frame()
+            return None if frame is None else frame.copy()
+
+    def latest_frame(self, size=None):
+        """
+        Último frame capturado y su número, sin copiar: los frames no se
+        modifican una vez publicados, solo se reemplazan. En modo MJPEG
+        directo se decodifica la primera vez que se pide.
+        
+        Args:
+            size (tuple, opcional): (ancho, alto) deseado. En modo MJPEG
+                directo el JPEG se decodifica a esa escala (sin guardar el
+                resultado); si no, se devuelve el frame completo y el
+                llamador lo reduce.
+        
+        Returns:
+            tuple: (frame_seq, frame) o (None, None) si no hay frame
+        """
+        with self.lock:
+            seq, frame, raw = self.frame_seq, self.frame, self.raw_jpeg
+        if frame is None and raw is not None and size is not None:
+            frame = decode_jpeg(raw, size)
+            return (seq, frame) if frame is not None else (None, None)
+        if frame is None and raw is not None:
+            frame = decode_jpeg(raw)
             with self.lock:
-                if self.frame is None:
-                    return None
-                return self.frame.copy()
+                if self.frame_seq == seq:
+                    self.frame = frame
+        if frame is None:
+            return None, None
+        return seq, frame
 
     def get_jpeg(self, quality=95):
         """
@@ -203,27 +374,75 @@ class CameraCapture:
         Args:
             quality (int): Calidad de compresión JPEG (0-100)
         """
-        frame = self.get_frame(processed=False)
-        if frame is None:
-            return None
+        return self.latest_jpeg(quality)[1]
+
+    def latest_jpeg(self, quality=95, size=None):
+        """
+        Último frame en JPEG junto con su número de frame.
+        
+        Cada combinación de calidad y tamaño es un substream: su codificación
+        se reutiliza mientras no llegue un frame nuevo, de modo que todos los
+        clientes de un substream (y el grabador de clips) comparten un solo
+        imencode por frame, y los substreams no se bloquean entre sí.
+        
+        En modo MJPEG directo el tamaño original es el JPEG de la cámara sin
+        recodificar (se ignora `quality`) y los substreams reducidos se
+        decodifican a escala DCT en lugar de decodificar y reducir.
+        
+        Args:
+            quality (int): Calidad JPEG (0-100)
+            size (tuple, opcional): (ancho, alto) del substream; None para el tamaño original
+        
+        Returns:
+            tuple: (frame_seq, bytes) o (None, None) si no hay frame
+        """
+        key = (quality, tuple(size) if size else None)
+        with self.jpeg_lock:
+            encode_lock = self._jpeg_locks.setdefault(key, Lock())
+        with encode_lock:
+            with self.lock:
+                seq, raw = self.frame_seq, self.raw_jpeg
+            if raw is not None and key[1] is None and self.raw_passthrough:
+                return seq, raw
+            cached = self._jpeg_cache.get(key)
+            if cached is not None and cached[0] == seq:
+                return cached
+            
+            if raw is not None and key[1] is not None:
+                frame = decode_jpeg(raw, key[1])
+            else:
+                seq, frame = self.latest_frame()
+                if frame is not None and key[1] is not None and frame.shape[1::-1] != key[1]:
+                    frame = cv2.resize(frame, key[1], interpolation=cv2.INTER_AREA)
+            if frame is None:
+                return None, None
             
-        # Comprimir JPEG con calidad especificada
-        encode_params = [cv2.IMWRITE_JPEG_QUALITY, quality]
-        ret, jpeg = cv2.imencode('.jpg', frame, encode_params)
-        if ret:
-            return jpeg.tobytes()
-        return None
+            # Comprimir JPEG con calidad especificada
+            encode_params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+            with metrics.ENCODE_SECONDS.time(camera=self.camera_id):
+                ret, jpeg = cv2.imencode('.jpg', frame, encode_params)
+            if not ret:
+                return seq, None
+            data = jpeg.tobytes()
+            self._jpeg_cache[key] = (seq, data)
+            return seq, data
 
     def stop(self):
         """Detiene la captura y libera los recursos."""
-        logging.info(f"Deteniendo cámara {self.camera_id}...")
+        logger.info(f"Deteniendo cámara {self.camera_id}...")
         self.running = False
+        if self.recorder is not None:
+            self.recorder.stop()
+            self.recorder = None
+        if self.h264 is not None:
+            self.h264.stop()
+            self.h264 = None
         if self.capture_thread is not None:
             self.capture_thread.join()
         if self.cap is not None:
             self.cap.release()
             self.cap = None
-        logging.info("Cámara detenida")
+        logger.info("Cámara detenida")
 
     def __del__(self):
         """Destructor que asegura la liberación de recursos."""
@@ -0,0 +1,157 @@
+"""
+Cascada de dos etapas para la detección.
+
+Un modelo pequeño procesa todos los frames; solo las cajas con confianza
+dentro de una banda ambigua se recortan y se vuelven a clasificar con un
+modelo más grande. El CascadeRescorer es compartido por todos los detectores
+que usan el mismo modelo grande y agrupa en un mismo lote los recortes que
+llegan de distintas cámaras en una ventana corta de tiempo.
+"""
+
+import time
+import queue
+import logging
+import traceback
+from threading import Thread, Lock, Event
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+from . import metrics
+from .inference_worker import PREDICT_OPTIONS
+
+logger = logging.getLogger(__name__)
+
+
+class CascadeRescorer:
+    """Servicio de reclasificación por lotes con el modelo grande."""
+
+    def __init__(self, model_path, max_batch=8, max_wait=0.005, imgsz=None):
+        """
+        Args:
+            model_path (str): Pesos del modelo grande
+            max_batch (int): Recortes máximos por lote
+            max_wait (float): Segundos a esperar más recortes antes de inferir
+            imgsz (int, opcional): Tamaño de entrada del modelo grande
+        """
+        self.model_path = model_path
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.imgsz = imgsz
+        self.model = None
+        self.users = 0
+        self._queue = queue.Queue()
+        self._stop = Event()
+        self._thread = None
+
+    def start(self):
+        from ultralytics import YOLO
+        logger.info(f"Cargando modelo de cascada desde {self.model_path}")
+        self.model = YOLO(self.model_path)
+        self.model.fuse()
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name='cascade-rescorer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def submit(self, crop):
+        """Encola un recorte BGR; el Future devuelve (clase, confianza) o None."""
+        future = Future()
+        self._queue.put((crop, future))
+        return future
+
+    def rescore(self, crops, timeout=10):
+        """Reclasifica varios recortes y espera sus resultados."""
+        futures = [self.submit(crop) for crop in crops]
+        return [f.result(timeout) for f in futures]
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        options = dict(PREDICT_OPTIONS, conf=0.01, stream=False)
+        if self.imgsz:
+            options['imgsz'] = self.imgsz
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            crops = [cv2.cvtColor(crop, cv2.COLOR_BGR2RGB) for crop, _ in batch]
+            try:
+                with metrics.RESCORE_SECONDS.time():
+                    results = self.model.predict(source=crops, **options)
+                metrics.RESCORE_BATCH_SIZE.observe(len(batch))
+                for (_, future), r in zip(batch, results):
+                    future.set_result(self._top_prediction(r))
+            except Exception as e:
+                logger.error(f"Error en la reclasificación de cascada: {str(e)}")
+                logger.error(traceback.format_exc())
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+
+    def _top_prediction(self, result):
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return None
+        best = int(boxes.conf.argmax())
+        return self.model.names[int(boxes.cls[best])].lower(), float(boxes.conf[best])
+
+
+_rescorers = {}
+_rescorers_lock = Lock()
+
+
+def acquire_rescorer(model_path, **kwargs):
+    """Devuelve el rescorer compartido para model_path, creándolo si no existe."""
+    with _rescorers_lock:
+        rescorer = _rescorers.get(model_path)
+        if rescorer is None:
+            rescorer = CascadeRescorer(model_path, **kwargs)
+            rescorer.start()
+            _rescorers[model_path] = rescorer
+        rescorer.users += 1
+        return rescorer
+
+
+def release_rescorer(rescorer):
+    """Libera una referencia; el último detector en soltarlo lo detiene."""
+    with _rescorers_lock:
+        rescorer.users -= 1
+        if rescorer.users <= 0:
+            _rescorers.pop(rescorer.model_path, None)
+            rescorer.stop()
+
+
+def crop_box(frame, box, padding=0.1):
+    """Recorta la caja (x1, y1, x2, y2) con un margen relativo."""
+    height, width = frame.shape[:2]
+    x1, y1, x2, y2 = box
+    pad_x = (x2 - x1) * padding
+    pad_y = (y2 - y1) * padding
+    x1 = int(max(0, x1 - pad_x))
+    y1 = int(max(0, y1 - pad_y))
+    x2 = int(min(width, x2 + pad_x))
+    y2 = int(min(height, y2 + pad_y))
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return np.ascontiguousarray(frame[y1:y2, x1:x2])
@@ -0,0 +1,306 @@
+"""
+Grabación de clips de evidencia con pre-roll.
+
+Cada cámara mantiene en memoria los JPEG de los últimos segundos (los mismos
+que generan los streams, ver CameraCapture.latest_jpeg), acotados por tiempo
+y por bytes. Cuando el detector informa un evento, un thread de escritura
+vuelca el pre-roll y sigue añadiendo frames hasta POST_ROLL segundos después
+del último evento; los eventos que se solapan extienden el mismo clip.
+
+Los clips se escriben como AVI MJPEG insertando los JPEG tal cual, sin
+decodificar ni recomprimir, junto a un JSON con los eventos del clip.
+"""
+
+import os
+import json
+import time
+import queue
+import struct
+import logging
+import traceback
+from pathlib import Path
+from datetime import datetime
+from collections import deque
+from threading import Thread, Event, Lock
+
+logger = logging.getLogger(__name__)
+
+
+def jpeg_size(data):
+    """(ancho, alto) leídos del marcador SOF de un JPEG, o None."""
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        length = struct.unpack('>H', data[i + 2:i + 4])[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+
+class MjpegAviWriter:
+    """Escritor mínimo de AVI (RIFF) con frames MJPEG ya comprimidos."""
+
+    def __init__(self, path, width, height, fps):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frames = 0
+        self._index = []
+        self._max_size = 0
+        self._file = open(path, 'wb')
+        self._write_headers()
+
+    def _write_headers(self):
+        f = self._file
+        f.write(b'RIFF\0\0\0\0AVI ')
+        f.write(b'LIST' + struct.pack('<I', 4 + 64 + 12 + 64 + 48) + b'hdrl')
+        self._avih_pos = f.tell()
+        f.write(b'avih' + struct.pack('<I', 56) + self._avih())
+        f.write(b'LIST' + struct.pack('<I', 4 + 64 + 48) + b'strl')
+        self._strh_pos = f.tell()
+        f.write(b'strh' + struct.pack('<I', 56) + self._strh())
+        f.write(b'strf' + struct.pack('<I', 40) + struct.pack(
+            '<IiiHH4sIiiII', 40, self.width, self.height, 1, 24, b'MJPG',
+            self.width * self.height * 3, 0, 0, 0, 0))
+        self._movi_pos = f.tell()
+        f.write(b'LIST\0\0\0\0movi')
+
+    def _avih(self):
+        return struct.pack('<14I', int(1e6 / self.fps), 0, 0, 0x10, self.frames, 0, 1,
+                           self._max_size, self.width, self.height, 0, 0, 0, 0)
+
+    def _strh(self):
+        return struct.pack('<4s4sIHHIIIIIIII4h', b'vids', b'MJPG', 0, 0, 0, 0, 1,
+                           int(self.fps), 0, self.frames, self._max_size, 0xFFFFFFFF, 0,
+                           0, 0, self.width, self.height)
+
+    def write(self, jpeg):
+        f = self._file
+        offset = f.tell() - (self._movi_pos + 8)
+        f.write(b'00dc' + struct.pack('<I', len(jpeg)) + jpeg)
+        if len(jpeg) % 2:
+            f.write(b'\0')
+        self._index.append((offset, len(jpeg)))
+        self._max_size = max(self._max_size, len(jpeg))
+        self.frames += 1
+
+    def close(self):
+        f = self._file
+        movi_end = f.tell()
+        f.write(b'idx1' + struct.pack('<I', 16 * len(self._index)))
+        for offset, size in self._index:
+            f.write(b'00dc' + struct.pack('<III', 0x10, offset, size))
+        end = f.tell()
+        # Completar tamaños y contadores ahora que se conocen
+        f.seek(4)
+        f.write(struct.pack('<I', end - 8))
+        f.seek(self._movi_pos + 4)
+        f.write(struct.pack('<I', movi_end - self._movi_pos - 8))
+        f.seek(self._avih_pos + 8)
+        f.write(self._avih())
+        f.seek(self._strh_pos + 8)
+        f.write(self._strh())
+        f.close()
+
+
+class ClipRecorder:
+    """Buffer circular de JPEG por cámara y escritura de clips por eventos."""
+
+    def __init__(self, camera, clips_dir, pre_roll=5.0, post_roll=5.0, fps=10,
+                 quality=80, max_buffer_bytes=32 * 1024 * 1024, max_clip_seconds=300):
+        """
+        Args:
+            camera (CameraCapture): Cámara de origen
+            clips_dir (str): Directorio de los clips
+            pre_roll, post_roll (float): Segundos antes del primer y después del último evento
+            fps (float): Frames por segundo guardados en el buffer y el clip
+            quality (int): Calidad JPEG (igual a la de los streams para reutilizar su codificación)
+            max_buffer_bytes (int): Memoria máxima del buffer circular
+            max_clip_seconds (float): Duración máxima de un clip
+        """
+        self.camera = camera
+        self.clips_dir = Path(clips_dir)
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.fps = fps
+        self.quality = quality
+        self.max_buffer_bytes = max_buffer_bytes
+        self.max_clip_seconds = max_clip_seconds
+        self._buffer = deque()  # (timestamp, jpeg)
+        self._buffer_bytes = 0
+        self._clip_end = None  # Fin del post-roll del clip en curso
+        self._clip_start = None
+        self._events = []
+        self._events_lock = Lock()  # trigger() llega desde el thread del detector
+        self._writer_queue = queue.Queue(maxsize=int(fps * 10))
+        self._stop = Event()
+        self._writer_stop = Event()  # Se activa después de que el feed encola su último 'end'
+        self.dropped = 0
+        self._threads = []
+
+    def start(self):
+        self.clips_dir.mkdir(parents=True, exist_ok=True)
+        self._stop.clear()
+        self._writer_stop.clear()
+        for target, name in ((self._feed, 'clip-buffer'), (self._write, 'clip-writer')):
+            thread = Thread(target=target, name=f'{name}-{self.camera.camera_id}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        # Primero el feed, para que su 'end' final llegue al writer antes de detenerlo
+        self._stop.set()
+        feed, writer = (self._threads + [None, None])[:2]
+        if feed is not None:
+            feed.join(timeout=5)
+        self._writer_stop.set()
+        if writer is not None:
+            writer.join(timeout=5)
+        self._threads = []
+
+    def trigger(self, **info):
+        """
+        Informa un evento de detección. Solo anota el evento y extiende el
+        clip; el trabajo lo hacen los threads del grabador.
+
+        Los eventos de un mismo segundo se agrupan en una sola entrada de los
+        metadatos: `count` cuenta los eventos agrupados y `until` es la hora
+        del último.
+        """
+        now = time.time()
+        stamp = datetime.fromtimestamp(now).isoformat()
+        with self._events_lock:
+            last = self._events[-1] if self._events else None
+            if last is not None and now - last['_started'] < 1.0:
+                last['count'] += 1
+                last['until'] = stamp
+            else:
+                self._events.append(dict(info, time=stamp, until=stamp, count=1, _started=now))
+            self._clip_end = now + self.post_roll
+
+    def _take_events(self):
+        """Eventos del clip en curso (sin campos internos), vaciando la lista."""
+        with self._events_lock:
+            events, self._events = self._events, []
+        return [{k: v for k, v in event.items() if k != '_started'} for event in events]
+
+    def _enqueue(self, item):
+        if item[0] != 'frame':
+            # 'start' y 'end' no se descartan: perder uno deja el clip abierto o sin crear
+            self._writer_queue.put(item)
+            return
+        try:
+            self._writer_queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def _feed(self):
+        """Toma JPEG de la cámara a `fps`, mantiene el buffer y alimenta el clip."""
+        interval = 1.0 / self.fps
+        last_seq = None
+        while not self._stop.is_set():
+            started = time.time()
+            try:
+                seq, jpeg = self.camera.latest_jpeg(self.quality)
+            except Exception as e:
+                logger.error(f"Error al obtener JPEG para el buffer de clips: {str(e)}")
+                seq, jpeg = None, None
+            if jpeg is not None and seq != last_seq:
+                last_seq = seq
+                self._buffer.append((started, jpeg))
+                self._buffer_bytes += len(jpeg)
+                while self._buffer and (self._buffer_bytes > self.max_buffer_bytes
+                                        or self._buffer[0][0] < started - self.pre_roll):
+                    self._buffer_bytes -= len(self._buffer.popleft()[1])
+                self._update_clip(started, jpeg)
+            self._stop.wait(max(0.0, interval - (time.time() - started)))
+        if self._clip_start is not None:
+            self._enqueue(('end', self._take_events()))
+
+    def _update_clip(self, now, jpeg):
+        clip_end = self._clip_end
+        if self._clip_start is None:
+            if clip_end is None or now > clip_end:
+                return
+            # Nuevo clip: pre-roll del buffer (incluye el frame actual)
+            self._clip_start = now
+            # Milisegundos en el nombre: dos clips del mismo segundo no se sobrescriben
+            started = datetime.fromtimestamp(now)
+            name = f"cam{self.camera.camera_id}_{started:%Y%m%d_%H%M%S}_{started.microsecond // 1000:03d}"
+            self._enqueue(('start', name, [data for _, data in self._buffer]))
+            return
+        if now > clip_end or now - self._clip_start > self.max_clip_seconds:
+            events = self._take_events()
+            self._clip_start = None
+            with self._events_lock:
+                # Un evento llegado entre la comprobación y aquí abre el siguiente clip
+                if self._clip_end == clip_end:
+                    self._clip_end = None
+            self._enqueue(('end', events))
+            return
+        self._enqueue(('frame', jpeg))
+
+    def _write(self):
+        writer = None
+        name = None
+        while not (self._writer_stop.is_set() and self._writer_queue.empty()):
+            try:
+                item = self._writer_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                if item[0] == 'start':
+                    if writer is not None:
+                        # No debería ocurrir: cerrar el clip anterior en lugar de perderlo
+                        self._finish_clip(writer, name, [])
+                        writer = None
+                    _, name, frames = item
+                    size = jpeg_size(frames[-1]) if frames else None
+                    if size is None:
+                        continue
+                    writer = MjpegAviWriter(str(self.clips_dir / f"{name}.avi"), *size, self.fps)
+                    for jpeg in frames:
+                        writer.write(jpeg)
+                elif item[0] == 'frame' and writer is not None:
+                    writer.write(item[1])
+                elif item[0] == 'end' and writer is not None:
+                    self._finish_clip(writer, name, item[1])
+                    writer = None
+            except Exception as e:
+                logger.error(f"Error al escribir clip: {str(e)}")
+                logger.error(traceback.format_exc())
+                writer = None
+        if writer is not None:
+            writer.close()
+
+    def _finish_clip(self, writer, name, events):
+        writer.close()
+        with open(self.clips_dir / f"{name}.json", 'w', encoding='utf-8') as f:
+            json.dump({'camera_id': self.camera.camera_id, 'frames': writer.frames,
+                       'fps': self.fps, 'events': events}, f, indent=2)
+        logger.info(f"Clip guardado: {name}.avi ({writer.frames} frames)")
+
+
+def list_clips(clips_dir, camera_id=None):
+    """Clips guardados (más recientes primero) con sus metadatos."""
+    clips_dir = Path(clips_dir)
+    if not clips_dir.is_dir():
+        return []
+    clips = []
+    for meta_path in sorted(clips_dir.glob('*.json'), reverse=True):
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if camera_id is not None and meta.get('camera_id') != camera_id:
+            continue
+        video = meta_path.with_suffix('.avi')
+        if video.exists():
+            clips.append(dict(meta, name=video.name, bytes=os.path.getsize(video)))
+    return clips
@@ -0,0 +1,285 @@
+"""
+Construcción del dataset de entrenamiento en formato YOLO.
+
+El dataset original solo tiene carpetas por clase y listas de índices
+(zero-indexed-files.txt, one-indexed-files-notrash_<split>.txt). Este módulo
+valida y decodifica cada imagen en un pool de procesos, genera los splits
+train/val/test con una etiqueta por imagen (el objeto ocupa todo el encuadre),
+excluye los archivos corruptos y escribe un manifiesto con tamaño, fecha,
+dimensiones y hash de cada imagen para que las reconstrucciones posteriores
+solo procesen lo que cambió.
+"""
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from collections import Counter, defaultdict
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+import yaml
+
+logger = logging.getLogger(__name__)
+
+CLASS_NAMES = ['cardboard', 'glass', 'metal', 'paper', 'plastic', 'trash']
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+SPLITS = ('train', 'val', 'test')
+MANIFEST_NAME = 'manifest.json'
+
+
+def inspect_image(path):
+    """
+    Lee, hashea y decodifica una imagen (se ejecuta en los procesos del pool).
+
+    Returns:
+        dict: valid, sha256, width, height y error si no es válida
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        return {'valid': False, 'error': str(e)}
+    info = {'sha256': hashlib.sha256(data).hexdigest()}
+    if path.lower().endswith(('.jpg', '.jpeg')) and not data.rstrip(b'\0').endswith(b'\xff\xd9'):
+        # OpenCV decodifica los JPEG truncados rellenando con gris
+        return dict(info, valid=False, error='JPEG truncado')
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None or img.size == 0:
+        return dict(info, valid=False, error='No se pudo decodificar')
+    height, width = img.shape[:2]
+    return dict(info, valid=True, width=width, height=height)
+
+
+def read_split_lists(index_dir):
+    """Split asignado a cada archivo según one-indexed-files-notrash_<split>.txt."""
+    splits = {}
+    for split in SPLITS:
+        path = Path(index_dir) / f'one-indexed-files-notrash_{split}.txt'
+        if not path.exists():
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if parts:
+                    splits[parts[0]] = split
+    return splits
+
+
+def read_class_list(index_dir):
+    """
+    Clase de cada archivo según zero-indexed-files.txt.
+
+    La lista usa su propio orden de clases; el id se traduce a nombre por
+    el prefijo más frecuente de los archivos con ese id ('glass12.jpg').
+    """
+    path = Path(index_dir) / 'zero-indexed-files.txt'
+    if not path.exists():
+        return {}
+    ids = {}
+    prefixes = defaultdict(Counter)
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 2:
+                continue
+            ids[parts[0]] = int(parts[1])
+            prefixes[int(parts[1])][re.sub(r'\d+\..*$', '', parts[0])] += 1
+    id_to_name = {cls_id: counter.most_common(1)[0][0] for cls_id, counter in prefixes.items()}
+    return {name: id_to_name[cls_id] for name, cls_id in ids.items()}
+
+
+def hash_split(name, val_ratio, test_ratio):
+    """Split determinista para archivos que no figuran en las listas."""
+    value = int(hashlib.md5(name.encode('utf-8')).hexdigest()[:8], 16) / 0xFFFFFFFF
+    if value < test_ratio:
+        return 'test'
+    if value < test_ratio + val_ratio:
+        return 'val'
+    return 'train'
+
+
+def load_manifest(output_dir):
+    path = Path(output_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {'files': {}}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        logger.warning(f"Manifiesto inválido en {path}; se reconstruye todo")
+        return {'files': {}}
+
+
+def _write_atomic(path, text):
+    tmp = Path(str(path) + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _output_name(cls_name, path):
+    """Nombre en el dataset: con prefijo de clase, porque distintas clases pueden repetir nombre."""
+    return f"{cls_name}_{path.name}"
+
+
+def _output_paths(output_dir, split, name):
+    image = Path(output_dir) / 'images' / split / name
+    label = Path(output_dir) / 'labels' / split / (Path(name).stem + '.txt')
+    return image, label
+
+
+def _outputs_current(output_dir, entry, split):
+    """True si la imagen y la etiqueta de entry existen y siguen en el split esperado."""
+    if entry.get('split') != split:
+        return False
+    return all(path.exists() for path in _output_paths(output_dir, split, entry['name']))
+
+
+def _place_image(src, dst):
+    """Enlaza (o copia si no se puede) la imagen fuente en el dataset."""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _remove_outputs(output_dir, entry):
+    if not entry or not entry.get('split'):
+        return
+    for path in _output_paths(output_dir, entry['split'], entry['name']):
+        if path.exists():
+            path.unlink()
+
+
+def build_dataset(source_dir, index_dir, output_dir, workers=None, val_ratio=0.15,
+                  test_ratio=0.15, purge_corrupt=False):
+    """
+    Construye (o actualiza) el dataset YOLO en output_dir.
+
+    Args:
+        source_dir (str): Carpeta con una subcarpeta por clase
+        index_dir (str): Carpeta con las listas de índices del dataset
+        output_dir (str): Destino (images/, labels/, dataset.yaml, manifest.json)
+        workers (int, opcional): Procesos para validar imágenes
+        val_ratio, test_ratio (float): Proporciones para archivos sin split en las listas
+        purge_corrupt (bool): Borrar del origen las imágenes corruptas
+
+    Returns:
+        dict: Resumen de la construcción
+    """
+    source_dir, output_dir = Path(source_dir), Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    previous = manifest.get('files', {})
+    split_lists = read_split_lists(index_dir)
+    class_list = read_class_list(index_dir)
+
+    # 1. Enumerar el origen y separar lo que no cambió desde la última construcción
+    sources, pending = {}, []
+    for cls_name in CLASS_NAMES:
+        class_dir = source_dir / cls_name
+        if not class_dir.is_dir():
+            logger.warning(f"No existe la carpeta de clase {class_dir}")
+            continue
+        for path in sorted(class_dir.iterdir()):
+            if path.suffix.lower() not in IMAGE_EXTENSIONS:
+                continue
+            key = f"{cls_name}/{path.name}"
+            stat = path.stat()
+            sources[key] = (path, cls_name, stat.st_size, stat.st_mtime)
+            prev = previous.get(key)
+            if (prev and prev.get('size') == stat.st_size and prev.get('mtime') == stat.st_mtime
+                    and prev.get('name') == _output_name(cls_name, path)
+                    and (not prev.get('valid') or _outputs_current(
+                        output_dir, prev, split_lists.get(path.name)
+                        or hash_split(path.name, val_ratio, test_ratio)))):
+                continue
+            pending.append(key)
+
+    # 2. Validar y decodificar en paralelo solo los archivos nuevos o modificados
+    inspected = {}
+    if pending:
+        logger.info(f"Validando {len(pending)} imágenes con {workers or os.cpu_count()} procesos")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            paths = [str(sources[key][0]) for key in pending]
+            for key, info in zip(pending, pool.map(inspect_image, paths, chunksize=32)):
+                inspected[key] = info
+
+    # 3. Generar imágenes y etiquetas
+    files = {}
+    summary = Counter()
+    for key, (path, cls_name, size, mtime) in sources.items():
+        if key not in inspected:
+            files[key] = previous[key]
+            summary['unchanged'] += 1
+            continue
+        info = inspected[key]
+        _remove_outputs(output_dir, previous.get(key))
+        entry = {
+            'name': _output_name(cls_name, path),
+            'class': cls_name,
+            'size': size,
+            'mtime': mtime,
+            'sha256': info.get('sha256'),
+            'valid': info['valid'],
+            'split': None,
+        }
+        if not info['valid']:
+            entry['error'] = info['error']
+            summary['corrupt'] += 1
+            logger.warning(f"Imagen corrupta {key}: {info['error']}")
+            if purge_corrupt:
+                path.unlink()
+                summary['purged'] += 1
+                continue
+            files[key] = entry
+            continue
+
+        listed = class_list.get(path.name)
+        if listed is not None and listed != cls_name:
+            logger.warning(f"{key}: la lista de índices indica '{listed}'; se usa la carpeta")
+            summary['class_mismatch'] += 1
+        split = split_lists.get(path.name) or hash_split(path.name, val_ratio, test_ratio)
+        entry.update(split=split, width=info['width'], height=info['height'])
+
+        image_path, label_path = _output_paths(output_dir, split, entry['name'])
+        _place_image(path, image_path)
+        label_path.parent.mkdir(parents=True, exist_ok=True)
+        # Cada imagen contiene un único objeto que ocupa el encuadre
+        _write_atomic(label_path, f"{CLASS_NAMES.index(cls_name)} 0.5 0.5 1.0 1.0\n")
+        files[key] = entry
+        summary['built'] += 1
+
+    # 4. Quitar del dataset lo que ya no existe en el origen
+    for key in set(previous) - set(sources):
+        _remove_outputs(output_dir, previous[key])
+        summary['removed'] += 1
+
+    dataset_yaml = output_dir / 'dataset.yaml'
+    _write_atomic(dataset_yaml, yaml.safe_dump({
+        'path': str(output_dir.resolve()),
+        'train': 'images/train',
+        'val': 'images/val',
+        'test': 'images/test',
+        'names': dict(enumerate(CLASS_NAMES)),
+    }, sort_keys=False, allow_unicode=True))
+
+    splits = Counter(e['split'] for e in files.values() if e.get('valid'))
+    manifest = {
+        'built': datetime.now().isoformat(),
+        'source': str(source_dir.resolve()),
+        'classes': CLASS_NAMES,
+        'splits': dict(splits),
+        'files': files,
+    }
+    _write_atomic(output_dir / MANIFEST_NAME, json.dumps(manifest, indent=1))
+    return {'yaml': str(dataset_yaml), 'splits': dict(splits), **summary}
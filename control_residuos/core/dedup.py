@@ -0,0 +1,163 @@
+"""
+Detección de imágenes casi duplicadas.
+
+Calcula un hash perceptual (pHash de 64 bits) por imagen en un pool de
+procesos, lo guarda en una caché incremental (solo se recalcula si cambian
+tamaño o fecha del archivo) y lo indexa en un BK-tree para buscar vecinos
+dentro de un radio de Hamming sin comparar todos los pares.
+"""
+
+import os
+import json
+import logging
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Preferencia al decidir qué copia de un grupo se conserva
+SPLIT_PRIORITY = {'train': 0, 'val': 1, 'test': 2, None: 3}
+
+
+def phash_image(img):
+    """
+    pHash de 64 bits de una imagen (BGR o gris): DCT de la imagen en gris a
+    32x32, bloque 8x8 de baja frecuencia y comparación con la mediana.
+    """
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(img, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def phash(path):
+    """pHash de un archivo de imagen, o None si no se puede leer."""
+    img = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    return phash_image(img)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """BK-tree sobre la distancia de Hamming."""
+
+    def __init__(self):
+        self._root = None  # [hash, [items], {distancia: nodo}]
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def query(self, value, radius):
+        """Elementos con distancia <= radius a value, como [(distancia, item)]."""
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                found.extend((distance, item) for item in node[1])
+            for d, child in node[2].items():
+                if distance - radius <= d <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+class HashCache:
+    """Caché persistente {ruta: (tamaño, fecha, hash)} de los pHash."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                logger.warning(f"Caché de hashes inválida en {self.path}; se recalcula")
+
+    def update(self, paths, workers=None):
+        """
+        Devuelve {ruta: hash} para `paths`, calculando en paralelo solo los
+        archivos nuevos o modificados.
+        """
+        stats = {str(p): os.stat(p) for p in paths}
+        pending = [
+            p for p, st in stats.items()
+            if self.entries.get(p, [None, None])[:2] != [st.st_size, st.st_mtime]
+        ]
+        if pending:
+            logger.info(f"Calculando pHash de {len(pending)} imágenes")
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for p, value in zip(pending, pool.map(phash, pending, chunksize=64)):
+                    self.entries[p] = [stats[p].st_size, stats[p].st_mtime, value]
+        self.entries = {p: e for p, e in self.entries.items() if p in stats}
+        self.save()
+        return {p: e[2] for p, e in self.entries.items() if e[2] is not None}
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+
+def find_clusters(hashes, radius):
+    """
+    Agrupa las imágenes cuyo pHash está a distancia <= radius (clausura
+    transitiva con union-find).
+
+    Returns:
+        list: Grupos con más de una imagen, como listas de rutas ordenadas
+    """
+    tree = BKTree()
+    for path, value in hashes.items():
+        tree.add(value, path)
+
+    parent = {path: path for path in hashes}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for path, value in hashes.items():
+        for _, other in tree.query(value, radius):
+            a, b = find(path), find(other)
+            if a != b:
+                parent[b] = a
+
+    groups = {}
+    for path in hashes:
+        groups.setdefault(find(path), []).append(path)
+    return [sorted(g) for g in groups.values() if len(g) > 1]
+
+
+def choose_keeper(cluster, splits):
+    """Copia a conservar: la del split de mayor prioridad (train primero)."""
+    return min(cluster, key=lambda p: (SPLIT_PRIORITY.get(splits.get(p)), p))
@@ -9,6 +9,18 @@ from threading import Thread, Lock
 from datetime import datetime
 from collections import deque
 from .camera_manager import CameraManager
+from . import metrics
+from .profiling import tracer
+from .inference_worker import InferenceWorker, predict
+from .inference_profile import resolve_imgsz
+from .cascade import acquire_rescorer, release_rescorer, crop_box
+from .motion import MotionDetector
+from .recognition import CropClassifier
+from .model_rollout import ModelBackend, ShadowEvaluator
+from .model_registry import ModelRegistry, resolve_model_path
+from .hard_examples import HardExampleSampler, get_store
+from .snapshot_store import get_snapshot_store
+from .overlay import OverlayChannel
 import logging
 
 # Importar configuración central
@@ -19,7 +31,18 @@ logger = logging.getLogger(__name__)
 os.environ['YOLO_VERBOSE'] = 'True'
 
 class WasteDetector:
-    def __init__(self, camera_id, confidence_threshold=None, model_path=None):
+    def __init__(self, camera_id, confidence_threshold=None, model_path=None,
+                 execution_mode=None, pipeline_mode=None):
+        """
+        Args:
+            camera_id (int): ID de la cámara a vigilar
+            confidence_threshold (float, opcional): Umbral de confianza
+            model_path (str, opcional): Ruta a los pesos YOLO
+            execution_mode (str, opcional): 'thread' (inferencia en este proceso)
+                                            o 'process' (proceso de inferencia dedicado)
+            pipeline_mode (str, opcional): 'detect' (YOLO sobre el frame completo) o
+                                           'classify' (movimiento + clasificador de recortes)
+        """
         try:
             logger.info(f"\n=== Inicializando WasteDetector ===")
             logger.info(f"Parámetros recibidos:")
@@ -28,6 +51,11 @@ class WasteDetector:
             logger.info(f"- model_path: {model_path}")
             
             # Usar valores de la configuración central si no se proporcionan
+            if not model_path and YOLO_MODEL_FAMILY:
+                model_path = resolve_model_path(
+                    ModelRegistry(RUNS_DIR, MODEL_REGISTRY_DIR),
+                    YOLO_MODEL_FAMILY, YOLO_MODEL_MIN_SCORE, YOLO_MODEL_PATH
+                )
             model_path = model_path or YOLO_MODEL_PATH
             confidence_threshold = confidence_threshold or YOLO_CONFIDENCE
             
@@ -57,14 +85,7 @@ class WasteDetector:
             raise
         
         # Mapeo de clases a tipos orgánico/inorgánico
-        self._class_mapping = {
-            'cardboard': 'inorganic',
-            'glass': 'inorganic',
-            'metal': 'inorganic',
-            'paper': 'inorganic',
-            'plastic': 'inorganic',
-            'trash': 'organic'  # Asumiendo que trash incluye residuos orgánicos
-        }
+        self._class_mapping = dict(WASTE_CLASS_MAPPING)
         self._detection_lock = Lock()
         self._stats = {
             'total': 0,
@@ -72,8 +93,43 @@ class WasteDetector:
             'inorganic': 0
         }
         self._detection_thread = None
+        self.overlay = OverlayChannel()  # Cajas de cada frame para dibujar en el cliente
         self._camera = None
         self.model = None
+        self._worker = None
+        self._execution_mode = execution_mode or INFERENCE_MODE
+        self._predict_options = {}  # Opciones extra de predicción (p. ej. imgsz)
+        self._rescorer = None  # Modelo grande compartido de la cascada
+        self._pipeline_mode = pipeline_mode or PIPELINE_MODE
+        self._motion = None
+        self._classifier = None
+        self._model_path = model_path
+        self._thread_budget = None  # Último (threads, cpus) asignado
+        self._pending_backend = None  # Modelo nuevo ya cargado, a adoptar entre frames
+        self._rollout = {'state': 'idle', 'model_path': None, 'error': None}
+        self._shadow = None  # Evaluador del modelo candidato
+        self._shadow_lock = Lock()
+        self._shadow_generation = 0  # Invalida las cargas en sombra anteriores
+        self._hard_examples = None
+        if HARD_EXAMPLES_ENABLED:
+            self._hard_examples = HardExampleSampler(
+                get_store(HARD_EXAMPLES_DIR, HARD_EXAMPLES_MAX_MB * 1024 * 1024),
+                self._camera_id,
+                band=HARD_EXAMPLES_BAND,
+                max_per_minute=HARD_EXAMPLES_PER_MINUTE
+            )
+        self._snapshots = None  # Miniaturas de las detecciones contadas
+        if SNAPSHOTS_ENABLED:
+            self._snapshots = get_snapshot_store(
+                SNAPSHOTS_DIR,
+                size=SNAPSHOT_SIZE,
+                fmt=SNAPSHOT_FORMAT,
+                quality=SNAPSHOT_QUALITY,
+                workers=SNAPSHOT_WORKERS,
+                retention_days=SNAPSHOT_RETENTION_DAYS,
+                max_bytes=SNAPSHOT_MAX_MB * 1024 * 1024,
+                dedup_radius=SNAPSHOT_DEDUP_RADIUS
+            )
         
         # Verificar que el archivo del modelo existe
         if not os.path.exists(model_path):
@@ -81,7 +137,36 @@ class WasteDetector:
             logger.error(error_msg)
             raise FileNotFoundError(error_msg)
         
-        # Cargar modelo YOLO
+        if self._pipeline_mode == 'classify':
+            self._start_classifier()
+            return
+        
+        # Tamaño de entrada según el perfil de inferencia del despliegue
+        self._predict_options = self._predict_options_for(model_path)
+        
+        # Cascada: este modelo actúa como modelo pequeño
+        if CASCADE_ENABLED:
+            self._rescorer = acquire_rescorer(
+                CASCADE_MODEL_PATH,
+                max_batch=CASCADE_MAX_BATCH,
+                max_wait=CASCADE_MAX_WAIT,
+                imgsz=CASCADE_IMGSZ
+            )
+        
+        try:
+            if self._execution_mode == 'process':
+                self._start_worker(model_path)
+            else:
+                self._load_model(model_path)
+        except Exception:
+            # No retener el modelo grande compartido si este detector no llega a existir
+            if self._rescorer is not None:
+                release_rescorer(self._rescorer)
+                self._rescorer = None
+            raise
+
+    def _load_model(self, model_path):
+        """Carga el modelo YOLO en este proceso (modo thread)."""
         logger.info("\nIniciando carga del modelo YOLO...")
         try:
             logger.info(f"Intentando cargar modelo desde: {model_path}")
@@ -135,6 +220,256 @@ class WasteDetector:
             logger.error(traceback.format_exc())
             raise RuntimeError(error_msg)
 
+    def _start_worker(self, model_path):
+        """Carga el modelo en un proceso de inferencia dedicado."""
+        logger.info("\nIniciando proceso de inferencia...")
+        try:
+            self._worker = InferenceWorker(
+                model_path,
+                self._confidence_threshold,
+                num_threads=INFERENCE_WORKER_THREADS,
+                start_method=INFERENCE_START_METHOD,
+                request_timeout=INFERENCE_REQUEST_TIMEOUT
+            )
+            self._worker.start()
+            logger.info(f"Clases del modelo: {set(self._worker.names.values())}")
+        except Exception as e:
+            self._worker = None
+            error_msg = f"Error al iniciar el proceso de inferencia: {str(e)}"
+            logger.error(error_msg)
+            logger.error(traceback.format_exc())
+            raise RuntimeError(error_msg)
+
+    def _start_classifier(self):
+        """Prepara el modo de clasificación de recortes."""
+        logger.info("\nIniciando modo de clasificación de recortes...")
+        if not os.path.exists(CLASSIFIER_MODEL_PATH):
+            error_msg = f"No se encontró el clasificador en: {CLASSIFIER_MODEL_PATH}"
+            logger.error(error_msg)
+            raise FileNotFoundError(error_msg)
+        try:
+            self._classifier = CropClassifier(CLASSIFIER_MODEL_PATH, imgsz=CLASSIFIER_IMGSZ)
+            self._motion = MotionDetector(min_area=MOTION_MIN_AREA)
+            logger.info(f"Clases del clasificador: {set(self._classifier.names.values())}")
+        except Exception as e:
+            error_msg = f"Error al cargar el clasificador: {str(e)}"
+            logger.error(error_msg)
+            logger.error(traceback.format_exc())
+            raise RuntimeError(error_msg)
+
+    @property
+    def class_names(self):
+        """Nombres de clase del modelo activo ({id: nombre})."""
+        if self._classifier is not None:
+            return self._classifier.names
+        if self._worker is not None:
+            return self._worker.names
+        return self.model.names if self.model is not None else {}
+
+    @property
+    def uses_worker(self):
+        """True si la inferencia corre en un proceso propio (modo process)."""
+        return self._worker is not None
+
+    def set_thread_budget(self, threads, cpus=None):
+        """
+        Asigna el número de threads de inferencia (y opcionalmente núcleos).
+        
+        Solo se aplica en modo process, en el proceso de inferencia. En modo
+        thread los límites de torch/OpenCV/BLAS y la afinidad son de todo el
+        proceso: ThreadBudget aplica una vez el total en lugar de que cada
+        detector pise el de los demás.
+        """
+        self._thread_budget = (threads, cpus)
+        if self._worker is not None:
+            logger.info(f"Detector {self._camera_id}: {threads} thread(s) de inferencia"
+                        + (f", núcleos {sorted(cpus)}" if cpus else ""))
+            self._worker.set_threads(threads, cpus)
+
+    def _predict_options_for(self, model_path):
+        """Opciones de predicción de model_path (imgsz de su perfil de inferencia)."""
+        options = {}
+        if INFERENCE_PROFILE_ENABLED:
+            imgsz = resolve_imgsz(model_path, INFERENCE_PROFILE_PATH, INFERENCE_ACCURACY_FLOOR)
+            if imgsz:
+                options['imgsz'] = imgsz
+        return options
+
+    def _input_size(self):
+        """(ancho, alto) del frame de detección, o None para la resolución de captura."""
+        if DETECTION_INPUT_SIZE:
+            return tuple(DETECTION_INPUT_SIZE)
+        imgsz = self._predict_options.get('imgsz')
+        resolution = getattr(self._camera, 'resolution', None)
+        if not isinstance(imgsz, int) or resolution is None:
+            return None
+        scale = imgsz / max(resolution)
+        if scale >= 1.0:
+            return None
+        return (round(resolution[0] * scale), round(resolution[1] * scale))
+
+    def _sync_input_size(self):
+        """
+        Hace que la cámara entregue el frame de detección al tamaño de entrada
+        del modelo: en modo MJPEG directo se decodifica a esa escala en lugar
+        de decodificar completo y que YOLO lo reduzca.
+        """
+        if self._camera is None or not hasattr(self._camera, 'detection_size'):
+            return
+        size = self._input_size()
+        if size != self._camera.detection_size:
+            self._camera.detection_size = size
+            described = f"{size[0]}x{size[1]}" if size else "a la resolución de captura"
+            logger.info(f"Detector {self._camera_id}: frame de detección {described}")
+
+    def _create_backend(self, model_path):
+        """
+        Carga y calienta un modelo con el mismo modo de ejecución que el actual.
+        
+        backend.predict_options guarda las opciones de predicción del modelo
+        nuevo, que pueden diferir de las del actual (imgsz según su perfil).
+        """
+        backend = ModelBackend(
+            model_path,
+            execution_mode=self._execution_mode,
+            confidence=self._confidence_threshold,
+            num_threads=INFERENCE_WORKER_THREADS,
+            start_method=INFERENCE_START_METHOD,
+            request_timeout=INFERENCE_REQUEST_TIMEOUT
+        ).load()
+        if backend.worker is not None and self._thread_budget is not None:
+            backend.worker.set_threads(*self._thread_budget)
+        
+        frame = self._camera.get_frame(processed=True) if self._camera else None
+        if frame is None:
+            frame = np.zeros((CAMERA_HEIGHT, CAMERA_WIDTH, 3), dtype=np.uint8)
+        backend.predict_options = self._predict_options_for(model_path)
+        backend.warmup(frame, ROLLOUT_WARMUP_ITERATIONS, **backend.predict_options)
+        return backend
+
+    def swap_model(self, model_path):
+        """
+        Carga model_path en segundo plano y lo adopta entre dos frames sin
+        detener el detector.
+        
+        Returns:
+            bool: False si el modo actual no lo permite o ya hay una carga en curso
+        """
+        if self._classifier is not None:
+            logger.error("El cambio de modelo no está disponible en modo classify")
+            return False
+        if self._rollout['state'] in ('loading', 'ready'):
+            logger.warning(f"Detector {self._camera_id}: ya hay un cambio de modelo en curso")
+            return False
+        if not os.path.exists(model_path):
+            logger.error(f"No se encontró el modelo en: {model_path}")
+            return False
+        
+        self._rollout = {'state': 'loading', 'model_path': model_path, 'error': None}
+        Thread(target=self._load_swap, args=(model_path,),
+               name=f'model-loader-{self._camera_id}', daemon=True).start()
+        return True
+
+    def _load_swap(self, model_path):
+        try:
+            logger.info(f"Detector {self._camera_id}: cargando modelo {model_path}")
+            backend = self._create_backend(model_path)
+        except Exception as e:
+            logger.error(f"Error al cargar el modelo {model_path}: {str(e)}")
+            logger.error(traceback.format_exc())
+            self._rollout = {'state': 'error', 'model_path': model_path, 'error': str(e)}
+            return
+        self._rollout['state'] = 'ready'
+        self._pending_backend = backend
+        if not self._active:
+            # Sin bucle de detección no hay inferencias en curso
+            self._apply_pending_swap()
+
+    def _apply_pending_swap(self):
+        backend = self._pending_backend
+        if backend is None:
+            return
+        self._pending_backend = None
+        old_worker = self._worker
+        self.model, self._worker = backend.model, backend.worker
+        self._predict_options = backend.predict_options
+        self._sync_input_size()
+        previous = self._model_path
+        self._model_path = backend.model_path
+        self._rollout['state'] = 'active'
+        if old_worker is not None:
+            old_worker.stop()
+        logger.info(f"Detector {self._camera_id}: modelo cambiado de {previous} a {self._model_path}")
+
+    def start_shadow(self, model_path, sample_rate=None):
+        """
+        Carga model_path en segundo plano y lo evalúa en sombra sobre una
+        fracción de los frames, sin afectar a las detecciones registradas.
+        """
+        if self._classifier is not None:
+            logger.error("La evaluación en sombra no está disponible en modo classify")
+            return False
+        if not os.path.exists(model_path):
+            logger.error(f"No se encontró el modelo en: {model_path}")
+            return False
+        self.stop_shadow()
+        sample_rate = SHADOW_SAMPLE_RATE if sample_rate is None else sample_rate
+        with self._shadow_lock:
+            generation = self._shadow_generation
+        
+        def load():
+            try:
+                backend = self._create_backend(model_path)
+            except Exception as e:
+                logger.error(f"Error al iniciar la evaluación en sombra: {str(e)}")
+                logger.error(traceback.format_exc())
+                return
+            with self._shadow_lock:
+                # Otra llamada a start_shadow/stop_shadow durante la carga la invalida
+                if generation == self._shadow_generation:
+                    self._shadow = ShadowEvaluator(backend, sample_rate,
+                                                   confidence=self._confidence_threshold,
+                                                   options=backend.predict_options)
+                    backend = None
+            if backend is not None:
+                logger.info(f"Detector {self._camera_id}: evaluación en sombra de {model_path} "
+                            "cancelada durante la carga")
+                backend.stop()
+                return
+            logger.info(f"Detector {self._camera_id}: evaluación en sombra de {model_path} "
+                        f"({sample_rate:.0%} de los frames)")
+        
+        Thread(target=load, name=f'shadow-loader-{self._camera_id}', daemon=True).start()
+        return True
+
+    def stop_shadow(self):
+        """Detiene la evaluación en sombra y devuelve su informe final."""
+        with self._shadow_lock:
+            self._shadow_generation += 1
+            shadow, self._shadow = self._shadow, None
+        if shadow is None:
+            return None
+        report = shadow.report()
+        shadow.stop()
+        return report
+
+    def rollout_status(self):
+        """Modelo activo, estado del último cambio y evaluación en sombra."""
+        shadow = self._shadow
+        return {
+            'camera_id': self._camera_id,
+            'model_path': self._model_path,
+            'swap': dict(self._rollout),
+            'shadow': shadow.report() if shadow is not None else None
+        }
+
+    def _model_ready(self):
+        if self._classifier is not None:
+            return True
+        if self._worker is not None:
+            return self._worker.is_alive()
+        return self.model is not None
+
     def start(self):
         try:
             logger.info("\n=== Iniciando WasteDetector ===")
@@ -148,7 +483,7 @@ class WasteDetector:
             
             # 2. Verificar modelo YOLO
             logger.info("Verificando estado del sistema...")
-            if not hasattr(self, 'model') or self.model is None:
+            if not self._model_ready():
                 logger.error("Error crítico: Modelo YOLO no inicializado")
                 return False
             logger.info("[OK] Modelo YOLO verificado")
@@ -166,6 +501,7 @@ class WasteDetector:
             # 4. Obtener y verificar la cámara
             try:
                 self._camera = active_cameras[self._camera_id]
+                self._sync_input_size()
                 logger.info("[OK] Referencia a cámara obtenida")
             except Exception as e:
                 logger.error(f"Error crítico al obtener la cámara: {str(e)}")
@@ -207,18 +543,13 @@ class WasteDetector:
             # 6. Verificar modelo YOLO con una detección de prueba
             logger.info("Realizando detección de prueba...")
             try:
-                test_results = self.model(test_frame, verbose=False)
-                if not test_results:
+                test_results = self._infer(test_frame)
+                if test_results is None:
                     logger.error("Error crítico: El modelo no generó resultados en la detección de prueba")
                     return False
                     
-                # Verificar la estructura de resultados
-                if not hasattr(test_results[0], 'boxes'):
-                    logger.error("Error crítico: Resultados de prueba inválidos (sin boxes)")
-                    return False
-                    
                 logger.info("[OK] Detección de prueba exitosa")
-                logger.info(f"  Resultados: {len(test_results[0].boxes)} detecciones potenciales")
+                logger.info(f"  Resultados: {len(test_results)} detecciones potenciales")
                 
             except Exception as e:
                 logger.error("Error crítico en detección de prueba:")
@@ -237,7 +568,8 @@ class WasteDetector:
             logger.info("Iniciando thread de detección...")
             try:
                 self._active = True
-                self._detection_thread = Thread(target=self._detection_loop)
+                self._detection_thread = Thread(target=self._detection_loop,
+                                                name=f'detector-{self._camera_id}')
                 self._detection_thread.daemon = True
                 
                 # Guardar el thread_id para poder terminarlo si es necesario
@@ -304,6 +636,20 @@ class WasteDetector:
                             return False
                 self._detection_thread = None
                 logger.info("Thread de detección terminado")
+            
+            if self._worker is not None:
+                self._worker.stop()
+                self._worker = None
+                logger.info("Proceso de inferencia detenido")
+            
+            if self._rescorer is not None:
+                release_rescorer(self._rescorer)
+                self._rescorer = None
+            
+            self.stop_shadow()
+            backend, self._pending_backend = self._pending_backend, None
+            if backend is not None:
+                backend.stop()
 
             logger.info("Detector detenido correctamente")
             return True
@@ -322,7 +668,7 @@ class WasteDetector:
         last_success_time = time.time()
         
         # Verificación inicial
-        if not self.model:
+        if not self._model_ready():
             logger.error("Error crítico: Modelo no inicializado")
             self._active = False
             return
@@ -351,10 +697,11 @@ class WasteDetector:
                         
                     # Usar frame preprocesado para detección
                     frame = self._camera.get_frame(processed=True)
+                    seq = getattr(self._camera, 'processed_seq', frame_count)
                     
                     if frame is None:
                         error_count += 1
-                        logger.warning(f"Frame nulo recibido (error {error_count}/{max_errors})")
+                        logger.warning("Frame nulo recibido (error %d/%d)", error_count, max_errors)
                         time.sleep(0.5)
                         continue
                 except:
@@ -364,101 +711,41 @@ class WasteDetector:
                 
                 # Reiniciar contador de errores si llegamos aquí
                 error_count = 0
+                self._apply_pending_swap()
                 frame_count += 1
                 
                 # Log periódico de estado
                 current_time = time.time()
                 if current_time - last_success_time >= 10:  # Log cada 10 segundos
                     fps = frame_count / (current_time - last_success_time)
-                    logger.info(f"Detector funcionando - FPS: {fps:.2f} - Frames procesados: {frame_count}")
+                    logger.info("Detector %s funcionando - FPS: %.2f - Frames procesados: %d",
+                                self._camera_id, fps, frame_count)
                     last_success_time = current_time
                     frame_count = 0
                 
-                # Convertir a RGB para YOLO
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                
-                # Optimizar detección YOLOv8
-                results = self.model.predict(
-                    source=frame_rgb,
-                    verbose=False,           # Desactivar verbose para menos logs
-                    conf=self._confidence_threshold,  # Usar el umbral configurado
-                    iou=0.45,               # IOU menos estricto para mejor rendimiento
-                    max_det=10,             # Aumentar detecciones máximas
-                    agnostic_nms=True,      # NMS agnóstico para mejor rendimiento
-                    stream=True,            # Modo stream para mejor rendimiento
-                    device='cpu',           # Forzar CPU para estabilidad
-                    half=True              # Usar half precision para mejor rendimiento
-                )
+                # Inferencia y postproceso del frame
+                with metrics.INFERENCE_SECONDS.time(camera=self._camera_id), \
+                        tracer.span('inference', seq, self._camera_id):
+                    start = time.perf_counter()
+                    results = self._infer(frame)
+                    latency = time.perf_counter() - start
+                with metrics.POSTPROCESS_SECONDS.time(camera=self._camera_id), \
+                        tracer.span('postprocess', seq, self._camera_id):
+                    detections_in_frame = self._process_results(results, frame, seq)
                 
-                detections_in_frame = 0  # Contador para este frame
+                if self._hard_examples is not None:
+                    self._hard_examples.consider(frame, results, self.class_names)
                 
-                # Procesar resultados
-                for r in results:
-                    if not r.boxes:
-                        continue
-                        
-                    boxes = r.boxes.cpu().numpy()
-                    for i, box in enumerate(boxes):
-                        # Obtener confianza
-                        conf = float(box.conf)
-                        
-                        # Usar el umbral configurado
-                        if conf < self._confidence_threshold:
-                            continue
-                            
-                        # Obtener clase y validar
-                        cls_id = int(box.cls[0])
-                        if cls_id not in self.model.names:
-                            continue
-                            
-                        class_name = self.model.names[cls_id].lower()
-                        
-                        # Validar que la clase es reconocida
-                        if class_name not in self._class_mapping:
-                            logger.warning(f"Clase no reconocida: {class_name}")
-                            continue
-                        
-                        # Debug: imprimir información de detección
-                        logger.info(f"Detección válida: clase={class_name}, confianza={conf:.2f}")
-                        
-                        # Clasificar como orgánico/inorgánico usando el mapeo
-                        tipo = self._class_mapping[class_name]
-                        
-                        try:
-                            # Obtener coordenadas del bounding box
-                            x1, y1, x2, y2 = box.xyxy[0].astype(int)
-                            
-                            # Validar coordenadas
-                            if (x1 < 0 or y1 < 0 or 
-                                x2 >= frame.shape[1] or y2 >= frame.shape[0] or
-                                x2 <= x1 or y2 <= y1):
-                                logger.warning(f"Coordenadas inválidas: [{x1},{y1},{x2},{y2}]")
-                                continue
-                                
-                            # Debug: imprimir coordenadas
-                            logger.info(f"Bounding box: [{x1},{y1},{x2},{y2}]")
-                                
-                            # Registrar detección
-                            with self._detection_lock:
-                                self._detections.append({
-                                    'timestamp': datetime.now().isoformat(),
-                                    'class': tipo,
-                                    'confidence': conf,
-                                    'bbox': [x1, y1, x2, y2],
-                                    'original_class': class_name
-                                })
-                                
-                                # Actualizar estadísticas
-                                self._stats['total'] += 1
-                                self._stats[tipo] += 1
-                                detections_in_frame += 1
-                                
-                        except Exception as bbox_error:
-                            logger.error(f"Error procesando bounding box: {str(bbox_error)}")
-                            continue
+                shadow = self._shadow
+                if shadow is not None:
+                    confident = results[results[:, 4] >= self._confidence_threshold]
+                    shadow.maybe_submit(frame, confident, latency, self.class_names)
                 
                 if detections_in_frame > 0:
-                    logger.info(f"Frame procesado - {detections_in_frame} detecciones encontradas")
+                    logger.debug("Frame procesado - %d detecciones encontradas", detections_in_frame)
+                    recorder = getattr(self._camera, 'recorder', None)
+                    if recorder is not None:
+                        recorder.trigger(detections=detections_in_frame, seq=seq)
                     
             except Exception as e:
                 error_count += 1
@@ -468,6 +755,183 @@ class WasteDetector:
                 
         logger.info(f"Bucle de detección terminado para cámara {self._camera_id}")
 
+    def _infer(self, frame):
+        """
+        Ejecuta la inferencia YOLO sobre un frame BGR.
+        
+        Returns:
+            np.ndarray: Detecciones (N, 6) con x1, y1, x2, y2, confianza, clase
+        """
+        if self._classifier is not None:
+            return self._classify_candidates(frame)
+        
+        confidence = self._confidence_threshold
+        if self._rescorer is not None:
+            # Incluir las cajas de la banda ambigua aunque estén bajo el umbral
+            confidence = min(confidence, CASCADE_BAND[0])
+        
+        if self._worker is not None:
+            detections = self._worker.infer(frame, confidence, **self._predict_options)
+        else:
+            detections = predict(self.model, frame, confidence, **self._predict_options)
+        
+        if self._rescorer is not None and len(detections):
+            detections = self._cascade(frame, detections)
+        return detections
+
+    def _classify_candidates(self, frame):
+        """
+        Modo classify: localiza regiones en movimiento y clasifica sus
+        recortes en un solo lote, devolviendo el mismo formato (N, 6).
+        """
+        boxes = self._motion.detect(frame)
+        if len(boxes) == 0:
+            return np.empty((0, 6), dtype=np.float32)
+        
+        kept, crops = [], []
+        for box in boxes:
+            crop = crop_box(frame, box)
+            if crop is not None:
+                kept.append(box)
+                crops.append(crop)
+        
+        predictions = self._classifier.classify(crops)
+        detections = np.empty((len(kept), 6), dtype=np.float32)
+        for i, (box, (cls_id, conf)) in enumerate(zip(kept, predictions)):
+            detections[i, :4] = box
+            detections[i, 4] = conf
+            detections[i, 5] = cls_id
+        return detections
+
+    def _cascade(self, frame, detections):
+        """
+        Reclasifica con el modelo grande las cajas de confianza ambigua.
+        
+        Las cajas cuya confianza cae en CASCADE_BAND se recortan y se envían
+        al rescorer compartido; su clase y confianza se reemplazan por las
+        del modelo grande. Si el modelo grande no ve nada en el recorte, la
+        caja se descarta.
+        """
+        low, high = CASCADE_BAND
+        ambiguous = np.flatnonzero((detections[:, 4] >= low) & (detections[:, 4] < high))
+        if ambiguous.size == 0:
+            return detections
+        
+        indices, crops = [], []
+        for i in ambiguous:
+            crop = crop_box(frame, detections[i, :4])
+            if crop is not None:
+                indices.append(i)
+                crops.append(crop)
+        if not crops:
+            return detections
+        
+        metrics.CASCADE_ESCALATIONS.inc(len(crops), camera=self._camera_id)
+        name_to_id = {name.lower(): cls_id for cls_id, name in self.class_names.items()}
+        keep = np.ones(len(detections), dtype=bool)
+        detections = detections.copy()
+        for i, prediction in zip(indices, self._rescorer.rescore(crops)):
+            if prediction is None or prediction[0] not in name_to_id:
+                keep[i] = False
+                continue
+            detections[i, 4] = prediction[1]
+            detections[i, 5] = name_to_id[prediction[0]]
+        return detections[keep]
+
+    def _process_results(self, results, frame, seq=None):
+        """
+        Valida los resultados de la inferencia, registra las detecciones y
+        publica las cajas del frame `seq` en el canal de superposición.
+        
+        Returns:
+            int: Número de detecciones válidas registradas en este frame
+        """
+        detections_in_frame = 0  # Contador para este frame
+        names = self.class_names
+        overlay_boxes = []
+        # Las cajas se registran y publican en coordenadas de la captura,
+        # aunque el frame de detección sea más pequeño
+        resolution = getattr(self._camera, 'resolution', None) or frame.shape[1::-1]
+        scale_x = resolution[0] / frame.shape[1]
+        scale_y = resolution[1] / frame.shape[0]
+        
+        # Procesar resultados
+        for row in results:
+            # Obtener confianza
+            conf = float(row[4])
+            
+            # Usar el umbral configurado
+            if conf < self._confidence_threshold:
+                continue
+                
+            # Obtener clase y validar
+            cls_id = int(row[5])
+            if cls_id not in names:
+                continue
+                
+            class_name = names[cls_id].lower()
+            
+            # Validar que la clase es reconocida
+            if class_name not in self._class_mapping:
+                logger.warning("Clase no reconocida: %s", class_name)
+                continue
+            
+            # Debug: imprimir información de detección
+            logger.debug("Detección válida: clase=%s, confianza=%.2f", class_name, conf)
+            
+            # Clasificar como orgánico/inorgánico usando el mapeo
+            tipo = self._class_mapping[class_name]
+            
+            try:
+                # Obtener coordenadas del bounding box
+                x1, y1, x2, y2 = (int(v) for v in row[:4])
+                
+                # Validar coordenadas
+                if (x1 < 0 or y1 < 0 or 
+                    x2 >= frame.shape[1] or y2 >= frame.shape[0] or
+                    x2 <= x1 or y2 <= y1):
+                    logger.warning("Coordenadas inválidas: [%d,%d,%d,%d]", x1, y1, x2, y2)
+                    continue
+                    
+                # Debug: imprimir coordenadas
+                logger.debug("Bounding box: [%d,%d,%d,%d]", x1, y1, x2, y2)
+                
+                # Miniatura para auditoría (la codificación es en segundo plano)
+                thumbnail = None
+                if self._snapshots is not None:
+                    thumbnail = self._snapshots.submit(frame, (x1, y1, x2, y2), class_name)
+                    
+                bbox = [round(x1 * scale_x), round(y1 * scale_y),
+                        round(x2 * scale_x), round(y2 * scale_y)]
+                    
+                # Registrar detección
+                with self._detection_lock:
+                    self._detections.append({
+                        'timestamp': datetime.now().isoformat(),
+                        'class': tipo,
+                        'confidence': conf,
+                        'bbox': bbox,
+                        'original_class': class_name,
+                        'thumbnail': thumbnail
+                    })
+                    
+                    # Actualizar estadísticas
+                    self._stats['total'] += 1
+                    self._stats[tipo] += 1
+                    detections_in_frame += 1
+                
+                overlay_boxes.append([*bbox, tipo, class_name, round(conf, 3)])
+                metrics.DETECTIONS.inc(camera=self._camera_id, **{'class': class_name})
+                    
+            except Exception as bbox_error:
+                logger.error("Error procesando bounding box: %s", bbox_error)
+                continue
+        
+        with self._detection_lock:
+            stats = dict(self._stats)
+        self.overlay.publish(seq, tuple(resolution), overlay_boxes, stats)
+        return detections_in_frame
+
     def get_last_detections(self):
         with self._detection_lock:
             return list(self._detections)
@@ -0,0 +1,286 @@
+"""
+Evaluación de modelos sobre un split del dataset YOLO.
+
+La inferencia se reparte por lotes entre procesos (cada uno carga el modelo
+una vez con su parte de los threads) y las predicciones crudas, obtenidas
+con una confianza mínima muy baja, se guardan por (hash del modelo, hash de
+la imagen, imgsz). Volver a evaluar con otro umbral de confianza u otro
+mapeo orgánico/inorgánico solo recalcula las métricas.
+"""
+
+import os
+import logging
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from .utils import file_sha256
+from .inference_worker import PREDICT_OPTIONS, results_to_array
+from .model_rollout import box_iou
+from .dataset_builder import IMAGE_EXTENSIONS, load_manifest
+
+logger = logging.getLogger(__name__)
+
+# Confianza con la que se guardan las predicciones (los umbrales se aplican después)
+CACHE_CONFIDENCE = 0.001
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+_model = None
+
+
+def _init_worker(model_path, threads):
+    """Carga el modelo una vez por proceso del pool."""
+    global _model
+    if threads:
+        cv2.setNumThreads(threads)
+        import torch
+        torch.set_num_threads(threads)
+    from ultralytics import YOLO
+    _model = YOLO(model_path)
+    _model.fuse()
+
+
+def _predict_batch(args):
+    """Predice un lote de imágenes; devuelve [(detecciones, (h, w))] en orden."""
+    paths, imgsz = args
+    frames, shapes = [], []
+    for path in paths:
+        img = cv2.imread(path)
+        shapes.append(img.shape[:2] if img is not None else (0, 0))
+        if img is not None:
+            # Misma conversión que la inferencia en producción
+            frames.append(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    options = dict(PREDICT_OPTIONS, conf=CACHE_CONFIDENCE, stream=False)
+    if imgsz:
+        options['imgsz'] = imgsz
+    results = iter(_model.predict(source=frames, **options) if frames else [])
+    output = []
+    for shape in shapes:
+        detections = results_to_array([next(results)]) if shape != (0, 0) else None
+        output.append((detections, shape))
+    return output
+
+
+class PredictionCache:
+    """Predicciones crudas por (modelo, imgsz), indexadas por hash de imagen."""
+
+    def __init__(self, cache_dir, model_sha, imgsz):
+        self.path = Path(cache_dir) / f"{model_sha[:24]}_{imgsz or 'default'}.npz"
+        self.entries = {}
+        self._dirty = False
+        if self.path.exists():
+            with np.load(self.path) as data:
+                for key in data.files:
+                    if key.startswith('d_'):
+                        sha = key[2:]
+                        self.entries[sha] = (data[key], tuple(data['s_' + sha]))
+
+    def get(self, image_sha):
+        return self.entries.get(image_sha)
+
+    def put(self, image_sha, detections, shape):
+        self.entries[image_sha] = (detections, tuple(shape))
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {}
+        for sha, (detections, shape) in self.entries.items():
+            arrays['d_' + sha] = detections
+            arrays['s_' + sha] = np.asarray(shape, dtype=np.int32)
+        tmp = self.path.with_name(self.path.stem + '.tmp.npz')
+        np.savez(tmp, **arrays)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+
+def load_split(images_dir, build_dir=None):
+    """
+    Imágenes del split con sus etiquetas YOLO y el hash de cada imagen.
+
+    El hash se toma del manifiesto de build_dataset.py si está disponible.
+
+    Returns:
+        list: [(ruta, sha256, etiquetas (M, 5) normalizadas cls, x, y, w, h)]
+    """
+    images_dir = Path(images_dir)
+    labels_dir = images_dir.parent.parent / 'labels' / images_dir.name
+    known = {}
+    if build_dir:
+        for entry in load_manifest(build_dir).get('files', {}).values():
+            if entry.get('valid'):
+                known[entry['name']] = entry['sha256']
+
+    samples = []
+    for path in sorted(images_dir.iterdir()):
+        if path.suffix.lower() not in IMAGE_EXTENSIONS:
+            continue
+        label_path = labels_dir / (path.stem + '.txt')
+        labels = np.zeros((0, 5), dtype=np.float32)
+        if label_path.exists():
+            loaded = np.loadtxt(label_path, dtype=np.float32, ndmin=2)
+            if loaded.size:
+                labels = loaded.reshape(-1, 5)
+        sha = known.get(path.name) or file_sha256(path)
+        samples.append((str(path), sha, labels))
+    return samples
+
+
+def predict_split(model_path, samples, imgsz, cache_dir, workers=None, batch=16):
+    """
+    Predicciones crudas de todas las imágenes, usando la caché cuando existe.
+
+    Returns:
+        list: [(detecciones (N, 6) o None, (h, w))] en el orden de samples
+    """
+    cache = PredictionCache(cache_dir, file_sha256(model_path), imgsz)
+    pending = [s for s in samples if cache.get(s[1]) is None]
+    if pending:
+        workers = workers or max(1, min(4, (os.cpu_count() or 1) // 2))
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        batches = [pending[i:i + batch] for i in range(0, len(pending), batch)]
+        logger.info(f"Inferencia de {len(pending)} imágenes ({len(samples) - len(pending)} en caché) "
+                    f"con {workers} procesos x {threads} threads")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_path, threads)) as pool:
+            jobs = [([s[0] for s in b], imgsz) for b in batches]
+            for chunk, outputs in zip(batches, pool.map(_predict_batch, jobs)):
+                for (_, sha, _), (detections, shape) in zip(chunk, outputs):
+                    if detections is not None:
+                        cache.put(sha, detections, shape)
+        cache.save()
+    return [cache.get(sha) or (None, (0, 0)) for _, sha, _ in samples]
+
+
+def labels_to_boxes(labels, shape):
+    """Etiquetas YOLO normalizadas -> (clase, cajas xyxy en píxeles)."""
+    h, w = shape
+    cls = labels[:, 0].astype(int)
+    x, y, bw, bh = labels[:, 1] * w, labels[:, 2] * h, labels[:, 3] * w, labels[:, 4] * h
+    return cls, np.stack([x - bw / 2, y - bh / 2, x + bw / 2, y + bh / 2], axis=1)
+
+
+def average_precision(recall, precision):
+    """AP como área bajo la curva precisión-recall interpolada (todos los puntos)."""
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    i = np.flatnonzero(mrec[1:] != mrec[:-1])
+    return float(np.sum((mrec[i + 1] - mrec[i]) * mpre[i + 1]))
+
+
+def _match(samples, predictions, iou_threshold):
+    """
+    Empareja predicciones y etiquetas por imagen (mayor confianza primero).
+
+    Returns:
+        tuple: (confianzas, clases predichas, acierto, etiquetas por clase)
+    """
+    confs, classes, hits = [], [], []
+    gt_counts = {}
+    for (_, _, labels), (detections, shape) in zip(samples, predictions):
+        if detections is None:
+            continue
+        gt_cls, gt_boxes = labels_to_boxes(labels, shape)
+        for c in gt_cls:
+            gt_counts[int(c)] = gt_counts.get(int(c), 0) + 1
+        order = np.argsort(-detections[:, 4])
+        detections = detections[order]
+        overlaps = box_iou(detections[:, :4], gt_boxes)
+        used = np.zeros(len(gt_boxes), dtype=bool)
+        for i, det in enumerate(detections):
+            cls = int(det[5])
+            candidates = np.flatnonzero((gt_cls == cls) & ~used & (overlaps[i] >= iou_threshold))
+            hit = candidates.size > 0
+            if hit:
+                used[candidates[np.argmax(overlaps[i, candidates])]] = True
+            confs.append(det[4])
+            classes.append(cls)
+            hits.append(hit)
+    return np.asarray(confs), np.asarray(classes, dtype=int), np.asarray(hits, dtype=bool), gt_counts
+
+
+def evaluate(samples, predictions, names, confidence, class_mapping):
+    """
+    Métricas a partir de las predicciones crudas.
+
+    Args:
+        samples (list): Salida de load_split
+        predictions (list): Salida de predict_split
+        names (dict): {id: nombre} de las clases del modelo
+        confidence (float): Umbral para precisión, recall y la matriz de confusión
+        class_mapping (dict): {nombre de clase: 'organic' | 'inorganic'}
+
+    Returns:
+        dict: Métricas por clase, mAP y matriz orgánico/inorgánico
+    """
+    per_class = {}
+    ap = {cls: [] for cls in names}
+    matches = [_match(samples, predictions, t) for t in IOU_THRESHOLDS]
+    for confs, classes, hits, gt_counts in matches:
+        for cls in names:
+            mask = classes == cls
+            n_gt = gt_counts.get(cls, 0)
+            if n_gt == 0:
+                continue
+            order = np.argsort(-confs[mask])
+            tp = np.cumsum(hits[mask][order])
+            fp = np.cumsum(~hits[mask][order])
+            recall = tp / n_gt
+            precision = tp / np.maximum(tp + fp, 1)
+            ap[cls].append(average_precision(recall, precision))
+
+    confs, classes, hits, gt_counts = matches[0]
+    for cls, name in names.items():
+        n_gt = gt_counts.get(cls, 0)
+        kept = (classes == cls) & (confs >= confidence)
+        tp = int(hits[kept].sum())
+        fp = int(kept.sum()) - tp
+        per_class[name] = {
+            'labels': n_gt,
+            'precision': round(tp / (tp + fp), 4) if tp + fp else 0.0,
+            'recall': round(tp / n_gt, 4) if n_gt else 0.0,
+            'ap50': round(ap[cls][0], 4) if ap[cls] else None,
+            'ap50_95': round(float(np.mean(ap[cls])), 4) if ap[cls] else None,
+        }
+
+    evaluated = [m for m in per_class.values() if m['ap50'] is not None]
+    tp_all = int(hits[confs >= confidence].sum())
+    predicted = int((confs >= confidence).sum())
+    labels = sum(gt_counts.values())
+    return {
+        'confidence': confidence,
+        'images': sum(1 for d, _ in predictions if d is not None),
+        'precision': round(tp_all / predicted, 4) if predicted else 0.0,
+        'recall': round(tp_all / labels, 4) if labels else 0.0,
+        'map50': round(float(np.mean([m['ap50'] for m in evaluated])), 4) if evaluated else 0.0,
+        'map50_95': round(float(np.mean([m['ap50_95'] for m in evaluated])), 4) if evaluated else 0.0,
+        'classes': per_class,
+        'waste_type_confusion': waste_type_confusion(samples, predictions, names, confidence, class_mapping),
+    }
+
+
+def waste_type_confusion(samples, predictions, names, confidence, class_mapping):
+    """
+    Matriz {tipo real: {tipo predicho: n}} por imagen, usando la detección
+    de mayor confianza sobre el umbral ('none' si no hay ninguna).
+    """
+    types = sorted(set(class_mapping.values()))
+    matrix = {t: {p: 0 for p in types + ['none']} for t in types}
+    for (_, _, labels), (detections, _) in zip(samples, predictions):
+        if detections is None or not len(labels):
+            continue
+        actual = class_mapping.get(names.get(int(labels[0, 0]), '').lower())
+        if actual is None:
+            continue
+        kept = detections[detections[:, 4] >= confidence]
+        predicted = 'none'
+        if len(kept):
+            best = names.get(int(kept[kept[:, 4].argmax(), 5]), '').lower()
+            predicted = class_mapping.get(best, 'none')
+        matrix[actual][predicted] += 1
+    return matrix
@@ -0,0 +1,72 @@
+"""
+Preparación de datos para el ajuste fino incremental.
+
+En lugar de reentrenar con todo el dataset, el ajuste fino parte de los pesos
+en producción y entrena unas pocas épocas con las muestras nuevas más una
+muestra de repetición (replay) del dataset original, para no olvidar lo ya
+aprendido. Las muestras nuevas se organizan como el origen del dataset (una
+carpeta por clase) y se convierten con build_dataset; el dataset combinado
+se describe con listas de imágenes, sin copiar las originales.
+"""
+
+import random
+from pathlib import Path
+
+import yaml
+
+from .dataset_builder import CLASS_NAMES, IMAGE_EXTENSIONS, build_dataset
+
+
+def _images(directory):
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+    return sorted(str(p.resolve()) for p in directory.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+
+
+def prepare_finetune_dataset(new_data_dir, base_build_dir, output_dir, replay_ratio=0.5,
+                             val_ratio=0.2, seed=0, workers=None):
+    """
+    Construye el dataset de ajuste fino.
+
+    Args:
+        new_data_dir (str): Muestras nuevas, una subcarpeta por clase
+        base_build_dir (str): Dataset original ya construido (build_dataset)
+        output_dir (str): Destino de las muestras nuevas convertidas y las listas
+        replay_ratio (float): Imágenes originales por cada imagen nueva
+        val_ratio (float): Proporción de muestras nuevas para validación
+        seed (int): Semilla de la muestra de repetición
+
+    Returns:
+        dict: yaml, new (imágenes nuevas de train), replay (imágenes originales)
+    """
+    output_dir = Path(output_dir)
+    # Las muestras nuevas no tienen listas de índices: split por hash del nombre
+    build_dataset(new_data_dir, new_data_dir, output_dir / 'new', workers=workers,
+                  val_ratio=val_ratio, test_ratio=0.0)
+    new_train = _images(output_dir / 'new' / 'images' / 'train')
+    new_val = _images(output_dir / 'new' / 'images' / 'val')
+    if not new_train:
+        raise ValueError(f"No hay muestras nuevas válidas en {new_data_dir}")
+
+    rng = random.Random(seed)
+    base_train = _images(Path(base_build_dir) / 'images' / 'train')
+    base_val = _images(Path(base_build_dir) / 'images' / 'val')
+    replay = rng.sample(base_train, min(len(base_train), int(len(new_train) * replay_ratio)))
+    # La validación incluye datos originales para detectar olvido
+    replay_val = rng.sample(base_val, min(len(base_val), max(len(new_val), len(replay) // 4)))
+
+    lists = {'train': new_train + replay, 'val': new_val + replay_val}
+    for split, paths in lists.items():
+        with open(output_dir / f'{split}.txt', 'w', encoding='utf-8') as f:
+            f.write('\n'.join(paths) + '\n')
+
+    dataset_yaml = output_dir / 'dataset.yaml'
+    with open(dataset_yaml, 'w', encoding='utf-8') as f:
+        yaml.safe_dump({
+            'path': str(output_dir.resolve()),
+            'train': 'train.txt',
+            'val': 'val.txt',
+            'names': dict(enumerate(CLASS_NAMES)),
+        }, f, sort_keys=False, allow_unicode=True)
+    return {'yaml': str(dataset_yaml), 'new': len(new_train), 'replay': len(replay)}
@@ -0,0 +1,249 @@
+"""
+Stream H.264 por cámara con un único codificador compartido.
+
+Un proceso ffmpeg por cámara recibe los frames en bruto por stdin y produce
+MP4 fragmentado (un fragmento por GOP) por stdout. Un thread separa el
+segmento de inicialización (ftyp + moov) y los fragmentos (moof + mdat) y
+los publica a todos los clientes conectados; cada cliente recibe el
+segmento de inicialización y a continuación los fragmentos nuevos, que el
+navegador reproduce con Media Source Extensions. La codificación se hace
+una sola vez por cámara, fuera del proceso de Python, sin importar cuántos
+clientes haya, y el codificador se detiene si nadie lo usa.
+
+Las detecciones no se dibujan en el vídeo: el cliente las superpone.
+"""
+
+import time
+import shutil
+import struct
+import logging
+import subprocess
+from collections import deque
+from threading import Thread, Lock, Condition
+
+import cv2
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Perfil baseline, nivel 3.1: el que anuncia H264Encoder.codec
+CODEC = 'avc1.42E01F'
+
+
+def ffmpeg_available(ffmpeg_path='ffmpeg'):
+    return shutil.which(ffmpeg_path) is not None
+
+
+def _read_exact(stream, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            return None
+        data.extend(chunk)
+    return bytes(data)
+
+
+def read_boxes(stream):
+    """Genera (tipo, bytes) por cada caja MP4 de primer nivel de `stream`."""
+    while True:
+        header = _read_exact(stream, 8)
+        if header is None:
+            return
+        size, kind = struct.unpack('>I4s', header)
+        if size == 1:
+            extended = _read_exact(stream, 8)
+            if extended is None:
+                return
+            header += extended
+            size = struct.unpack('>Q', extended)[0]
+        body = _read_exact(stream, size - len(header))
+        if body is None:
+            return
+        yield kind, header + body
+
+
+class H264Encoder:
+    """Codificador ffmpeg de una cámara y reparto de sus fragmentos MP4."""
+
+    codec = CODEC
+
+    def __init__(self, camera, fps=15, bitrate='500k', gop_seconds=1.0,
+                 ffmpeg_path='ffmpeg', idle_timeout=30.0, backlog=4):
+        """
+        Args:
+            camera (CameraCapture): Cámara de origen
+            fps (int): Frames por segundo enviados al codificador
+            bitrate (str): Bitrate objetivo de ffmpeg (p. ej. '500k')
+            gop_seconds (float): Segundos entre keyframes (= duración de un fragmento)
+            ffmpeg_path (str): Ejecutable de ffmpeg
+            idle_timeout (float): Segundos sin clientes antes de detener ffmpeg
+            backlog (int): Fragmentos recientes guardados para clientes lentos
+        """
+        self.camera = camera
+        self.fps = fps
+        self.bitrate = bitrate
+        self.gop = max(1, int(round(fps * gop_seconds)))
+        self.ffmpeg_path = ffmpeg_path
+        self.idle_timeout = idle_timeout
+        self._process = None
+        self._size = None
+        self._init_segment = None
+        self._fragments = deque(maxlen=backlog)  # (seq, bytes)
+        self._seq = 0
+        self._condition = Condition()
+        self._lock = Lock()
+        self._viewers = 0
+        self._idle_since = time.monotonic()
+
+    @property
+    def running(self):
+        return self._process is not None and self._process.poll() is None
+
+    def _command(self, width, height):
+        return [
+            self.ffmpeg_path, '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}',
+            '-r', str(self.fps), '-i', '-',
+            '-an', '-c:v', 'libx264', '-preset', 'veryfast', '-tune', 'zerolatency',
+            '-profile:v', 'baseline', '-level', '3.1', '-pix_fmt', 'yuv420p',
+            '-b:v', self.bitrate, '-g', str(self.gop), '-keyint_min', str(self.gop),
+            '-sc_threshold', '0',
+            '-f', 'mp4', '-movflags', 'frag_keyframe+empty_moov+default_base_moof', '-',
+        ]
+
+    def _ensure_running(self):
+        with self._lock:
+            if self.running:
+                return True
+            seq, frame = self.camera.latest_frame()
+            if frame is None:
+                return False
+            height, width = frame.shape[:2]
+            self._size = (width, height)
+            with self._condition:
+                self._init_segment = None
+                self._fragments.clear()
+            self._process = subprocess.Popen(
+                self._command(width, height),
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+            process = self._process
+            Thread(target=self._feed, args=(process,), daemon=True,
+                   name=f'h264-feed-{self.camera.camera_id}').start()
+            Thread(target=self._read, args=(process,), daemon=True,
+                   name=f'h264-read-{self.camera.camera_id}').start()
+            logger.info(f"Codificador H.264 iniciado para cámara {self.camera.camera_id} "
+                        f"({width}x{height} @ {self.fps}fps, {self.bitrate})")
+            return True
+
+    def _feed(self, process):
+        """Envía el último frame a ffmpeg a ritmo constante (repite si no hay uno nuevo)."""
+        interval = 1.0 / self.fps
+        next_time = time.monotonic()
+        try:
+            while process.poll() is None:
+                if self._viewers == 0 and time.monotonic() - self._idle_since > self.idle_timeout:
+                    logger.info(f"Codificador H.264 de cámara {self.camera.camera_id} sin clientes, deteniendo")
+                    break
+                _, frame = self.camera.latest_frame()
+                if frame is not None:
+                    if frame.shape[1::-1] != self._size:
+                        frame = cv2.resize(frame, self._size, interpolation=cv2.INTER_AREA)
+                    process.stdin.write(frame.tobytes())
+                next_time += interval
+                time.sleep(max(0.0, next_time - time.monotonic()))
+        except (BrokenPipeError, OSError, ValueError):
+            pass
+        finally:
+            self._terminate(process)
+
+    def _read(self, process):
+        """Separa la salida de ffmpeg en segmento de inicialización y fragmentos."""
+        init, fragment = [], []
+        for kind, box in read_boxes(process.stdout):
+            if kind in (b'ftyp', b'moov'):
+                init.append(box)
+                if kind == b'moov':
+                    with self._condition:
+                        self._init_segment = b''.join(init)
+                        self._condition.notify_all()
+            elif kind == b'moof':
+                fragment = [box]
+            elif kind == b'mdat' and fragment:
+                fragment.append(box)
+                with self._condition:
+                    self._seq += 1
+                    self._fragments.append((self._seq, b''.join(fragment)))
+                    self._condition.notify_all()
+                fragment = []
+        with self._condition:
+            self._condition.notify_all()
+
+    def _terminate(self, process):
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    def stream(self, label='h264'):
+        """
+        Generador de bytes MP4 fragmentado para un cliente: segmento de
+        inicialización y después cada fragmento nuevo. Si el cliente se
+        retrasa más que el backlog, salta fragmentos (cada uno empieza en
+        keyframe, así que sigue siendo decodificable).
+        """
+        camera_id = self.camera.camera_id
+        # Contar al cliente antes de arrancar para que ffmpeg no se detenga por inactividad
+        with self._lock:
+            self._viewers += 1
+        metrics.ACTIVE_VIEWERS.inc(camera=camera_id, stream=label)
+        try:
+            if not self._ensure_running():
+                return
+            with self._condition:
+                self._condition.wait_for(lambda: self._init_segment is not None or not self.running,
+                                         timeout=10)
+                init = self._init_segment
+                last = self._fragments[-2][0] if len(self._fragments) > 1 else 0
+            if init is None:
+                return
+            yield init
+            metrics.STREAM_BYTES.inc(len(init), camera=camera_id, stream=label)
+            while self.running:
+                with self._condition:
+                    self._condition.wait_for(
+                        lambda: (self._fragments and self._fragments[-1][0] > last) or not self.running,
+                        timeout=5)
+                    pending = [(seq, data) for seq, data in self._fragments if seq > last]
+                for seq, data in pending:
+                    yield data
+                    metrics.STREAM_BYTES.inc(len(data), camera=camera_id, stream=label)
+                    last = seq
+        finally:
+            metrics.ACTIVE_VIEWERS.dec(camera=camera_id, stream=label)
+            with self._lock:
+                self._viewers -= 1
+                if self._viewers == 0:
+                    self._idle_since = time.monotonic()
+
+    def stop(self):
+        with self._lock:
+            process, self._process = self._process, None
+        if process is not None:
+            self._terminate(process)
+
+
+_encoders_lock = Lock()
+
+
+def get_h264_encoder(camera, **kwargs):
+    """Codificador de la cámara, creado la primera vez que se pide."""
+    with _encoders_lock:
+        if camera.h264 is None:
+            camera.h264 = H264Encoder(camera, **kwargs)
+        return camera.h264
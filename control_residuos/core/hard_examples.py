@@ -0,0 +1,260 @@
+"""
+Captura de ejemplos difíciles para reentrenamiento.
+
+HardExampleSampler decide en el bucle de detección, con operaciones mínimas
+sobre el arreglo de detecciones, si un frame es interesante: cajas con
+confianza dentro de una banda de incertidumbre o cajas que cambian de clase
+respecto al frame anterior en la misma posición. Los candidatos se entregan
+sin copiar a una cola acotada (si está llena se descartan) y un único thread
+de HardExampleStore recorta, codifica y guarda los recortes con sus metadatos
+en un almacén con límite de tamaño, deduplicado por pHash y con expulsión
+LRU. El almacén se exporta con una carpeta por clase, el formato de origen
+de build_dataset.
+"""
+
+import os
+import json
+import time
+import queue
+import shutil
+import hashlib
+import logging
+import traceback
+from pathlib import Path
+from datetime import datetime
+from collections import OrderedDict
+from threading import Thread, Lock, Event
+
+import cv2
+import numpy as np
+
+from .cascade import crop_box
+from .dedup import BKTree, phash_image
+from .model_rollout import box_iou
+
+logger = logging.getLogger(__name__)
+
+
+class HardExampleStore:
+    """Almacén de recortes con límite de bytes, deduplicación y LRU."""
+
+    def __init__(self, root, max_bytes, dedup_radius=4, quality=90, max_pending=16):
+        """
+        Args:
+            root (str): Directorio del almacén
+            max_bytes (int): Tamaño máximo en disco de los recortes
+            dedup_radius (int): Distancia de pHash bajo la cual un recorte es repetido
+            quality (int): Calidad JPEG de los recortes
+            max_pending (int): Candidatos en cola; si está llena se descartan
+        """
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.dedup_radius = dedup_radius
+        self.quality = quality
+        self.index_path = self.root / 'index.json'
+        self._entries = OrderedDict()  # clave -> metadatos, del menos al más reciente
+        self._bytes = 0
+        self._tree = BKTree()
+        self._lock = Lock()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stop = Event()
+        self._dirty = False
+        self.dropped = 0
+        self._load()
+        self._thread = Thread(target=self._run, name='hard-examples', daemon=True)
+        self._thread.start()
+
+    def _load(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            logger.warning(f"Índice de ejemplos difíciles inválido en {self.index_path}")
+            return
+        for key, entry in sorted(entries.items(), key=lambda kv: kv[1].get('last_used', 0)):
+            if (self.root / entry['file']).exists():
+                self._entries[key] = entry
+                self._bytes += entry['bytes']
+                self._tree.add(entry['phash'], key)
+
+    def submit(self, frame, boxes, names, camera_id, reasons):
+        """Encola un candidato sin bloquear (el frame no se copia)."""
+        try:
+            self._queue.put_nowait((frame, boxes, names, camera_id, reasons, datetime.now()))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                item = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                self._flush()
+                continue
+            try:
+                self._store(*item)
+            except Exception as e:
+                logger.error(f"Error al guardar ejemplo difícil: {str(e)}")
+                logger.error(traceback.format_exc())
+        self._flush()
+
+    def _is_duplicate(self, value):
+        return any(key in self._entries for _, key in self._tree.query(value, self.dedup_radius))
+
+    def _store(self, frame, boxes, names, camera_id, reasons, timestamp):
+        for box, reason in zip(boxes, reasons):
+            crop = crop_box(frame, box[:4])
+            if crop is None:
+                continue
+            value = phash_image(crop)
+            with self._lock:
+                if self._is_duplicate(value):
+                    continue
+            ok, encoded = cv2.imencode('.jpg', crop, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if not ok:
+                continue
+            data = encoded.tobytes()
+            key = hashlib.sha256(data).hexdigest()[:20]
+            class_name = names.get(int(box[5]), 'unknown').lower()
+            relative = f"{class_name}/{key}.jpg"
+            path = self.root / relative
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+            with self._lock:
+                self._entries[key] = {
+                    'file': relative,
+                    'class': class_name,
+                    'confidence': round(float(box[4]), 4),
+                    'reason': reason,
+                    'camera_id': camera_id,
+                    'timestamp': timestamp.isoformat(),
+                    'bytes': len(data),
+                    'phash': value,
+                    'last_used': time.time(),
+                }
+                self._bytes += len(data)
+                self._tree.add(value, key)
+                self._evict()
+                self._dirty = True
+
+    def _evict(self):
+        """Expulsa los recortes usados hace más tiempo hasta cumplir el límite."""
+        while self._bytes > self.max_bytes and self._entries:
+            key, entry = self._entries.popitem(last=False)
+            self._bytes -= entry['bytes']
+            try:
+                (self.root / entry['file']).unlink()
+            except OSError:
+                pass
+
+    def _flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = dict(self._entries)
+            self._dirty = False
+        tmp = self.index_path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+        os.replace(tmp, self.index_path)
+
+    def export(self, dest_dir, classes=None):
+        """
+        Copia los recortes a dest_dir/<clase>/ (formato de origen de
+        build_dataset) y marca los exportados como usados recientemente.
+
+        Las clases son las predichas por el modelo: revisarlas antes de entrenar.
+
+        Returns:
+            int: Recortes exportados
+        """
+        dest_dir = Path(dest_dir)
+        with self._lock:
+            selected = [(k, e) for k, e in self._entries.items()
+                        if classes is None or e['class'] in classes]
+            for key, _ in selected:
+                self._entries.move_to_end(key)
+                self._entries[key]['last_used'] = time.time()
+            self._dirty = True
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        metadata = {}
+        for key, entry in selected:
+            target = dest_dir / entry['file']
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(self.root / entry['file'], target)
+            metadata[entry['file']] = entry
+        with open(dest_dir / 'hard_examples.json', 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2)
+        self._flush()
+        return len(selected)
+
+    def stats(self):
+        with self._lock:
+            return {'items': len(self._entries), 'bytes': self._bytes,
+                    'max_bytes': self.max_bytes, 'dropped': self.dropped}
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+
+class HardExampleSampler:
+    """Selección de frames inciertos en el bucle de un detector."""
+
+    def __init__(self, store, camera_id, band=(0.25, 0.5), max_per_minute=6, flip_iou=0.5):
+        """
+        Args:
+            store (HardExampleStore): Almacén compartido
+            camera_id (int): Cámara del detector
+            band (tuple): Rango de confianza considerado incierto
+            max_per_minute (float): Frames enviados como máximo por minuto
+            flip_iou (float): IoU con la caja del frame anterior para detectar cambio de clase
+        """
+        self.store = store
+        self.camera_id = camera_id
+        self.band = band
+        self.interval = 60.0 / max_per_minute if max_per_minute > 0 else float('inf')
+        self.flip_iou = flip_iou
+        self._previous = None
+        self._last_sample = 0.0
+
+    def consider(self, frame, detections, names):
+        """Envía el frame al almacén si contiene cajas inciertas (coste mínimo)."""
+        previous, self._previous = self._previous, detections
+        now = time.monotonic()
+        if now - self._last_sample < self.interval or not len(detections):
+            return
+
+        low, high = self.band
+        uncertain = (detections[:, 4] >= low) & (detections[:, 4] < high)
+        flipped = np.zeros_like(uncertain)
+        if previous is not None and len(previous):
+            overlaps = box_iou(detections[:, :4], previous[:, :4])
+            best = overlaps.argmax(axis=1)
+            flipped = ((overlaps.max(axis=1) >= self.flip_iou)
+                       & (previous[best, 5] != detections[:, 5]))
+        selected = uncertain | flipped
+        if not selected.any():
+            return
+
+        self._last_sample = now
+        reasons = ['class_flip' if f else 'low_confidence'
+                   for f in flipped[selected]]
+        self.store.submit(frame, detections[selected], names, self.camera_id, reasons)
+
+
+_store = None
+_store_lock = Lock()
+
+
+def get_store(root, max_bytes, **kwargs):
+    """Almacén compartido por todos los detectores del proceso."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HardExampleStore(root, max_bytes, **kwargs)
+        return _store
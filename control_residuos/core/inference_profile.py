@@ -0,0 +1,71 @@
+"""
+Perfiles de inferencia por despliegue.
+
+El script tune_imgsz.py evalúa el modelo en el split de test a varios
+tamaños de entrada y backends, y guarda precisión y latencia de CPU de cada
+combinación en un JSON. WasteDetector carga ese perfil y usa el tamaño más
+pequeño que cumple el mínimo de precisión configurado.
+"""
+
+import os
+import json
+import logging
+
+from .utils import file_sha256
+
+logger = logging.getLogger(__name__)
+
+
+def load_profile(path):
+    """Carga un perfil de inferencia; devuelve None si no existe o es inválido."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"No se pudo leer el perfil de inferencia {path}: {str(e)}")
+        return None
+
+
+def save_profile(path, profile):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, indent=2)
+
+
+def select_entry(profile, model_path, accuracy_floor, backend='pytorch'):
+    """
+    Elige la entrada del perfil con menor tamaño de entrada que cumple el
+    mínimo de precisión para el modelo y backend indicados.
+    
+    El perfil solo se aplica si fue generado con los mismos pesos (se
+    compara el hash del archivo, no la ruta).
+    
+    Returns:
+        dict: Entrada elegida o None si ninguna cumple
+    """
+    if not profile:
+        return None
+    if profile.get('model_sha256') != file_sha256(model_path):
+        logger.warning("El perfil de inferencia corresponde a otro modelo; se ignora")
+        return None
+    
+    candidates = [
+        entry for entry in profile.get('entries', [])
+        if entry.get('backend') == backend and entry.get('accuracy', 0) >= accuracy_floor
+    ]
+    if not candidates:
+        logger.warning(f"Ninguna configuración del perfil alcanza la precisión mínima {accuracy_floor}")
+        return None
+    return min(candidates, key=lambda e: (e['imgsz'], e.get('latency_p50_ms', 0)))
+
+
+def resolve_imgsz(model_path, profile_path, accuracy_floor):
+    """Tamaño de entrada a usar para model_path según el perfil, o None."""
+    entry = select_entry(load_profile(profile_path), model_path, accuracy_floor)
+    if entry is None:
+        return None
+    logger.info(f"Perfil de inferencia: imgsz={entry['imgsz']} "
+                f"(precisión {entry['accuracy']:.3f}, p50 {entry.get('latency_p50_ms')} ms)")
+    return entry['imgsz']
@@ -0,0 +1,295 @@
+"""
+Ejecución de la inferencia YOLO en procesos dedicados.
+
+Cada WasteDetector en modo 'process' lanza un InferenceWorker: un proceso
+que carga el modelo una sola vez, recibe los frames a través de un bloque de
+memoria compartida (sin serializar la imagen) y devuelve un arreglo compacto
+de detecciones. Así el trabajo en Python de la inferencia no compite por el
+GIL con la captura, los demás detectores ni los threads de Flask.
+
+Con el método 'spawn' el hijo vuelve a importar el módulo principal
+(__main__): los scripts de arranque deben dejar sus efectos (logging, chdir,
+importar la app web) bajo `if __name__ == '__main__':`. Si el proceso se
+cuelga o termina inesperadamente, la petición en curso falla y el worker se
+reinicia.
+"""
+
+import os
+import logging
+import traceback
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from threading import Lock
+
+import cv2
+import numpy as np
+
+from .thread_budget import apply_thread_limits
+
+logger = logging.getLogger(__name__)
+
+# Columnas del arreglo de resultados: x1, y1, x2, y2, confianza, clase
+RESULT_COLUMNS = 6
+
+# Parámetros de predicción compartidos por el modo thread y el modo process
+PREDICT_OPTIONS = {
+    'verbose': False,       # Desactivar verbose para menos logs
+    'iou': 0.45,            # IOU menos estricto para mejor rendimiento
+    'max_det': 10,          # Aumentar detecciones máximas
+    'agnostic_nms': True,   # NMS agnóstico para mejor rendimiento
+    'stream': True,         # Modo stream para mejor rendimiento
+    'device': 'cpu',        # Forzar CPU para estabilidad
+    'half': True,           # Usar half precision para mejor rendimiento
+}
+
+
+def results_to_array(results):
+    """
+    Convierte los resultados de ultralytics en un arreglo float32 (N, 6).
+    """
+    arrays = []
+    for r in results:
+        if r.boxes is None or len(r.boxes) == 0:
+            continue
+        boxes = r.boxes.cpu().numpy()
+        arrays.append(np.concatenate([
+            boxes.xyxy.reshape(-1, 4),
+            boxes.conf.reshape(-1, 1),
+            boxes.cls.reshape(-1, 1)
+        ], axis=1))
+    if not arrays:
+        return np.empty((0, RESULT_COLUMNS), dtype=np.float32)
+    return np.concatenate(arrays).astype(np.float32, copy=False)
+
+
+def predict(model, frame, confidence, **overrides):
+    """
+    Ejecuta la inferencia sobre un frame BGR y devuelve el arreglo compacto.
+    """
+    # Convertir a RGB para YOLO
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    options = dict(PREDICT_OPTIONS, conf=confidence, **overrides)
+    # El modo stream devuelve un generador; se consume aquí para que la
+    # inferencia ocurra dentro de esta llamada
+    return results_to_array(model.predict(source=frame_rgb, **options))
+
+
+def _attach_shared_memory(name):
+    try:
+        # Python 3.13+: evitar que el resource tracker del hijo lo elimine
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _worker_main(model_path, confidence, conn, num_threads):
+    """Punto de entrada del proceso de inferencia."""
+    shm = None
+    try:
+        if num_threads:
+            os.environ['OMP_NUM_THREADS'] = str(num_threads)
+            cv2.setNumThreads(num_threads)
+        import torch
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        from ultralytics import YOLO
+
+        model = YOLO(model_path)
+        model.fuse()
+        conn.send(('ready', {int(k): v for k, v in model.names.items()}))
+    except Exception as e:
+        conn.send(('error', f"{e}\n{traceback.format_exc()}"))
+        return
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+
+        command = message[0]
+        try:
+            if command == 'stop':
+                break
+            elif command == 'shm':
+                if shm is not None:
+                    shm.close()
+                shm = _attach_shared_memory(message[1])
+                conn.send(('ok', None))
+            elif command == 'threads':
+                apply_thread_limits(message[1], message[2])
+                conn.send(('ok', None))
+            elif command == 'infer':
+                _, shape, conf, options = message
+                frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+                result = predict(model, frame, conf, **options)
+                # Liberar la vista para poder cerrar el bloque si se reemplaza
+                del frame
+                conn.send(('result', result))
+            else:
+                conn.send(('error', f"Comando desconocido: {command}"))
+        except Exception as e:
+            conn.send(('error', f"{e}\n{traceback.format_exc()}"))
+
+    if shm is not None:
+        shm.close()
+
+
+class InferenceWorker:
+    """Proceso de inferencia dedicado a un detector."""
+
+    def __init__(self, model_path, confidence, num_threads=None,
+                 start_method=None, startup_timeout=180, request_timeout=30):
+        """
+        Args:
+            model_path (str): Ruta a los pesos YOLO
+            confidence (float): Umbral de confianza por defecto
+            num_threads (int, opcional): Threads de torch/OpenCV en el worker
+            start_method (str, opcional): 'spawn', 'fork' o 'forkserver'
+            startup_timeout (float): Segundos máximos para cargar el modelo
+            request_timeout (float): Segundos máximos por petición antes de
+                dar el proceso por colgado y reiniciarlo
+        """
+        self.model_path = model_path
+        self.confidence = confidence
+        self.num_threads = num_threads
+        self.start_method = start_method or 'spawn'
+        self.startup_timeout = startup_timeout
+        self.request_timeout = request_timeout
+        self.names = {}
+        self._cpus = None
+        self.restarts = 0
+        self._process = None
+        self._conn = None
+        self._shm = None
+        self._lock = Lock()
+
+    def start(self):
+        """Lanza el proceso y espera a que el modelo esté cargado."""
+        with self._lock:
+            return self._start()
+
+    def _start(self):
+        ctx = mp.get_context(self.start_method)
+        parent_conn, child_conn = ctx.Pipe()
+        self._process = ctx.Process(
+            target=_worker_main,
+            args=(self.model_path, self.confidence, child_conn, self.num_threads),
+            name=f'inference-{os.path.basename(self.model_path)}',
+            daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+
+        try:
+            if not self._conn.poll(self.startup_timeout):
+                raise RuntimeError("El proceso de inferencia no respondió a tiempo")
+            status, payload = self._conn.recv()
+        except (EOFError, OSError):
+            self._shutdown()
+            raise RuntimeError("El proceso de inferencia terminó durante la carga del modelo")
+        except RuntimeError:
+            self._shutdown()
+            raise
+        if status != 'ready':
+            self._shutdown()
+            raise RuntimeError(f"Error al cargar el modelo en el proceso de inferencia: {payload}")
+
+        self.names = payload
+        logger.info(f"Proceso de inferencia iniciado (pid={self._process.pid})")
+        return self.names
+
+    def _request(self, *message):
+        """Envía una petición y espera la respuesta. Llamar con _lock."""
+        try:
+            self._conn.send(message)
+            if not self._conn.poll(self.request_timeout):
+                raise TimeoutError
+            status, payload = self._conn.recv()
+        except TimeoutError:
+            self._restart(f"sin respuesta en {self.request_timeout}s a '{message[0]}'")
+            raise RuntimeError("El proceso de inferencia no respondió a tiempo; reiniciado")
+        except (EOFError, OSError):
+            self._restart(f"terminó inesperadamente durante '{message[0]}'")
+            raise RuntimeError("El proceso de inferencia terminó inesperadamente; reiniciado")
+        if status == 'error':
+            raise RuntimeError(f"Error en el proceso de inferencia: {payload}")
+        return payload
+
+    def _restart(self, reason):
+        """Sustituye un proceso colgado o caído por uno nuevo. Llamar con _lock."""
+        logger.error(f"Proceso de inferencia (pid={self._process.pid if self._process else None}) "
+                     f"{reason}, reiniciando")
+        self._shutdown(timeout=1)
+        self.restarts += 1
+        self._start()
+        if self._cpus is not None:
+            self._request('threads', self.num_threads, self._cpus)
+
+    def _ensure_buffer(self, nbytes):
+        if self._shm is not None and self._shm.size >= nbytes:
+            return
+        old = self._shm
+        self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        self._request('shm', self._shm.name)
+        if old is not None:
+            old.close()
+            old.unlink()
+
+    def infer(self, frame, confidence=None, **options):
+        """
+        Envía un frame al proceso y devuelve el arreglo (N, 6) de detecciones.
+        
+        Los argumentos adicionales (p. ej. imgsz) se pasan a model.predict.
+        """
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        with self._lock:
+            if self._process is None:
+                raise RuntimeError("El proceso de inferencia no está activo")
+            if not self._process.is_alive():
+                self._restart("terminó inesperadamente")
+            self._ensure_buffer(frame.nbytes)
+            view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._shm.buf)
+            view[...] = frame
+            return self._request('infer', frame.shape,
+                                 self.confidence if confidence is None else confidence,
+                                 options)
+
+    def set_threads(self, threads, cpus=None):
+        """Cambia el número de threads (y la afinidad) del proceso de inferencia."""
+        with self._lock:
+            self._request('threads', threads, cpus)
+            self.num_threads, self._cpus = threads, cpus
+
+    def is_alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def stop(self, timeout=5):
+        """Detiene el proceso y libera la memoria compartida."""
+        with self._lock:
+            self._shutdown(timeout)
+
+    def _shutdown(self, timeout=5):
+        if self._conn is not None:
+            try:
+                self._conn.send(('stop',))
+            except (BrokenPipeError, OSError):
+                pass
+        if self._process is not None:
+            self._process.join(timeout)
+            if self._process.is_alive():
+                logger.warning("El proceso de inferencia no terminó a tiempo, forzando cierre")
+                self._process.terminate()
+                self._process.join(1)
+                if self._process.is_alive():
+                    self._process.kill()
+                    self._process.join(1)
+            self._process = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
@@ -1,7 +1,13 @@
 import logging
+import logging.handlers
 import os
 import sys
+import time
+import queue
+import atexit
 import codecs
+import threading
+from collections import OrderedDict
 
 def setup_logging(name, log_file=None):
     """
@@ -47,6 +53,127 @@ def setup_logging(name, log_file=None):
     
     return logger
 
+class RateLimitFilter(logging.Filter):
+    """
+    Limita mensajes repetitivos: permite hasta `burst` registros por plantilla
+    de mensaje (logger + msg sin formatear) en cada ventana de `interval`
+    segundos y descarta el resto, indicando cuántos se suprimieron en el
+    siguiente mensaje emitido.
+    
+    Funciona mejor con formato diferido (logger.info("x=%s", x)), ya que así
+    todos los mensajes de una misma línea comparten plantilla. Con mensajes ya
+    formateados (f-strings) cada texto distinto es una plantilla: las ventanas
+    vencidas se descartan y se guardan a lo sumo `max_keys`.
+    """
+
+    def __init__(self, interval=10.0, burst=20, max_keys=1024):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.max_keys = max_keys
+        self._windows = OrderedDict()  # Ordenadas por inicio de ventana
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                self._windows.move_to_end(key)
+                self._prune(now)
+            elif window[1] < self.burst:
+                window[1] += 1
+                suppressed = 0
+            else:
+                window[2] += 1
+                return False
+        
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} mensajes similares suprimidos)"
+        return True
+
+    def _prune(self, now):
+        """Descarta las ventanas vencidas y las más antiguas por encima de max_keys."""
+        while self._windows:
+            start = next(iter(self._windows.values()))[0]
+            if now - start < self.interval and len(self._windows) <= self.max_keys:
+                break
+            self._windows.popitem(last=False)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que no formatea el registro en el thread que lo emite.
+    
+    El QueueHandler estándar formatea el mensaje en prepare() para poder
+    serializarlo; con una cola en memoria no es necesario, así que el
+    formateo y la escritura quedan a cargo del thread del QueueListener.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+_listener = None
+
+
+def setup_async_logging(log_file=None, level=logging.INFO,
+                        fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                        rate_interval=10.0, rate_burst=20):
+    """
+    Configura el logger raíz para que todos los módulos (core/, web/) escriban
+    en una cola; un QueueListener en segundo plano formatea y escribe en
+    consola y archivo, de modo que la E/S nunca bloquea captura ni inferencia.
+    
+    Args:
+        log_file (str, opcional): Ruta al archivo de log
+        level (int): Nivel mínimo del logger raíz
+        fmt (str): Formato de los mensajes
+        rate_interval (float): Ventana en segundos del limitador de mensajes
+        rate_burst (int): Mensajes permitidos por plantilla y ventana
+    
+    Returns:
+        logging.handlers.QueueListener: Listener en ejecución
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    
+    formatter = logging.Formatter(fmt)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(rate_interval, rate_burst))
+    
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    
+    _listener = logging.handlers.QueueListener(log_queue, *handlers,
+                                               respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_async_logging)
+    return _listener
+
+
+def stop_async_logging():
+    """Vacía la cola pendiente y detiene el listener."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 # Constantes para símbolos de estado
 OK = "[OK]"
 ERROR = "[ERROR]"
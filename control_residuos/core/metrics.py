@@ -0,0 +1,310 @@
+"""
+Instrumentación del pipeline con métricas compatibles con Prometheus.
+
+Los histogramas y contadores acumulan en estructuras por thread (sin locks
+en el camino caliente); los acumuladores de todos los threads se combinan
+solo cuando se exporta el texto para el endpoint /metrics. Al exportar, los
+shards de threads ya terminados se suman a un acumulador base y se descartan,
+así que los threads efímeros (p. ej. los de peticiones de Flask) no dejan
+shards acumulándose.
+"""
+
+import time
+import weakref
+import threading
+from bisect import bisect_left
+
+# Buckets en segundos pensados para etapas de 0.5 ms a varios segundos
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.075, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (f'{name}="{_escape(value)}"' for name, value in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base común: nombre, ayuda, etiquetas y shards por thread."""
+
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []  # (weakref al thread, shard)
+        self._base = {}  # Acumulado de los threads terminados
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = {}
+            self._local.shard = shard
+            # Solo se toma el lock la primera vez que un thread escribe
+            with self._shards_lock:
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+        return shard
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} espera etiquetas {self.labelnames}, recibió {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _merged(self):
+        """Combina todos los shards; los de threads terminados pasan a la base."""
+        merged = {}
+        with self._shards_lock:
+            live = []
+            for ref, shard in self._shards:
+                thread = ref()
+                if thread is None or not thread.is_alive():
+                    self._merge_shard(self._base, shard)
+                else:
+                    live.append((ref, shard))
+            self._shards = live
+            self._merge_shard(merged, self._base)
+            for _, shard in live:
+                self._merge_shard(merged, shard)
+        return merged
+
+    def _merge_shard(self, target, shard):
+        raise NotImplementedError
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} {self.type_name}']
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Contador monotónico."""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def _merge_shard(self, target, shard):
+        for key, value in list(shard.items()):
+            target[key] = target.get(key, 0) + value
+
+    def _samples(self):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in sorted(self._merged().items())]
+
+
+class Histogram(_Metric):
+    """Histograma con buckets acumulativos al exportar."""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        entry = shard.get(key)
+        if entry is None:
+            # [conteos por bucket (+Inf al final), suma, total]
+            entry = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            shard[key] = entry
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def time(self, **labels):
+        """Context manager que observa la duración del bloque."""
+        return _Timer(self, labels)
+
+    def _merge_shard(self, target, shard):
+        for key, (counts, total, count) in list(shard.items()):
+            entry = target.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            for i, c in enumerate(list(counts)):
+                entry[0][i] += c
+            entry[1] += total
+            entry[2] += count
+
+    def _samples(self):
+        lines = []
+        for key, (counts, total, count) in sorted(self._merged().items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float('inf'),), counts):
+                cumulative += c
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Gauge(_Metric):
+    """Valor instantáneo; admite set/inc/dec o una función evaluada al exportar."""
+
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        self._functions = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, func, **labels):
+        self._functions[self._key(labels)] = func
+
+    def remove(self, **labels):
+        key = self._key(labels)
+        self._values.pop(key, None)
+        self._functions.pop(key, None)
+
+    def _samples(self):
+        values = dict(self._values)
+        for key, func in list(self._functions.items()):
+            try:
+                values[key] = func()
+            except Exception:
+                continue
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in sorted(values.items())]
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """Conjunto de métricas exportadas por el endpoint /metrics."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def expose(self):
+        """Texto en formato de exposición de Prometheus (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+registry = MetricsRegistry()
+
+# Captura
+CAPTURE_INTERVAL = registry.histogram(
+    'residuos_capture_interval_seconds',
+    'Intervalo entre frames leídos de la cámara', ('camera',))
+PREPROCESS_SECONDS = registry.histogram(
+    'residuos_preprocess_seconds',
+    'Duración del preprocesado de frames', ('camera',))
+QUEUE_DEPTH = registry.gauge(
+    'residuos_frame_queue_depth',
+    'Frames preprocesados pendientes de consumir por el detector', ('camera',))
+DROPPED_FRAMES = registry.counter(
+    'residuos_dropped_frames_total',
+    'Frames preprocesados reemplazados antes de ser consumidos', ('camera',))
+CAPTURE_ERRORS = registry.counter(
+    'residuos_capture_errors_total',
+    'Lecturas fallidas de la cámara', ('camera',))
+
+# Detección
+INFERENCE_SECONDS = registry.histogram(
+    'residuos_inference_seconds',
+    'Duración de la inferencia YOLO', ('camera',))
+POSTPROCESS_SECONDS = registry.histogram(
+    'residuos_postprocess_seconds',
+    'Duración del postproceso de resultados', ('camera',))
+DETECTIONS = registry.counter(
+    'residuos_detections_total',
+    'Detecciones válidas por clase', ('camera', 'class'))
+
+# Cascada
+CASCADE_ESCALATIONS = registry.counter(
+    'residuos_cascade_escalations_total',
+    'Cajas ambiguas enviadas al modelo grande', ('camera',))
+RESCORE_SECONDS = registry.histogram(
+    'residuos_cascade_rescore_seconds',
+    'Duración de cada lote de reclasificación del modelo grande')
+RESCORE_BATCH_SIZE = registry.histogram(
+    'residuos_cascade_batch_size',
+    'Recortes por lote de reclasificación', buckets=(1, 2, 4, 8, 16, 32))
+
+# Streaming
+DRAW_SECONDS = registry.histogram(
+    'residuos_draw_seconds',
+    'Duración del dibujo de detecciones sobre el frame', ('camera',))
+ENCODE_SECONDS = registry.histogram(
+    'residuos_encode_seconds',
+    'Duración de la codificación JPEG', ('camera',))
+ACTIVE_VIEWERS = registry.gauge(
+    'residuos_active_viewers',
+    'Clientes conectados a un stream', ('camera', 'stream'))
+STREAM_BYTES = registry.counter(
+    'residuos_stream_bytes_total',
+    'Bytes enviados a los clientes de un stream', ('camera', 'stream'))
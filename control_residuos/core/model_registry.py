@@ -0,0 +1,291 @@
+"""
+Registro de modelos entrenados.
+
+Indexa cada ejecución de entrenamiento bajo runs/<tarea>/ (args.yaml,
+métricas de results.csv y hash de weights/best.pt) y guarda los artefactos
+derivados (modelo fusionado, exportaciones ONNX/OpenVINO, cuantizados,
+benchmarks por imgsz) en un directorio por hash de contenido, de modo que
+nunca se reconstruyen dos veces para los mismos pesos.
+
+Los detectores pueden pedir "el último modelo que pasa" por nombre: las
+ejecuciones waste_detector, waste_detector2 y waste_detector3 pertenecen a
+la familia 'waste_detector'.
+"""
+
+import os
+import re
+import csv
+import json
+import shutil
+import logging
+from pathlib import Path
+from datetime import datetime
+
+import yaml
+from filelock import FileLock
+
+from .utils import file_sha256
+
+logger = logging.getLogger(__name__)
+
+# Métrica usada para decidir si un modelo "pasa"
+DEFAULT_METRIC = 'metrics/mAP50-95(B)'
+
+
+def run_family(run_name):
+    """Nombre de la familia de una ejecución ('waste_detector3' -> 'waste_detector')."""
+    return re.sub(r'\d+$', '', run_name)
+
+
+def read_results(path):
+    """
+    Lee results.csv de ultralytics.
+
+    Returns:
+        dict: {'epochs': n, 'final': {...}, 'best': {...}} con métricas float
+    """
+    rows = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            parsed = {}
+            for key, value in row.items():
+                try:
+                    parsed[key.strip()] = float(value)
+                except (TypeError, ValueError):
+                    continue
+            rows.append(parsed)
+    if not rows:
+        return {'epochs': 0, 'final': {}, 'best': {}}
+    metric_keys = [k for k in rows[-1] if k.startswith('metrics/')]
+    return {
+        'epochs': len(rows),
+        'final': {k: rows[-1][k] for k in metric_keys},
+        'best': {k: max(r.get(k, 0.0) for r in rows) for k in metric_keys},
+    }
+
+
+class ModelRegistry:
+    """Índice de ejecuciones de entrenamiento y caché de artefactos por hash."""
+
+    def __init__(self, runs_dir, registry_dir):
+        """
+        Args:
+            runs_dir (str): Directorio runs/ de ultralytics
+            registry_dir (str): Directorio del índice y los artefactos
+        """
+        self.runs_dir = Path(runs_dir)
+        self.registry_dir = Path(registry_dir)
+        self.index_path = self.registry_dir / 'index.json'
+        self.artifacts_dir = self.registry_dir / 'artifacts'
+        self.registry_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = FileLock(str(self.registry_dir / 'index.lock'))
+
+    def _load_index(self):
+        if not self.index_path.exists():
+            return {'runs': {}}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Índice de modelos inválido, se regenera: {str(e)}")
+            return {'runs': {}}
+
+    def _save_index(self, index):
+        tmp = self.index_path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp, self.index_path)
+
+    def scan(self):
+        """
+        Actualiza el índice con las ejecuciones en runs_dir.
+
+        Los pesos solo se vuelven a hashear si cambió su tamaño o fecha.
+
+        Returns:
+            dict: Entradas indexadas por 'tarea/ejecución'
+        """
+        with self._lock:
+            index = self._load_index()
+            previous = index.get('runs', {})
+            runs = {}
+            for args_path in sorted(self.runs_dir.glob('*/*/args.yaml')):
+                run_dir = args_path.parent
+                key = f"{run_dir.parent.name}/{run_dir.name}"
+                try:
+                    runs[key] = self._index_run(run_dir, previous.get(key))
+                except Exception as e:
+                    logger.warning(f"No se pudo indexar la ejecución {key}: {str(e)}")
+            index['runs'] = runs
+            index['scanned'] = datetime.now().isoformat()
+            self._save_index(index)
+        return runs
+
+    def _index_run(self, run_dir, previous=None):
+        with open(run_dir / 'args.yaml', 'r', encoding='utf-8') as f:
+            args = yaml.safe_load(f) or {}
+        entry = {
+            'name': run_dir.name,
+            'family': run_family(run_dir.name),
+            'task': args.get('task', run_dir.parent.name),
+            'path': str(run_dir),
+            'args': {k: args.get(k) for k in ('model', 'data', 'epochs', 'imgsz', 'batch', 'device')},
+            'metrics': None,
+            'weights': None,
+            'sha256': None,
+            'modified': None,
+        }
+        results = run_dir / 'results.csv'
+        if results.exists():
+            entry['metrics'] = read_results(results)
+
+        weights = run_dir / 'weights' / 'best.pt'
+        if weights.exists():
+            stat = weights.stat()
+            entry['weights'] = str(weights)
+            entry['modified'] = stat.st_mtime
+            entry['size'] = stat.st_size
+            if (previous and previous.get('sha256') and previous.get('size') == stat.st_size
+                    and previous.get('modified') == stat.st_mtime):
+                entry['sha256'] = previous['sha256']
+            else:
+                entry['sha256'] = file_sha256(weights)
+        # Lo guardado con record() no sale de la ejecución: se conserva
+        if previous and previous.get('extra'):
+            entry['extra'] = previous['extra']
+        return entry
+
+    def runs(self):
+        """Entradas del índice (sin volver a escanear)."""
+        return self._load_index().get('runs', {})
+
+    def latest(self, family, min_score=0.0, metric=DEFAULT_METRIC, task='detect'):
+        """
+        Última ejecución de la familia con pesos y métrica >= min_score.
+
+        Returns:
+            dict: Entrada del índice o None
+        """
+        candidates = []
+        for entry in self.scan().values():
+            if entry['family'] != family or entry['task'] != task or not entry['weights']:
+                continue
+            score = ((entry.get('metrics') or {}).get('best') or {}).get(metric, 0.0)
+            if score >= min_score:
+                candidates.append(entry)
+        if not candidates:
+            return None
+        return max(candidates, key=lambda e: e['modified'])
+
+    def record(self, run_key, **fields):
+        """Guarda información adicional (p. ej. resultados de evaluación) en una ejecución."""
+        with self._lock:
+            index = self._load_index()
+            entry = index.get('runs', {}).get(run_key)
+            if entry is None:
+                raise KeyError(f"Ejecución no registrada: {run_key}")
+            entry.setdefault('extra', {}).update(fields)
+            self._save_index(index)
+
+    # --- Artefactos por hash de contenido ---
+
+    def artifact_dir(self, sha256):
+        path = self.artifacts_dir / sha256
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def artifact(self, weights, kind, build):
+        """
+        Devuelve la ruta del artefacto `kind` de unos pesos, construyéndolo
+        solo si no existe.
+
+        Args:
+            weights (str): Ruta a los pesos .pt
+            kind (str): Nombre del artefacto (p. ej. 'onnx-320')
+            build (callable): build(weights, dest_dir) -> ruta generada
+        """
+        sha = file_sha256(weights)
+        directory = self.artifact_dir(sha)
+        manifest_path = directory / 'artifacts.json'
+        with FileLock(str(directory / 'build.lock')):
+            manifest = {}
+            if manifest_path.exists():
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            cached = manifest.get(kind)
+            if cached and os.path.exists(directory / cached):
+                return str(directory / cached)
+
+            logger.info(f"Construyendo artefacto {kind} para {sha[:12]}")
+            staging = directory / f'.{kind}.build'
+            shutil.rmtree(staging, ignore_errors=True)
+            staging.mkdir()
+            built = Path(build(weights, staging))
+            target = directory / f"{kind}{built.suffix}"
+            if target.exists():
+                if target.is_dir():
+                    shutil.rmtree(target)
+                else:
+                    target.unlink()
+            shutil.move(str(built), str(target))
+            shutil.rmtree(staging, ignore_errors=True)
+
+            manifest[kind] = target.name
+            with open(manifest_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+            return str(target)
+
+    def fused(self, weights):
+        """Pesos con capas Conv+BN fusionadas."""
+        def build(src, dest):
+            from ultralytics import YOLO
+            model = YOLO(src)
+            model.fuse()
+            path = dest / 'fused.pt'
+            model.save(str(path))
+            return path
+        return self.artifact(weights, 'fused', build)
+
+    def export(self, weights, fmt, imgsz, int8=False):
+        """Exportación de ultralytics (onnx, openvino...) a un tamaño de entrada fijo."""
+        kind = f"{fmt}-{imgsz}" + ('-int8' if int8 else '')
+
+        def build(src, dest):
+            from ultralytics import YOLO
+            staged = dest / Path(src).name
+            shutil.copy2(src, staged)
+            return YOLO(str(staged)).export(format=fmt, imgsz=imgsz, int8=int8, device='cpu')
+        return self.artifact(weights, kind, build)
+
+    def save_benchmark(self, weights, name, data):
+        """Guarda un resultado de benchmark (JSON) junto a los artefactos de los pesos."""
+        path = self.artifact_dir(file_sha256(weights)) / f'benchmark-{name}.json'
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        return str(path)
+
+    def load_benchmark(self, weights, name):
+        path = self.artifact_dir(file_sha256(weights)) / f'benchmark-{name}.json'
+        if not path.exists():
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+
+def resolve_model_path(registry, family, min_score, fallback):
+    """
+    Ruta de los pesos del último modelo de `family` que pasa min_score,
+    o `fallback` si no hay ninguno.
+    """
+    if not family:
+        return fallback
+    try:
+        entry = registry.latest(family, min_score)
+    except Exception as e:
+        logger.error(f"Error al consultar el registro de modelos: {str(e)}")
+        entry = None
+    if entry is None:
+        logger.warning(f"No hay modelo '{family}' que alcance {min_score}; se usa {fallback}")
+        return fallback
+    logger.info(f"Registro de modelos: {entry['name']} ({entry['sha256'][:12]})")
+    return entry['weights']
@@ -0,0 +1,198 @@
+"""
+Despliegue de modelos sin detener los detectores.
+
+- ModelBackend: carga un modelo (en este proceso o en un InferenceWorker) y
+  lo calienta antes de que un detector lo adopte entre dos frames.
+- ShadowEvaluator: ejecuta un modelo candidato sobre una fracción de los
+  frames en un thread aparte y compara sus detecciones y latencia con las
+  del modelo en producción.
+"""
+
+import time
+import queue
+import logging
+import traceback
+from threading import Thread, Lock, Event
+
+import numpy as np
+
+from .inference_worker import InferenceWorker, predict
+
+logger = logging.getLogger(__name__)
+
+
+class ModelBackend:
+    """Modelo cargado y listo para inferir, en modo thread o process."""
+
+    def __init__(self, model_path, execution_mode='thread', confidence=0.3,
+                 num_threads=None, start_method=None, request_timeout=30):
+        self.model_path = model_path
+        self.execution_mode = execution_mode
+        self.confidence = confidence
+        self.num_threads = num_threads
+        self.start_method = start_method
+        self.request_timeout = request_timeout
+        self.predict_options = {}  # Opciones de predicción propias del modelo (p. ej. imgsz)
+        self.model = None
+        self.worker = None
+
+    def load(self):
+        if self.execution_mode == 'process':
+            self.worker = InferenceWorker(self.model_path, self.confidence,
+                                          num_threads=self.num_threads,
+                                          start_method=self.start_method,
+                                          request_timeout=self.request_timeout)
+            self.worker.start()
+        else:
+            from ultralytics import YOLO
+            self.model = YOLO(self.model_path)
+            self.model.fuse()
+        return self
+
+    @property
+    def names(self):
+        if self.worker is not None:
+            return self.worker.names
+        return self.model.names if self.model is not None else {}
+
+    def infer(self, frame, confidence=None, **options):
+        confidence = self.confidence if confidence is None else confidence
+        if self.worker is not None:
+            return self.worker.infer(frame, confidence, **options)
+        return predict(self.model, frame, confidence, **options)
+
+    def warmup(self, frame, iterations=3, **options):
+        """Ejecuta algunas inferencias para que la primera real no sea lenta."""
+        for _ in range(iterations):
+            self.infer(frame, **options)
+
+    def stop(self):
+        if self.worker is not None:
+            self.worker.stop()
+            self.worker = None
+        self.model = None
+
+
+def box_iou(a, b):
+    """IoU entre cada caja de a (N, 4) y cada caja de b (M, 4)."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+def detection_agreement(primary, candidate, primary_names, candidate_names, iou=0.5):
+    """
+    Fracción de detecciones coincidentes (misma clase e IoU >= iou) entre
+    dos arreglos (N, 6). Dos frames sin detecciones cuentan como acuerdo.
+    """
+    if len(primary) == 0 and len(candidate) == 0:
+        return 1.0
+    overlaps = box_iou(primary[:, :4], candidate[:, :4])
+    matched = 0
+    used = set()
+    for i in range(len(primary)):
+        name = primary_names.get(int(primary[i, 5]), '').lower()
+        for j in np.argsort(-overlaps[i]):
+            if overlaps[i, j] < iou:
+                break
+            if j in used:
+                continue
+            if candidate_names.get(int(candidate[j, 5]), '').lower() == name:
+                used.add(j)
+                matched += 1
+                break
+    return matched / max(len(primary), len(candidate))
+
+
+class ShadowEvaluator:
+    """Evalúa un modelo candidato en paralelo al modelo en producción."""
+
+    def __init__(self, backend, sample_rate=0.1, confidence=0.3, options=None,
+                 max_pending=2):
+        """
+        Args:
+            backend (ModelBackend): Modelo candidato ya cargado
+            sample_rate (float): Fracción de frames a evaluar (0-1]
+            confidence (float): Umbral de confianza para ambos modelos
+            options (dict, opcional): Opciones extra de predicción
+            max_pending (int): Frames en espera; si está llena se descarta
+        """
+        self.backend = backend
+        self.sample_rate = sample_rate
+        self.confidence = confidence
+        self.options = options or {}
+        self._every = max(1, int(round(1.0 / sample_rate))) if sample_rate > 0 else 0
+        self._seen = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stop = Event()
+        self._lock = Lock()
+        self._agreements = []
+        self._primary_latency = []
+        self._candidate_latency = []
+        self._skipped = 0
+        self._thread = Thread(target=self._run, name='shadow-evaluator', daemon=True)
+        self._thread.start()
+
+    def maybe_submit(self, frame, detections, latency, names):
+        """Envía el frame a evaluación según la tasa de muestreo; nunca bloquea."""
+        if not self._every:
+            return
+        self._seen += 1
+        if self._seen % self._every:
+            return
+        try:
+            self._queue.put_nowait((frame, detections, latency, names))
+        except queue.Full:
+            self._skipped += 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                frame, primary, primary_latency, names = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            try:
+                start = time.perf_counter()
+                candidate = self.backend.infer(frame, self.confidence, **self.options)
+                latency = time.perf_counter() - start
+                agreement = detection_agreement(primary, candidate, names, self.backend.names)
+                with self._lock:
+                    self._agreements.append(agreement)
+                    self._primary_latency.append(primary_latency)
+                    self._candidate_latency.append(latency)
+            except Exception as e:
+                logger.error(f"Error en la evaluación en sombra: {str(e)}")
+                logger.error(traceback.format_exc())
+
+    def report(self):
+        with self._lock:
+            agreements = list(self._agreements)
+            primary = np.asarray(self._primary_latency) * 1000.0
+            candidate = np.asarray(self._candidate_latency) * 1000.0
+        report = {
+            'model_path': self.backend.model_path,
+            'sample_rate': self.sample_rate,
+            'frames_evaluated': len(agreements),
+            'frames_skipped': self._skipped,
+        }
+        if agreements:
+            report.update({
+                'agreement_mean': round(float(np.mean(agreements)), 4),
+                'primary_latency_p50_ms': round(float(np.percentile(primary, 50)), 2),
+                'candidate_latency_p50_ms': round(float(np.percentile(candidate, 50)), 2),
+                'primary_latency_p95_ms': round(float(np.percentile(primary, 95)), 2),
+                'candidate_latency_p95_ms': round(float(np.percentile(candidate, 95)), 2),
+            })
+        return report
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self.backend.stop()
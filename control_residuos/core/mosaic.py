@@ -0,0 +1,77 @@
+"""
+Mosaico de las cámaras activas en un único stream.
+
+Un panel con varias cámaras pide un solo stream: las cámaras se reducen al
+tamaño de una celda, se componen en una rejilla y la imagen se codifica una
+vez por intervalo para todos los clientes.
+"""
+
+import math
+import time
+from threading import Lock
+
+import cv2
+import numpy as np
+
+
+class Mosaic:
+    """Rejilla de cámaras codificada a lo sumo `fps` veces por segundo."""
+
+    def __init__(self, cameras, tile_size=(320, 240), fps=5, quality=70):
+        """
+        Args:
+            cameras (callable): Devuelve las cámaras (CameraCapture) a componer
+            tile_size (tuple): (ancho, alto) de cada celda
+            fps (float): Composiciones por segundo como máximo
+            quality (int): Calidad JPEG
+        """
+        self.cameras = cameras
+        self.tile_size = tuple(tile_size)
+        self.interval = 1.0 / fps
+        self.quality = quality
+        self._lock = Lock()
+        self._seq = 0
+        self._jpeg = None
+        self._time = 0.0
+
+    def compose(self, cameras):
+        """Imagen BGR con una celda por cámara, ordenadas por id."""
+        width, height = self.tile_size
+        columns = math.ceil(math.sqrt(len(cameras)))
+        rows = math.ceil(len(cameras) / columns)
+        canvas = np.zeros((rows * height, columns * width, 3), dtype=np.uint8)
+        for i, camera in enumerate(sorted(cameras, key=lambda c: c.camera_id)):
+            row, column = divmod(i, columns)
+            x, y = column * width, row * height
+            # En modo MJPEG directo cada celda se decodifica ya a su tamaño
+            _, frame = camera.latest_frame(self.tile_size)
+            if frame is not None:
+                if frame.shape[1::-1] != self.tile_size:
+                    frame = cv2.resize(frame, self.tile_size, interpolation=cv2.INTER_AREA)
+                canvas[y:y + height, x:x + width] = frame
+            cv2.putText(canvas, f"Cam {camera.camera_id}", (x + 6, y + 18),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        return canvas
+
+    def latest_jpeg(self):
+        """
+        Mosaico en JPEG y su número de composición; se recompone solo si
+        pasó el intervalo desde la anterior.
+
+        Returns:
+            tuple: (seq, bytes) o (None, None) si no hay cámaras activas
+        """
+        with self._lock:
+            if self._jpeg is not None and time.monotonic() - self._time < self.interval:
+                return self._seq, self._jpeg
+            cameras = list(self.cameras())
+            if not cameras:
+                return None, None
+            ok, encoded = cv2.imencode('.jpg', self.compose(cameras),
+                                       [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if not ok:
+                return None, None
+            self._seq += 1
+            self._jpeg = encoded.tobytes()
+            self._time = time.monotonic()
+            return self._seq, self._jpeg
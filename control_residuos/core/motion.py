@@ -1 +1,58 @@
- 
+import cv2
+import numpy as np
+
+
+class MotionDetector:
+    """
+    Localiza regiones candidatas por sustracción de fondo (MOG2).
+    
+    Trabaja sobre una versión reducida del frame para que el coste sea
+    mínimo y devuelve las cajas escaladas a la resolución original. Los
+    objetos que permanecen inmóviles acaban formando parte del fondo, por
+    lo que está pensado para residuos que entran o pasan por la escena.
+    """
+
+    def __init__(self, scale=0.25, min_area=0.002, max_boxes=10, history=300,
+                 var_threshold=25):
+        """
+        Args:
+            scale (float): Factor de reducción del frame para el análisis
+            min_area (float): Área mínima de una región, relativa al frame
+            max_boxes (int): Máximo de regiones devueltas (las más grandes)
+            history (int): Frames de historia del modelo de fondo
+            var_threshold (float): Umbral de varianza de MOG2
+        """
+        self.scale = scale
+        self.min_area = min_area
+        self.max_boxes = max_boxes
+        self._subtractor = cv2.createBackgroundSubtractorMOG2(
+            history=history, varThreshold=var_threshold, detectShadows=False
+        )
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+
+    def detect(self, frame):
+        """
+        Devuelve las regiones en movimiento como arreglo (N, 4) de x1, y1, x2, y2.
+        """
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale,
+                           interpolation=cv2.INTER_AREA)
+        mask = self._subtractor.apply(small)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self._kernel)
+        mask = cv2.dilate(mask, self._kernel, iterations=2)
+        
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        min_area = self.min_area * small.shape[0] * small.shape[1]
+        boxes = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            if w * h >= min_area:
+                boxes.append((w * h, x, y, x + w, y + h))
+        
+        boxes.sort(reverse=True)
+        if not boxes:
+            return np.empty((0, 4), dtype=np.float32)
+        scaled = np.array([b[1:] for b in boxes[:self.max_boxes]], dtype=np.float32) / self.scale
+        height, width = frame.shape[:2]
+        scaled[:, [0, 2]] = np.clip(scaled[:, [0, 2]], 0, width - 1)
+        scaled[:, [1, 3]] = np.clip(scaled[:, [1, 3]], 0, height - 1)
+        return scaled
@@ -0,0 +1,56 @@
+"""
+Canal de metadatos de detección para dibujar las cajas en el cliente.
+
+En lugar de dibujar sobre una copia del frame y recodificarla por cada
+cliente, el detector publica por frame procesado un mensaje JSON compacto con
+el número de frame (seq), el tamaño del frame y sus cajas. Los clientes ven
+el stream sin superposiciones (el mismo JPEG o H.264 compartido por todos) y
+consultan el último mensaje con peticiones cortas para dibujar las cajas en
+un canvas.
+
+El seq solo sirve para no repetir mensajes: el stream no transporta el número
+de frame, así que las cajas son las del último frame procesado y pueden ir
+algo por detrás de la imagen mostrada.
+"""
+
+import json
+import time
+from threading import Condition
+
+
+class OverlayChannel:
+    """Último mensaje de superposición de un detector, con espera de novedades."""
+
+    def __init__(self):
+        self._condition = Condition()
+        self._seq = None
+        self._message = None
+
+    def publish(self, seq, size, boxes, stats):
+        """
+        Args:
+            seq (int): Número del frame de la cámara al que corresponden las cajas
+            size (tuple): (ancho, alto) del frame en que se expresan las coordenadas
+            boxes (list): [x1, y1, x2, y2, tipo, clase, confianza] por detección
+            stats (dict): Contadores acumulados del detector
+        """
+        message = json.dumps({'seq': seq, 'time': round(time.time(), 3), 'size': size,
+                              'boxes': boxes, 'stats': stats}, separators=(',', ':'))
+        with self._condition:
+            self._seq = seq
+            self._message = message
+            self._condition.notify_all()
+
+    def wait(self, after=None, timeout=5.0):
+        """
+        Espera un mensaje posterior al frame `after`.
+
+        Returns:
+            tuple: (seq, mensaje JSON), o (after, None) si no llegó ninguno
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq is not None and self._seq != after,
+                                     timeout=timeout)
+            if self._seq is None or self._seq == after:
+                return after, None
+            return self._seq, self._message
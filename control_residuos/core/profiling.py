@@ -0,0 +1,182 @@
+"""
+Herramientas de profiling activables en tiempo de ejecución.
+
+- StackSampler: muestrea periódicamente las pilas de todos los threads con
+  sys._current_frames() y genera un archivo de pilas colapsadas compatible
+  con flamegraph.pl / speedscope.
+- FrameTracer: registra un span por etapa del pipeline (con número de frame)
+  y lo exporta en formato Chrome Trace (chrome://tracing, Perfetto).
+
+Ambos están inactivos por defecto; cuando lo están, el único coste en el
+camino caliente es comprobar un booleano.
+"""
+
+import os
+import sys
+import time
+import json
+import threading
+from collections import Counter
+from contextlib import nullcontext
+
+# Límite de eventos de traza para acotar la memoria
+MAX_TRACE_EVENTS = 200000
+
+_NULL_SPAN = nullcontext()
+
+
+def thread_group(thread_name):
+    """Clasifica un thread por su nombre en detector, capture o web."""
+    if thread_name.startswith('detector'):
+        return 'detector'
+    if thread_name.startswith('capture'):
+        return 'capture'
+    return 'web'
+
+
+class StackSampler:
+    """Muestreador de pilas de todos los threads del proceso."""
+
+    def __init__(self, interval=0.005, groups=None):
+        """
+        Args:
+            interval (float): Segundos entre muestras
+            groups (iterable, opcional): Grupos de threads a incluir
+                                         ('detector', 'capture', 'web')
+        """
+        self.interval = interval
+        self.groups = set(groups) if groups else None
+        self.samples = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _frame_stack(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _sample_once(self):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        own_ident = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            name = names.get(ident, f'thread-{ident}')
+            group = thread_group(name)
+            if self.groups is not None and group not in self.groups:
+                continue
+            stack = [group, name] + self._frame_stack(frame)
+            self.samples[';'.join(part.replace(';', ':') for part in stack)] += 1
+        self.sample_count += 1
+
+    def _run(self, duration):
+        deadline = time.perf_counter() + duration
+        while not self._stop.is_set() and time.perf_counter() < deadline:
+            self._sample_once()
+            self._stop.wait(self.interval)
+
+    def start(self, duration):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(duration,),
+                                        name='profiler-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self, duration):
+        """Muestrea durante duration segundos y bloquea hasta terminar."""
+        self.start(duration)
+        self.join()
+        return self.collapsed()
+
+    def collapsed(self):
+        """Pilas en formato colapsado: 'a;b;c <conteo>' por línea."""
+        return ''.join(f"{stack} {count}\n"
+                       for stack, count in self.samples.most_common())
+
+
+class FrameTracer:
+    """Recolector de spans por etapa exportables como Chrome Trace JSON."""
+
+    def __init__(self):
+        self.enabled = False
+        self._events = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._deadline = None
+
+    def start(self, duration=None):
+        with self._lock:
+            self._events = []
+            self._origin = time.perf_counter()
+            self._deadline = self._origin + duration if duration else None
+            self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    def span(self, name, seq=None, camera=None):
+        """Context manager para una etapa; no hace nada si el tracer está inactivo."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, seq, camera)
+
+    def _record(self, name, start, end, seq, camera):
+        if self._deadline is not None and end > self._deadline:
+            self.enabled = False
+            return
+        thread = threading.current_thread()
+        event = {
+            'name': name,
+            'cat': thread_group(thread.name),
+            'ph': 'X',
+            'ts': (start - self._origin) * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': os.getpid(),
+            'tid': thread.name,
+            'args': {'seq': seq, 'camera': camera},
+        }
+        with self._lock:
+            if len(self._events) < MAX_TRACE_EVENTS:
+                self._events.append(event)
+
+    def chrome_trace(self):
+        with self._lock:
+            events = list(self._events)
+        return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'})
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'seq', 'camera', 'start')
+
+    def __init__(self, tracer, name, seq, camera):
+        self.tracer = tracer
+        self.name = name
+        self.seq = seq
+        self.camera = camera
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer._record(self.name, self.start, time.perf_counter(),
+                            self.seq, self.camera)
+        return False
+
+
+# Tracer global usado por el pipeline
+tracer = FrameTracer()
+
+# Evita ejecutar dos sesiones de profiling simultáneas
+profile_lock = threading.Lock()
@@ -1 +1,33 @@
- 
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CropClassifier:
+    """
+    Clasificador compacto de recortes (YOLO en modo classify).
+    
+    Se entrena con train_model.py a partir de las mismas carpetas por clase
+    del dataset garbage_classification, por lo que sus nombres de clase
+    coinciden con el _class_mapping de WasteDetector.
+    """
+
+    def __init__(self, model_path, imgsz=224):
+        from ultralytics import YOLO
+        logger.info(f"Cargando clasificador de recortes desde {model_path}")
+        self.model = YOLO(model_path, task='classify')
+        self.imgsz = imgsz
+        self.names = {int(k): v for k, v in self.model.names.items()}
+
+    def classify(self, crops):
+        """
+        Clasifica un lote de recortes BGR.
+        
+        Returns:
+            list: (id de clase, confianza) por recorte
+        """
+        if not crops:
+            return []
+        results = self.model.predict(source=list(crops), imgsz=self.imgsz,
+                                     device='cpu', verbose=False)
+        return [(int(r.probs.top1), float(r.probs.top1conf)) for r in results]
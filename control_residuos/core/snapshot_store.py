@@ -0,0 +1,309 @@
+"""
+Almacén de miniaturas de las detecciones.
+
+Cada detección contada guarda una miniatura de su recorte. En el bucle de
+detección solo se reduce el recorte al tamaño de la miniatura (barato a baja
+resolución) y se calcula su hash; la referencia ('AAAAMMDD/hash') queda
+disponible al instante y la codificación WebP/JPEG se hace en un pool de
+threads. Las miniaturas se agrupan en un archivo pack por día con un índice
+de registros fijos (hash, offset, longitud) en lugar de un archivo por
+imagen, y las de contenido idéntico dentro del mismo día se guardan una vez.
+Como el ruido del sensor hace que dos frames seguidos nunca coincidan byte a
+byte, antes de encolar se compara el pHash del recorte con el de las
+miniaturas recientes de la misma clase: un objeto que sigue a la vista
+reutiliza la referencia de su primera miniatura.
+La retención se aplica por días completos: se borran los packs más antiguos
+que `retention_days` y, si el almacén supera `max_bytes`, los más antiguos
+hasta cumplirlo.
+"""
+
+import time
+import queue
+import struct
+import hashlib
+import logging
+import traceback
+from pathlib import Path
+from datetime import datetime, timedelta
+from collections import OrderedDict
+from threading import Thread, Lock, Event
+
+import cv2
+
+from .dedup import phash_image, hamming
+
+logger = logging.getLogger(__name__)
+
+_RECORD = struct.Struct('<16sQI')  # hash, offset en el pack, longitud
+
+
+def image_mimetype(data):
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+class SnapshotStore:
+    """Miniaturas direccionadas por contenido en packs diarios."""
+
+    def __init__(self, root, size=96, fmt='webp', quality=70, workers=2,
+                 max_pending=256, cached_shards=8, retention_days=30, max_bytes=None,
+                 dedup_radius=6, dedup_seconds=300.0, max_recent=512):
+        """
+        Args:
+            root (str): Directorio del almacén
+            size (int): Lado mayor de la miniatura en píxeles
+            fmt (str): 'webp' o 'jpg'
+            quality (int): Calidad de compresión
+            workers (int): Threads de codificación
+            max_pending (int): Miniaturas en cola; si está llena se descartan
+            cached_shards (int): Índices diarios mantenidos en memoria para lecturas
+            retention_days (int): Días conservados (None: sin límite)
+            max_bytes (int): Tamaño máximo en disco (None: sin límite); si el día
+                en curso lo supera por sí solo, las miniaturas nuevas se descartan
+            dedup_radius (int): Distancia de Hamming máxima entre pHash para
+                reutilizar una miniatura reciente (None: solo contenido idéntico)
+            dedup_seconds (float): Tiempo sin verse tras el que una miniatura
+                deja de usarse para comparar
+            max_recent (int): Miniaturas recientes comparadas como máximo
+        """
+        self.root = Path(root)
+        self.size = size
+        self.ext = '.webp' if fmt == 'webp' else '.jpg'
+        quality_flag = cv2.IMWRITE_WEBP_QUALITY if fmt == 'webp' else cv2.IMWRITE_JPEG_QUALITY
+        self._params = [quality_flag, quality]
+        self.cached_shards = cached_shards
+        self.retention_days = retention_days
+        self.max_bytes = max_bytes
+        self._days = OrderedDict()  # día -> bytes en disco (pack + índice), del más antiguo al más reciente
+        self._bytes = 0
+        self._full = None  # Día que por sí solo supera max_bytes
+        self.dedup_radius = dedup_radius
+        self.dedup_seconds = dedup_seconds
+        self.max_recent = max_recent
+        self._recent = OrderedDict()  # ref -> (etiqueta, pHash, último uso), del menos al más reciente
+        self.reused = 0
+        self._shards = OrderedDict()  # día -> {hash: (offset, longitud)}
+        self._pending = set()  # Referencias en cola o codificándose
+        self._lock = Lock()
+        self._write_lock = Lock()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stop = Event()
+        self.dropped = 0
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._load_days()
+        with self._write_lock:
+            self._evict(datetime.now().strftime('%Y%m%d'))
+        self._threads = []
+        for i in range(max(1, workers)):
+            thread = Thread(target=self._run, name=f'snapshots-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _paths(self, day):
+        base = self.root / day[:4] / day[4:6] / day[6:]
+        return base.with_suffix('.pack'), base.with_suffix('.idx')
+
+    def _load_days(self):
+        for pack_path in sorted(self.root.glob('[0-9]' * 4 + '/' + '[0-9]' * 2 + '/*.pack')):
+            day = f"{pack_path.parent.parent.name}{pack_path.parent.name}{pack_path.stem}"
+            if len(day) != 8 or not day.isdigit():
+                continue
+            idx_path = pack_path.with_suffix('.idx')
+            size = pack_path.stat().st_size + (idx_path.stat().st_size if idx_path.exists() else 0)
+            self._days[day] = size
+            self._bytes += size
+
+    def _evict(self, today):
+        """Borra los días caducados y los más antiguos hasta cumplir max_bytes. Llamar con _write_lock."""
+        cutoff = None
+        if self.retention_days is not None:
+            cutoff = (datetime.strptime(today, '%Y%m%d')
+                      - timedelta(days=self.retention_days)).strftime('%Y%m%d')
+        while self._days:
+            day = next(iter(self._days))
+            if day == today:
+                break
+            expired = cutoff is not None and day <= cutoff
+            if not expired and (self.max_bytes is None or self._bytes <= self.max_bytes):
+                break
+            self._remove_day(day)
+        self._full = today if self.max_bytes is not None and self._bytes > self.max_bytes else None
+
+    def _remove_day(self, day):
+        self._bytes -= self._days.pop(day)
+        with self._lock:
+            self._shards.pop(day, None)
+        pack_path, idx_path = self._paths(day)
+        for path in (pack_path, idx_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        # Directorios de mes y año que quedan vacíos
+        for directory in (pack_path.parent, pack_path.parent.parent):
+            try:
+                directory.rmdir()
+            except OSError:
+                break
+        logger.info(f"Miniaturas del día {day} eliminadas por retención")
+
+    def _shard(self, day):
+        """Índice de un día (cargado bajo demanda, LRU). Llamar con _lock."""
+        index = self._shards.get(day)
+        if index is not None:
+            self._shards.move_to_end(day)
+            return index
+        index = {}
+        pack_path, idx_path = self._paths(day)
+        if idx_path.exists():
+            pack_size = pack_path.stat().st_size if pack_path.exists() else 0
+            with open(idx_path, 'rb') as f:
+                data = f.read()
+            usable = len(data) - len(data) % _RECORD.size
+            for digest, offset, length in _RECORD.iter_unpack(data[:usable]):
+                # Registros de una escritura interrumpida apuntan más allá del pack
+                if offset + length <= pack_size:
+                    index[digest] = (offset, length)
+        self._shards[day] = index
+        while len(self._shards) > self.cached_shards:
+            self._shards.popitem(last=False)
+        return index
+
+    def _similar(self, label, value, now):
+        """Referencia reciente de la misma etiqueta con pHash cercano, o None. Llamar con _lock."""
+        while self._recent:
+            _, _, last_used = next(iter(self._recent.values()))
+            if now - last_used <= self.dedup_seconds and len(self._recent) <= self.max_recent:
+                break
+            self._recent.popitem(last=False)
+        for ref, (other_label, other, _) in self._recent.items():
+            if other_label == label and hamming(value, other) <= self.dedup_radius:
+                return ref
+        return None
+
+    def _remember(self, ref, label, value, now):
+        self._recent[ref] = (label, value, now)
+        self._recent.move_to_end(ref)
+
+    def submit(self, frame, box, label=None):
+        """
+        Reduce el recorte de `box` y lo encola para codificar, salvo que sea
+        casi idéntico a una miniatura reciente de la misma `label`.
+
+        Returns:
+            str: Referencia 'AAAAMMDD/hash', o None si el recorte es vacío o la cola está llena
+        """
+        x1, y1, x2, y2 = (int(v) for v in box[:4])
+        crop = frame[max(0, y1):y2, max(0, x1):x2]
+        if crop.size == 0:
+            return None
+        h, w = crop.shape[:2]
+        scale = min(1.0, self.size / max(h, w))
+        if scale < 1.0:
+            crop = cv2.resize(crop, (max(1, round(w * scale)), max(1, round(h * scale))),
+                              interpolation=cv2.INTER_AREA)
+        else:
+            crop = crop.copy()
+        value = phash_image(crop) if self.dedup_radius is not None else None
+        digest = hashlib.blake2b(crop.tobytes(), digest_size=16).digest()
+        day = datetime.now().strftime('%Y%m%d')
+        ref = f"{day}/{digest.hex()}"
+        now = time.monotonic()
+        with self._lock:
+            if value is not None:
+                similar = self._similar(label, value, now)
+                # Solo dentro del mismo día, para que la retención no deje referencias huérfanas
+                if similar is not None and similar.startswith(day):
+                    self._remember(similar, label, value, now)
+                    self.reused += 1
+                    return similar
+            if digest in self._shard(day) or ref in self._pending:
+                return ref
+            if self._full == day:
+                self.dropped += 1
+                return None
+            try:
+                self._queue.put_nowait((day, digest, crop))
+            except queue.Full:
+                self.dropped += 1
+                return None
+            self._pending.add(ref)
+            if value is not None:
+                self._remember(ref, label, value, now)
+        return ref
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            try:
+                day, digest, crop = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            try:
+                ok, encoded = cv2.imencode(self.ext, crop, self._params)
+                if ok:
+                    self._append(day, digest, encoded.tobytes())
+            except Exception as e:
+                logger.error(f"Error al guardar miniatura: {str(e)}")
+                logger.error(traceback.format_exc())
+            finally:
+                with self._lock:
+                    self._pending.discard(f"{day}/{digest.hex()}")
+
+    def _append(self, day, digest, data):
+        pack_path, idx_path = self._paths(day)
+        with self._write_lock:
+            pack_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(pack_path, 'ab') as f:
+                offset = f.tell()
+                f.write(data)
+            with open(idx_path, 'ab') as f:
+                f.write(_RECORD.pack(digest, offset, len(data)))
+            written = len(data) + _RECORD.size
+            self._days[day] = self._days.get(day, 0) + written
+            self._bytes += written
+            self._evict(day)
+        with self._lock:
+            self._shard(day)[digest] = (offset, len(data))
+
+    def get(self, ref):
+        """Bytes de la miniatura `ref`, o None si no existe (o aún no se escribió)."""
+        try:
+            day, key = ref.split('/')
+            digest = bytes.fromhex(key)
+        except ValueError:
+            return None
+        if len(day) != 8 or not day.isdigit() or len(digest) != 16:
+            return None
+        with self._lock:
+            entry = self._shard(day).get(digest)
+        if entry is None:
+            return None
+        offset, length = entry
+        with open(self._paths(day)[0], 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def stats(self):
+        with self._lock:
+            return {'pending': len(self._pending), 'dropped': self.dropped, 'reused': self.reused,
+                    'cached_shards': len(self._shards), 'days': len(self._days),
+                    'bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+
+_store = None
+_store_lock = Lock()
+
+
+def get_snapshot_store(root, **kwargs):
+    """Almacén compartido por todos los detectores del proceso."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SnapshotStore(root, **kwargs)
+        return _store
@@ -0,0 +1,216 @@
+"""
+Barrido de hiperparámetros para entrenamiento en CPU.
+
+Lanza varios entrenamientos cortos en procesos separados (cada uno con su
+parte de los núcleos) y aplica successive halving asíncrono: cuando una
+prueba alcanza una época de control (rung), su métrica en results.csv se
+compara con la de las pruebas que ya pasaron por ese rung y, si no está en
+la mejor fracción 1/eta, se detiene para liberar la CPU a la siguiente.
+"""
+
+import os
+import csv
+import time
+import random
+import logging
+import itertools
+import multiprocessing as mp
+from pathlib import Path
+
+from .thread_budget import apply_thread_limits
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METRIC = 'metrics/mAP50-95(B)'
+
+
+def sample_configs(space, count, seed=0):
+    """
+    Configuraciones a probar a partir de {parámetro: [valores]}.
+
+    Si la rejilla completa tiene `count` combinaciones o menos se usa
+    entera; si no, se muestrean `count` combinaciones distintas.
+    """
+    keys = sorted(space)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+    if len(grid) <= count:
+        return grid
+    return random.Random(seed).sample(grid, count)
+
+
+def read_metric(results_path, metric=DEFAULT_METRIC):
+    """Métrica por época de un results.csv en curso ({época: valor})."""
+    values = {}
+    try:
+        with open(results_path, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                row = {k.strip(): v for k, v in row.items() if k}
+                try:
+                    values[int(float(row['epoch']))] = float(row[metric])
+                except (KeyError, TypeError, ValueError):
+                    continue
+    except OSError:
+        pass
+    return values
+
+
+def _train_trial(base_model, data, params, epochs, threads, project, name, trainer_path):
+    """Punto de entrada del proceso de cada prueba."""
+    apply_thread_limits(threads)
+    from ultralytics import YOLO
+    trainer = None
+    if trainer_path:
+        module, cls = trainer_path.rsplit('.', 1)
+        trainer = getattr(__import__(module, fromlist=[cls]), cls)
+    YOLO(base_model).train(
+        trainer=trainer,
+        data=data,
+        epochs=epochs,
+        project=project,
+        name=name,
+        exist_ok=True,
+        device='cpu',
+        workers=max(1, threads // 2),
+        verbose=False,
+        **params
+    )
+
+
+class Trial:
+    def __init__(self, number, params):
+        self.number = number
+        self.params = params
+        self.process = None
+        self.status = 'pending'  # pending, running, completed, stopped, failed
+        self.rung_scores = {}
+        self.name = None
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'params': self.params,
+            'status': self.status,
+            'rung_scores': {str(k): v for k, v in self.rung_scores.items()},
+        }
+
+
+class SuccessiveHalvingSweep:
+    """Planificador de pruebas con successive halving asíncrono (ASHA)."""
+
+    def __init__(self, base_model, data, configs, max_epochs, min_epochs=2, eta=3,
+                 parallel=2, total_cores=None, project='runs/detect', prefix='sweep',
+                 metric=DEFAULT_METRIC, trainer_path=None, poll_interval=5.0):
+        """
+        Args:
+            base_model (str): Pesos de partida de todas las pruebas
+            data (str): YAML del dataset
+            configs (list): Hiperparámetros de cada prueba
+            max_epochs (int): Épocas de una prueba que nunca se detiene
+            min_epochs (int): Primer rung; los siguientes se multiplican por eta
+            eta (int): Factor de reducción (sobrevive 1/eta en cada rung)
+            parallel (int): Pruebas simultáneas
+            total_cores (int, opcional): Núcleos a repartir entre las pruebas
+            metric (str): Columna de results.csv a maximizar
+            trainer_path (str, opcional): Clase de trainer ('modulo.Clase')
+        """
+        self.base_model = base_model
+        self.data = data
+        self.max_epochs = max_epochs
+        self.eta = eta
+        self.parallel = parallel
+        self.threads = max(1, (total_cores or os.cpu_count() or 1) // parallel)
+        self.project = project
+        self.prefix = prefix
+        self.metric = metric
+        self.trainer_path = trainer_path
+        self.poll_interval = poll_interval
+        self.trials = [Trial(i, params) for i, params in enumerate(configs)]
+        self.rungs = []
+        rung = min_epochs
+        while rung < max_epochs:
+            self.rungs.append(rung)
+            rung *= eta
+        self._rung_results = {r: [] for r in self.rungs}
+        self._ctx = mp.get_context('spawn')
+
+    def _start(self, trial):
+        trial.name = f"{self.prefix}_{trial.number:03d}"
+        trial.process = self._ctx.Process(
+            target=_train_trial,
+            args=(self.base_model, self.data, trial.params, self.max_epochs, self.threads,
+                  self.project, trial.name, self.trainer_path),
+            name=f'sweep-{trial.number}',
+            daemon=False
+        )
+        trial.process.start()
+        trial.status = 'running'
+        logger.info(f"Prueba {trial.name} iniciada: {trial.params}")
+
+    def _results_path(self, trial):
+        return Path(self.project) / trial.name / 'results.csv'
+
+    def _promotable(self, rung, score):
+        """La prueba sigue si está en la mejor fracción 1/eta de su rung."""
+        scores = sorted(self._rung_results[rung], reverse=True)
+        keep = max(1, len(scores) // self.eta)
+        # Con pocas pruebas en el rung todavía no hay con qué comparar
+        return len(scores) < self.eta or score >= scores[keep - 1]
+
+    def _check(self, trial):
+        values = read_metric(self._results_path(trial), self.metric)
+        for rung in self.rungs:
+            if rung in trial.rung_scores or rung not in values:
+                continue
+            score = values[rung]
+            trial.rung_scores[rung] = score
+            self._rung_results[rung].append(score)
+            if not self._promotable(rung, score):
+                logger.info(f"Prueba {trial.name} detenida en la época {rung} ({self.metric}={score:.4f})")
+                trial.process.terminate()
+                trial.process.join(10)
+                trial.status = 'stopped'
+                return
+
+        if not trial.process.is_alive():
+            trial.status = 'completed' if trial.process.exitcode == 0 else 'failed'
+            if values:
+                trial.rung_scores[max(values)] = values[max(values)]
+            logger.info(f"Prueba {trial.name} {trial.status}")
+
+    def run(self, on_finish=None):
+        """
+        Ejecuta todas las pruebas.
+
+        Args:
+            on_finish (callable, opcional): on_finish(trial) al terminar cada prueba
+
+        Returns:
+            list: Pruebas ordenadas de mejor a peor por la última métrica
+        """
+        pending = list(self.trials)
+        running = []
+        try:
+            while pending or running:
+                while pending and len(running) < self.parallel:
+                    trial = pending.pop(0)
+                    self._start(trial)
+                    running.append(trial)
+                time.sleep(self.poll_interval)
+                for trial in list(running):
+                    self._check(trial)
+                    if trial.status != 'running':
+                        running.remove(trial)
+                        if on_finish is not None:
+                            on_finish(trial)
+        finally:
+            for trial in running:
+                if trial.process.is_alive():
+                    trial.process.terminate()
+                    trial.process.join(10)
+        return sorted(self.trials, key=self.final_score, reverse=True)
+
+    @staticmethod
+    def final_score(trial):
+        if not trial.rung_scores:
+            return float('-inf')
+        return trial.rung_scores[max(trial.rung_scores)]
@@ -0,0 +1,137 @@
+"""
+Reparto de threads de CPU entre detectores.
+
+Sin límites, torch, OpenCV y BLAS crean cada uno un thread por núcleo en
+cada detector, de modo que con varias cámaras la CPU queda sobresuscrita y
+los threads web se quedan sin tiempo. ThreadBudget divide los núcleos
+disponibles (descontando los reservados para Flask y la captura) entre los
+detectores activos y reequilibra cuando se inicia o detiene uno.
+
+Los límites y la afinidad son de todo el proceso, así que el reparto por
+detector solo se aplica a los detectores con proceso de inferencia propio
+(modo process). Los detectores en modo thread comparten el proceso web: a
+este se le aplica una vez el total disponible, sin afinidad.
+"""
+
+import os
+import logging
+from threading import Lock
+
+import cv2
+
+# Importar configuración central
+from settings import *
+
+logger = logging.getLogger(__name__)
+
+
+def set_affinity(cpus):
+    """Fija la afinidad del thread/proceso actual; devuelve False si no es posible."""
+    if not cpus:
+        return False
+    if hasattr(os, 'sched_setaffinity'):
+        # En Linux, pid 0 se refiere al thread que hace la llamada
+        os.sched_setaffinity(0, cpus)
+        return True
+    try:
+        import psutil
+        psutil.Process().cpu_affinity(list(cpus))
+        return True
+    except (ImportError, AttributeError):
+        return False
+
+
+def apply_thread_limits(threads, cpus=None):
+    """
+    Aplica el límite de threads de torch, OpenCV y BLAS en el contexto actual.
+
+    Afecta a todo el proceso: por detector solo debe llamarse desde su
+    proceso de inferencia (modo process).
+    """
+    threads = max(1, int(threads))
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=threads)
+    except ImportError:
+        pass
+    if cpus:
+        set_affinity(cpus)
+
+
+class ThreadBudget:
+    """Asignador central de threads y núcleos para los detectores activos."""
+
+    def __init__(self, total_cores=None, reserved=1, pin=False):
+        """
+        Args:
+            total_cores (int, opcional): Núcleos a repartir (por defecto os.cpu_count())
+            reserved (int): Núcleos reservados para web y captura
+            pin (bool): Fijar cada detector a un subconjunto disjunto de núcleos
+        """
+        self.total_cores = total_cores or os.cpu_count() or 1
+        self.reserved = reserved
+        self.pin = pin
+        self._detectors = {}
+        self._lock = Lock()
+        self._process_limited = False  # Total ya aplicado al proceso web (modo thread)
+
+    def allocation(self, count):
+        """
+        Calcula el reparto para `count` detectores.
+
+        Returns:
+            list: [(threads, cpus o None)] por detector
+        """
+        if count <= 0:
+            return []
+        available = max(1, self.total_cores - self.reserved)
+        base, extra = divmod(available, count)
+        plan = []
+        next_cpu = self.reserved
+        for i in range(count):
+            threads = max(1, base + (1 if i < extra else 0))
+            cpus = None
+            if self.pin and available >= count:
+                cpus = set(range(next_cpu, next_cpu + threads))
+                next_cpu += threads
+            plan.append((threads, cpus))
+        return plan
+
+    def register(self, key, detector):
+        """Añade un detector y reequilibra el reparto."""
+        with self._lock:
+            self._detectors[key] = detector
+            if not getattr(detector, 'uses_worker', False) and not self._process_limited:
+                # Inferencia en este proceso: límite total, una sola vez y sin afinidad
+                threads = max(1, self.total_cores - self.reserved)
+                apply_thread_limits(threads)
+                self._process_limited = True
+                logger.info(f"Límite de {threads} thread(s) de inferencia para el proceso (modo thread)")
+            self._rebalance()
+
+    def unregister(self, key):
+        """Quita un detector y reequilibra el reparto."""
+        with self._lock:
+            if self._detectors.pop(key, None) is not None:
+                self._rebalance()
+
+    def _rebalance(self):
+        keys = sorted(k for k, d in self._detectors.items() if getattr(d, 'uses_worker', False))
+        for key, (threads, cpus) in zip(keys, self.allocation(len(keys))):
+            try:
+                self._detectors[key].set_thread_budget(threads, cpus)
+            except Exception as e:
+                logger.error(f"Error al aplicar presupuesto de threads a {key}: {str(e)}")
+        logger.info(f"Presupuesto de threads: {len(keys)} detector(es) en modo process, "
+                     f"{self.total_cores} núcleos, {self.reserved} reservado(s)")
+
+
+# Presupuesto global usado por la aplicación web (None si está deshabilitado)
+thread_budget = (ThreadBudget(reserved=THREAD_BUDGET_RESERVED, pin=THREAD_BUDGET_PIN)
+                 if THREAD_BUDGET_ENABLED else None)
@@ -0,0 +1,220 @@
+"""
+Caché de entrenamiento preprocesada en shards memory-mapped.
+
+Con cache=false, ultralytics decodifica y redimensiona cada JPEG en cada
+época. Esta caché guarda las imágenes ya decodificadas y redimensionadas al
+imgsz de entrenamiento en archivos uint8 (shards) con un índice, construidos
+una sola vez en paralelo. La clave de la caché depende de los archivos
+(ruta, tamaño, fecha) y del imgsz, por lo que la comparten todas las épocas
+y todas las ejecuciones con el mismo preprocesado.
+
+Los procesos del dataloader leen los shards con np.memmap: las imágenes se
+devuelven como vistas sobre el page cache del sistema, sin copias ni
+decodificación.
+"""
+
+import os
+import json
+import math
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from ultralytics.data import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.utils import colorstr
+
+# Importar configuración central
+from settings import *
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+INDEX_DTYPE = np.dtype([
+    ('shard', '<i4'), ('offset', '<i8'),
+    ('h', '<i4'), ('w', '<i4'), ('h0', '<i4'), ('w0', '<i4'),
+])
+
+
+def cache_key(files, imgsz):
+    """Clave de la caché: archivos (ruta, tamaño, fecha), imgsz y versión."""
+    digest = hashlib.sha256(f"v{CACHE_VERSION}:{imgsz}".encode('utf-8'))
+    for path in files:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest()[:24]
+
+
+def resize_like_ultralytics(img, imgsz):
+    """Redimensiona el lado mayor a imgsz igual que YOLODataset.load_image(rect_mode=True)."""
+    h0, w0 = img.shape[:2]
+    r = imgsz / max(h0, w0)
+    if r != 1:
+        w, h = (min(math.ceil(w0 * r), imgsz), min(math.ceil(h0 * r), imgsz))
+        img = cv2.resize(img, (w, h), interpolation=cv2.INTER_LINEAR)
+    return img
+
+
+def _build_shard(args):
+    """Decodifica un bloque de imágenes y las escribe en un shard (en el pool)."""
+    paths, imgsz, shard_path = args
+    entries = []
+    offset = 0
+    with open(shard_path, 'wb') as f:
+        for path in paths:
+            img = cv2.imread(path)
+            if img is None:
+                entries.append((offset, 0, 0, 0, 0))
+                continue
+            h0, w0 = img.shape[:2]
+            img = np.ascontiguousarray(resize_like_ultralytics(img, imgsz))
+            h, w = img.shape[:2]
+            f.write(img.tobytes())
+            entries.append((offset, h, w, h0, w0))
+            offset += img.nbytes
+    return entries
+
+
+def build_cache(files, imgsz, cache_root, shard_size=512, workers=None):
+    """
+    Construye la caché para `files` si no existe y devuelve su directorio.
+
+    Cada proceso del pool construye shards completos; el índice se escribe
+    al final y el directorio se publica con un rename atómico, de modo que
+    dos entrenamientos simultáneos nunca ven una caché a medias.
+    """
+    files = [str(f) for f in files]
+    cache_dir = Path(cache_root) / cache_key(files, imgsz)
+    if (cache_dir / 'index.npy').exists():
+        return cache_dir
+
+    staging = Path(cache_root) / f".{cache_dir.name}.{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    chunks = [files[i:i + shard_size] for i in range(0, len(files), shard_size)]
+    jobs = [(chunk, imgsz, str(staging / f"shard_{n:04d}.bin")) for n, chunk in enumerate(chunks)]
+
+    logger.info(f"Construyendo caché de entrenamiento ({len(files)} imágenes, imgsz={imgsz}, "
+                f"{len(jobs)} shards) en {cache_dir}")
+    index = np.zeros(len(files), dtype=INDEX_DTYPE)
+    position = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for shard, entries in enumerate(pool.map(_build_shard, jobs)):
+            for offset, h, w, h0, w0 in entries:
+                index[position] = (shard, offset, h, w, h0, w0)
+                position += 1
+
+    with open(staging / 'files.json', 'w', encoding='utf-8') as f:
+        json.dump({'imgsz': imgsz, 'files': [os.path.abspath(p) for p in files]}, f)
+    np.save(staging / 'index.npy', index)
+    try:
+        os.replace(staging, cache_dir)
+    except OSError:
+        # Otro proceso publicó la misma caché mientras tanto
+        shutil.rmtree(staging, ignore_errors=True)
+    return cache_dir
+
+
+class ShardCache:
+    """Acceso de solo lectura a una caché de shards."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.index = np.load(self.cache_dir / 'index.npy')
+        with open(self.cache_dir / 'files.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.imgsz = meta['imgsz']
+        self.positions = {path: i for i, path in enumerate(meta['files'])}
+        self._shards = {}
+
+    def __getstate__(self):
+        # Los memmap se vuelven a abrir en cada proceso del dataloader
+        state = self.__dict__.copy()
+        state['_shards'] = {}
+        return state
+
+    def _shard(self, n):
+        shard = self._shards.get(n)
+        if shard is None:
+            # 'c' (copy-on-write): las lecturas comparten el page cache y una
+            # escritura accidental de una aumentación no modifica el archivo
+            shard = np.memmap(self.cache_dir / f"shard_{n:04d}.bin", dtype=np.uint8, mode='c')
+            self._shards[n] = shard
+        return shard
+
+    def get(self, path):
+        """
+        Imagen preprocesada de `path` como vista sobre el shard.
+
+        Returns:
+            tuple: (imagen, (h0, w0)) o None si no está en la caché
+        """
+        i = self.positions.get(os.path.abspath(path))
+        if i is None:
+            return None
+        shard, offset, h, w, h0, w0 = self.index[i]
+        if h == 0:
+            return None
+        size = int(h) * int(w) * 3
+        img = self._shard(int(shard))[offset:offset + size].reshape(int(h), int(w), 3)
+        return img, (int(h0), int(w0))
+
+
+class CachedYOLODataset(YOLODataset):
+    """YOLODataset que lee las imágenes de la caché de shards."""
+
+    def __init__(self, *args, cache_root=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        cache_dir = build_cache(self.im_files, self.imgsz, cache_root or TRAIN_CACHE_DIR,
+                                workers=TRAIN_CACHE_WORKERS)
+        self.shard_cache = ShardCache(cache_dir)
+
+    def load_image(self, i, rect_mode=True):
+        cached = self.shard_cache.get(self.im_files[i])
+        if cached is None:
+            return super().load_image(i, rect_mode)
+        # La imagen ya está reducida al lado mayor imgsz; no se vuelve a
+        # redimensionar (tampoco fuera de rect_mode) para no remuestrear dos veces
+        img, hw0 = cached
+        if self.augment:
+            # Mismo buffer que BaseDataset.load_image: lo usa Mosaic para elegir imágenes
+            self.ims[i], self.im_hw0[i], self.im_hw[i] = img, hw0, img.shape[:2]
+            self.buffer.append(i)
+            if 1 < len(self.buffer) >= self.max_buffer_length:
+                j = self.buffer.pop(0)
+                if self.cache != 'ram':
+                    self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+        return img, hw0, img.shape[:2]
+
+
+class CachedDetectionTrainer(DetectionTrainer):
+    """
+    DetectionTrainer que usa CachedYOLODataset.
+
+    Uso: YOLO(pesos).train(..., trainer=CachedDetectionTrainer)
+    """
+
+    def build_dataset(self, img_path, mode='train', batch=None):
+        model = getattr(self.model, 'module', self.model)
+        stride = max(int(model.stride.max() if model is not None else 0), 32)
+        return CachedYOLODataset(
+            img_path=img_path,
+            imgsz=self.args.imgsz,
+            batch_size=batch,
+            augment=mode == 'train',
+            hyp=self.args,
+            rect=self.args.rect or mode == 'val',
+            cache=None,
+            single_cls=self.args.single_cls or False,
+            stride=stride,
+            pad=0.0 if mode == 'train' else 0.5,
+            prefix=colorstr(f"{mode}: "),
+            task=self.args.task,
+            classes=self.args.classes,
+            data=self.data,
+            fraction=self.args.fraction if mode == 'train' else 1.0,
+        )
@@ -1 +1,19 @@
- 
+import hashlib
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """
+    Calcula el hash SHA-256 de un archivo leyéndolo por bloques.
+    
+    Args:
+        path (str): Ruta al archivo
+        chunk_size (int): Tamaño de bloque en bytes
+    
+    Returns:
+        str: Hash en hexadecimal
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
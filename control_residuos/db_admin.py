@@ -29,7 +29,7 @@ def init_db():
         admin_user = User.query.filter_by(username='admin').first()
         if not admin_user:
             logger.info("Creando usuario admin...")
-            admin = User(username='admin')
+            admin = User(username='admin', role='admin')
             admin.set_password('admin')  # Cambiar esta contraseña en producción
             db.session.add(admin)
             try:
@@ -41,6 +41,11 @@ def init_db():
                 raise
         else:
             logger.info("El usuario admin ya existe")
+            if admin_user.role != 'admin':
+                # Bases creadas antes de que existieran los roles
+                admin_user.role = 'admin'
+                db.session.commit()
+                logger.info("Rol admin asignado al usuario admin")
         
         # Verificar configuración del sistema
         if not SystemConfig.query.first():
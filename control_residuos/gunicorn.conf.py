@@ -14,4 +14,17 @@ loglevel = 'info'
 # Configuración de seguridad
 limit_request_line = 4094
 limit_request_fields = 100
-limit_request_field_size = 8190
\ No newline at end of file
+limit_request_field_size = 8190
+
+def post_fork(server, worker):
+    """Cada worker escribe sus logs de aplicación a través de una cola"""
+    import os
+    from settings import LOG_DIR, LOG_LEVEL, LOG_FORMAT, LOG_RATE_LIMIT_INTERVAL, LOG_RATE_LIMIT_BURST
+    from core.logging_utils import setup_async_logging
+    setup_async_logging(
+        log_file=os.path.join(LOG_DIR, 'app.log'),
+        level=LOG_LEVEL,
+        fmt=LOG_FORMAT,
+        rate_interval=LOG_RATE_LIMIT_INTERVAL,
+        rate_burst=LOG_RATE_LIMIT_BURST
+    )
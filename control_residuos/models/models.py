@@ -1,7 +1,11 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
+from threading import Lock
+import time
 import json
 
 db = SQLAlchemy()
@@ -25,6 +29,66 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+class UserCache:
+    """
+    Caché en proceso de usuarios autenticados para el user_loader de
+    Flask-Login, evitando una consulta a la base de datos por petición.
+    
+    Las instancias se guardan desvinculadas de la sesión (expunge) con sus
+    columnas ya cargadas. Las entradas caducan tras `ttl` segundos y se
+    invalidan cuando se confirma (commit) una transacción que actualizó o
+    eliminó el usuario (cambio de contraseña o rol): invalidar antes del
+    commit permitiría que otra petición volviera a cachear la fila antigua.
+    Con varios workers la invalidación es local a cada proceso y el TTL
+    acota el tiempo que otro proceso puede ver datos antiguos.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = Lock()
+
+    def get(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        
+        user = db.session.get(User, user_id)
+        if user is None:
+            self.invalidate(user_id)
+            return None
+        
+        db.session.expunge(user)
+        with self._lock:
+            self._entries[user_id] = (user, time.monotonic() + self.ttl)
+        return user
+
+    def invalidate(self, user_id=None):
+        """Elimina un usuario de la caché, o todos si no se indica id."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+user_cache = UserCache()
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = session.info.setdefault('changed_user_ids', set())
+    for instance in list(session.dirty) + list(session.deleted):
+        if isinstance(instance, User) and instance.id is not None:
+            changed.add(instance.id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_cached_users(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        user_cache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('changed_user_ids', None)
+
 class Detection(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -11,53 +11,62 @@ from settings import *
 PARENT_DIR = os.path.dirname(BASE_DIR)
 sys.path.insert(0, PARENT_DIR)
 
-# Configurar logging
-logging.basicConfig(
-    level=LOG_LEVEL,
-    format=LOG_FORMAT,
-    handlers=[
-        logging.FileHandler(os.path.join(LOG_DIR, 'app.log'), encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+logger = logging.getLogger(__name__)
 
-# Forzar codificación UTF-8 en la salida estándar
-if sys.stdout.encoding != 'utf-8' and hasattr(sys.stdout, 'detach'):
-    sys.stdout = codecs.getwriter('utf-8')(sys.stdout.detach())
-if sys.stderr.encoding != 'utf-8' and hasattr(sys.stderr, 'detach'):
-    sys.stderr = codecs.getwriter('utf-8')(sys.stderr.detach())
+def initialize():
+    """
+    Configura la salida, el logging y el directorio de trabajo e importa la
+    aplicación web.
+    
+    Se llama solo desde __main__: los procesos de inferencia lanzados con
+    'spawn' vuelven a importar este módulo y no deben repetir el arranque.
+    """
+    # Forzar codificación UTF-8 en la salida estándar
+    if sys.stdout.encoding != 'utf-8' and hasattr(sys.stdout, 'detach'):
+        sys.stdout = codecs.getwriter('utf-8')(sys.stdout.detach())
+    if sys.stderr.encoding != 'utf-8' and hasattr(sys.stderr, 'detach'):
+        sys.stderr = codecs.getwriter('utf-8')(sys.stderr.detach())
 
-logger = logging.getLogger(__name__)
+    # Configurar logging asíncrono: los threads de captura/detección solo encolan
+    from core.logging_utils import setup_async_logging
+    setup_async_logging(
+        log_file=os.path.join(LOG_DIR, 'app.log'),
+        level=LOG_LEVEL,
+        fmt=LOG_FORMAT,
+        rate_interval=LOG_RATE_LIMIT_INTERVAL,
+        rate_burst=LOG_RATE_LIMIT_BURST
+    )
 
-# Asegurarse de que estamos en el directorio correcto
-os.chdir(BASE_DIR)
-logger.info(f"Directorio de trabajo: {BASE_DIR}")
+    # Asegurarse de que estamos en el directorio correcto
+    os.chdir(BASE_DIR)
+    logger.info(f"Directorio de trabajo: {BASE_DIR}")
 
-# Verificar que el modelo YOLO existe
-if not os.path.exists(YOLO_MODEL_PATH):
-    logger.error(f"No se encontró el modelo YOLO en {YOLO_MODEL_PATH}")
-    sys.exit(1)
-logger.info(f"Modelo YOLO encontrado en {YOLO_MODEL_PATH}")
+    # Verificar que el modelo YOLO existe
+    if not os.path.exists(YOLO_MODEL_PATH):
+        logger.error(f"No se encontró el modelo YOLO en {YOLO_MODEL_PATH}")
+        sys.exit(1)
+    logger.info(f"Modelo YOLO encontrado en {YOLO_MODEL_PATH}")
 
-try:
-    # Importar dependencias críticas
-    import cv2
-    import numpy as np
-    from ultralytics import YOLO
-    logger.info("Dependencias críticas importadas correctamente")
+    try:
+        # Importar dependencias críticas
+        import cv2
+        import numpy as np
+        from ultralytics import YOLO
+        logger.info("Dependencias críticas importadas correctamente")
     
-    # Importar la aplicación
-    from web.app import app
-    logger.info("Aplicación web importada correctamente")
+        # Importar la aplicación
+        from web.app import app
+        logger.info("Aplicación web importada correctamente")
+        return app
     
-except ImportError as e:
-    logger.error(f"Error al importar dependencias: {str(e)}")
-    logger.error(traceback.format_exc())
-    sys.exit(1)
-except Exception as e:
-    logger.error(f"Error inesperado durante la inicialización: {str(e)}")
-    logger.error(traceback.format_exc())
-    sys.exit(1)
+    except ImportError as e:
+        logger.error(f"Error al importar dependencias: {str(e)}")
+        logger.error(traceback.format_exc())
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"Error inesperado durante la inicialización: {str(e)}")
+        logger.error(traceback.format_exc())
+        sys.exit(1)
 
 def find_free_port(start_port=APP_PORT, max_port=APP_PORT + 10):
     """Encuentra un puerto disponible empezando por APP_PORT"""
@@ -74,6 +83,7 @@ def find_free_port(start_port=APP_PORT, max_port=APP_PORT + 10):
     return None
 
 if __name__ == '__main__':
+    app = initialize()
     try:
         logger.info("\n=== Iniciando Sistema de Control de Residuos ===")
         
@@ -11,6 +11,8 @@ LOG_DIR.mkdir(exist_ok=True)
 # Configuración de logging
 LOG_LEVEL = logging.INFO
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_RATE_LIMIT_INTERVAL = 10.0  # Ventana (s) para limitar mensajes repetitivos
+LOG_RATE_LIMIT_BURST = 20  # Mensajes permitidos por plantilla en cada ventana
 
 # Configuración del servidor web
 APP_HOST = '127.0.0.1'  # Para desarrollo local
@@ -31,6 +33,77 @@ SQLALCHEMY_TRACK_MODIFICATIONS = False
 # Configuración del modelo YOLO
 YOLO_MODEL_PATH = str(BASE_DIR.parent / 'runs/detect/waste_detector3/weights/best.pt')
 YOLO_CONFIDENCE = 0.3  # Umbral de confianza para detecciones
+# Mapeo de clases del modelo a tipos orgánico/inorgánico
+WASTE_CLASS_MAPPING = {
+    'cardboard': 'inorganic',
+    'glass': 'inorganic',
+    'metal': 'inorganic',
+    'paper': 'inorganic',
+    'plastic': 'inorganic',
+    'trash': 'organic'  # Asumiendo que trash incluye residuos orgánicos
+}
+RUNS_DIR = str(BASE_DIR.parent / 'runs')  # Ejecuciones de entrenamiento de ultralytics
+MODEL_REGISTRY_DIR = str(BASE_DIR / 'instance' / 'model_registry')
+YOLO_MODEL_FAMILY = None  # Si se define (p. ej. 'waste_detector'), usar el último modelo que pasa
+YOLO_MODEL_MIN_SCORE = 0.5  # mAP50-95 mínimo para considerar que un modelo pasa
+
+# Configuración del dataset y el entrenamiento
+DATASET_DIR = str(BASE_DIR.parent / 'datasets' / 'garbage_classification')
+DATASET_SOURCE_DIR = str(Path(DATASET_DIR) / 'Garbage classification' / 'Garbage classification')
+DATASET_BUILD_DIR = str(BASE_DIR.parent / 'datasets' / 'garbage_yolo')  # Salida en formato YOLO
+TRAIN_CACHE_ENABLED = True  # Imágenes preprocesadas en shards memory-mapped durante el entrenamiento
+TRAIN_CACHE_DIR = str(BASE_DIR.parent / 'datasets' / 'train_cache')
+TRAIN_CACHE_WORKERS = None  # Procesos para construir la caché (None = todos los núcleos)
+DEDUP_RADIUS = 6  # Distancia de Hamming máxima entre pHash para considerar duplicadas dos imágenes
+DEDUP_CACHE_PATH = str(BASE_DIR.parent / 'datasets' / 'phash_cache.json')
+DEDUP_QUARANTINE_DIR = str(BASE_DIR.parent / 'datasets' / 'duplicates')
+EVAL_CACHE_DIR = str(BASE_DIR / 'instance' / 'eval_cache')  # Predicciones crudas por modelo e imgsz
+FINETUNE_EPOCHS = 5  # Épocas del ajuste fino incremental
+FINETUNE_LR = 0.001  # Tasa de aprendizaje inicial del ajuste fino
+FINETUNE_REPLAY_RATIO = 0.5  # Imágenes originales por cada imagen nueva
+
+# Configuración de la inferencia
+INFERENCE_MODE = 'thread'  # 'thread' o 'process' (un proceso de inferencia por detector)
+INFERENCE_START_METHOD = 'spawn'  # Método de multiprocessing para los procesos de inferencia
+INFERENCE_WORKER_THREADS = None  # Threads de torch/OpenCV por proceso (None = por defecto)
+INFERENCE_REQUEST_TIMEOUT = 30  # Segundos sin respuesta antes de reiniciar el proceso de inferencia
+INFERENCE_PROFILE_ENABLED = True  # Usar el perfil generado por tune_imgsz.py si existe
+INFERENCE_PROFILE_PATH = str(BASE_DIR / 'instance' / 'inference_profile.json')
+INFERENCE_ACCURACY_FLOOR = 0.85  # Precisión mínima al elegir el tamaño de entrada
+# (ancho, alto) al que se decodifica/reduce el frame de detección; None = el lado
+# mayor igual al imgsz del perfil (nunca mayor que la captura)
+DETECTION_INPUT_SIZE = None
+
+# Modo de pipeline: 'detect' (YOLO en el frame completo) o 'classify'
+# (regiones en movimiento + clasificador compacto de recortes)
+PIPELINE_MODE = 'detect'
+CLASSIFIER_MODEL_PATH = str(BASE_DIR.parent / 'runs/classify/waste_classifier/weights/best.pt')
+CLASSIFIER_IMGSZ = 224  # Tamaño de entrada del clasificador
+MOTION_MIN_AREA = 0.002  # Área mínima de una región en movimiento (fracción del frame)
+
+# Cascada: YOLO_MODEL_PATH como modelo rápido y un modelo grande para casos ambiguos
+CASCADE_ENABLED = False
+CASCADE_MODEL_PATH = str(BASE_DIR.parent / 'runs/detect/waste_detector_optimized/weights/best.pt')
+CASCADE_BAND = (0.15, 0.6)  # Confianzas del modelo pequeño que se reclasifican
+CASCADE_MAX_BATCH = 8  # Recortes máximos por lote (de todas las cámaras)
+CASCADE_MAX_WAIT = 0.005  # Segundos de espera para completar un lote
+CASCADE_IMGSZ = 320  # Tamaño de entrada del modelo grande sobre los recortes
+
+# Cambio de modelo en caliente y evaluación en sombra
+ROLLOUT_WARMUP_ITERATIONS = 3  # Inferencias de calentamiento antes de cambiar de modelo
+SHADOW_SAMPLE_RATE = 0.1  # Fracción de frames evaluados con el modelo candidato
+
+# Captura de ejemplos difíciles para reentrenamiento
+HARD_EXAMPLES_ENABLED = False
+HARD_EXAMPLES_DIR = str(BASE_DIR / 'instance' / 'hard_examples')
+HARD_EXAMPLES_MAX_MB = 500  # Tamaño máximo del almacén (se expulsan los menos usados)
+HARD_EXAMPLES_BAND = (0.25, 0.5)  # Confianzas consideradas inciertas
+HARD_EXAMPLES_PER_MINUTE = 6  # Frames muestreados como máximo por cámara y minuto
+
+# Reparto de núcleos de CPU entre detectores
+THREAD_BUDGET_ENABLED = True  # Limitar threads de torch/OpenCV/BLAS por detector
+THREAD_BUDGET_RESERVED = 1  # Núcleos reservados para la web y la captura
+THREAD_BUDGET_PIN = False  # Fijar cada detector a núcleos disjuntos (afinidad)
 
 # Configuración de cámaras
 MAX_CAMERAS = 4  # Número máximo de cámaras soportadas
@@ -38,7 +111,60 @@ CAMERA_WIDTH = 640  # Ancho de captura de la cámara
 CAMERA_HEIGHT = 480  # Alto de captura de la cámara
 CAMERA_FPS = 30  # FPS objetivo para la captura
 CAMERA_BUFFER_SIZE = 1  # Tamaño del buffer de frames
+# Leer el JPEG de la cámara sin decodificar (V4L2): se decodifica a escala DCT
+# solo lo que se usa y se reenvía tal cual a los streams sin superposición
+CAMERA_RAW_MJPEG = False
+
+# Clips de evidencia con pre-roll en memoria
+CLIPS_ENABLED = False
+CLIPS_DIR = str(BASE_DIR / 'instance' / 'clips')
+CLIP_PRE_ROLL = 5.0  # Segundos antes del primer evento
+CLIP_POST_ROLL = 5.0  # Segundos después del último evento
+CLIP_FPS = 10  # Frames por segundo guardados en el buffer y los clips
+CLIP_JPEG_QUALITY = 80  # Igual que el feed para reutilizar su codificación
+CLIP_BUFFER_MB = 32  # Memoria máxima del buffer por cámara
+
+# Miniaturas de las detecciones para auditoría
+SNAPSHOTS_ENABLED = False
+SNAPSHOTS_DIR = str(BASE_DIR / 'instance' / 'snapshots')
+SNAPSHOT_SIZE = 96  # Lado mayor en píxeles
+SNAPSHOT_FORMAT = 'webp'  # 'webp' o 'jpg'
+SNAPSHOT_QUALITY = 70
+SNAPSHOT_WORKERS = 2  # Threads de codificación
+SNAPSHOT_RETENTION_DAYS = 30  # Días conservados (None: sin límite)
+SNAPSHOT_MAX_MB = 1024  # Tamaño máximo del almacén (se borran los días más antiguos)
+SNAPSHOT_DEDUP_RADIUS = 6  # Distancia de Hamming entre pHash para reutilizar una miniatura reciente
+
+# Substreams por cámara, elegidos con ?profile= en /api/camera/<id>/feed.
+# Cada perfil se codifica una vez por frame y se comparte entre sus clientes.
+STREAM_PROFILES = {
+    'full': {'size': None, 'fps': 30, 'quality': 80},  # Vista enfocada
+    'preview': {'size': (320, 240), 'fps': 10, 'quality': 75},
+    'grid': {'size': (160, 120), 'fps': 5, 'quality': 70},  # Rejillas y miniaturas
+}
+MOSAIC_TILE_SIZE = (320, 240)  # Celda de cada cámara en /api/cameras/mosaic
+MOSAIC_FPS = 5
+MOSAIC_JPEG_QUALITY = 70
+STREAM_KEEPALIVE = 5.0  # Segundos sin frame nuevo antes de reenviar el último
+STREAM_IDLE_TIMEOUT = 30.0  # Segundos sin frames disponibles antes de cerrar un stream MJPEG
+
+# Superposición de detecciones: 'client' (cajas en JSON dibujadas en el navegador
+# sobre el stream compartido) o 'server' (dibujadas y recodificadas por cliente)
+DETECTION_OVERLAY_MODE = 'client'
+OVERLAY_POLL_WAIT = 0.5  # Segundos máximos que /detection/overlay espera un mensaje nuevo
+
+# Stream H.264 (MP4 fragmentado) como alternativa al MJPEG; requiere ffmpeg con libx264
+H264_STREAM_ENABLED = False
+FFMPEG_PATH = 'ffmpeg'
+H264_STREAM_FPS = 15
+H264_STREAM_BITRATE = '500k'
+H264_GOP_SECONDS = 1.0  # Intervalo entre keyframes (latencia mínima para un cliente nuevo)
+H264_IDLE_TIMEOUT = 30.0  # Segundos sin clientes antes de detener ffmpeg
+
+# Configuración de monitoreo
+METRICS_ENABLED = True  # Exponer métricas Prometheus en /metrics
 
 # Configuración de seguridad
 SECRET_KEY = 'dev-key-change-in-production'
-SESSION_TYPE = 'filesystem'
\ No newline at end of file
+SESSION_TYPE = 'filesystem'
+USER_CACHE_TTL = 300  # Segundos que un usuario autenticado permanece en caché
\ No newline at end of file
@@ -1,6 +1,7 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, Response, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, Response, jsonify, send_from_directory
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from datetime import datetime
+from functools import wraps
 import os, sys, traceback, time
 import cv2
 import logging
@@ -16,8 +17,16 @@ root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(root_dir)
 logger.info(f"Directorio raíz agregado al path: {root_dir}")
 
-from models.models import db, User, Detection, Camera, Stats, SystemConfig
+from models.models import db, User, Detection, Camera, Stats, SystemConfig, user_cache
 from core.capture_optimized import CameraCapture
+from core import metrics
+from core.profiling import StackSampler, tracer, profile_lock
+from core.thread_budget import thread_budget
+from core.model_registry import ModelRegistry
+from core.clip_recorder import list_clips
+from core.snapshot_store import get_snapshot_store, image_mimetype
+from core.h264_stream import get_h264_encoder, ffmpeg_available
+from core.mosaic import Mosaic
 
 # Inicializar el diccionario de cámaras activas
 active_cameras = {}
@@ -25,6 +34,10 @@ active_cameras = {}
 # Diccionario para almacenar los detectores activos
 active_detectors = {}
 
+# Mosaico compartido de las cámaras activas
+mosaic = Mosaic(lambda: list(active_cameras.values()), tile_size=MOSAIC_TILE_SIZE,
+                fps=MOSAIC_FPS, quality=MOSAIC_JPEG_QUALITY)
+
 # Crear la aplicación Flask
 app = Flask(__name__)
 
@@ -39,9 +52,25 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 db.init_app(app)
 
+user_cache.ttl = USER_CACHE_TTL
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Evita consultar la base de datos en cada petición autenticada
+    return user_cache.get(int(user_id))
+
+def admin_required(view):
+    """Restringe una vista a usuarios autenticados con rol admin"""
+    @wraps(view)
+    @login_required
+    def wrapped(*args, **kwargs):
+        if not current_user.is_admin():
+            return jsonify({
+                'success': False,
+                'error': 'Se requieren permisos de administrador'
+            }), 403
+        return view(*args, **kwargs)
+    return wrapped
 
 @app.route('/')
 @login_required
@@ -77,12 +106,12 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    return render_template('dashboard.html')
+    return render_template('dashboard.html', active_count=len(active_cameras))
 
 @app.route('/cameras')
 @login_required
 def cameras():
-    return render_template('cameras.html')
+    return render_template('cameras.html', h264_enabled=h264_enabled())
 
 @app.route('/api/cameras/list', methods=['GET'])
 @login_required
@@ -248,7 +277,8 @@ def stop_camera(camera_id):
 @app.route('/detection')
 @login_required
 def detection():
-    return render_template('detection.html')
+    return render_template('detection.html', overlay_mode=DETECTION_OVERLAY_MODE,
+                           h264_enabled=h264_enabled())
 
 @app.route('/analysis')
 @login_required
@@ -257,45 +287,290 @@ def analysis():
     daily_stats = Stats.get_daily_stats(days=7)
     return render_template('analysis.html', stats=stats, daily_stats=daily_stats)
 
-@app.route('/api/camera/<int:camera_id>/feed')
-@login_required
-def camera_feed(camera_id):
-    """Proporciona el video feed de una cámara específica"""
-    def generate():
-        app.logger.info(f"\n=== Iniciando feed de cámara {camera_id} ===")
-        
-        # Verificar que la cámara está activa
-        if camera_id not in active_cameras:
-            app.logger.error(f"Cámara {camera_id} no está activa")
-            return
-            
-        camera = active_cameras[camera_id]
-        
-        app.logger.info(f"Feed iniciado para cámara {camera_id}")
+def mjpeg_frames(source, fps, camera, stream):
+    """
+    Genera las partes multipart de un stream MJPEG a partir de `source`,
+    que devuelve (seq, jpeg) ya codificado y compartido entre clientes. Cada
+    frame se envía una sola vez y a lo sumo `fps` veces por segundo.
+    
+    Si no llega un frame nuevo en STREAM_KEEPALIVE segundos se reenvía el
+    último, para mantener viva la conexión y detectar clientes que se fueron;
+    si `source` no devuelve frames durante STREAM_IDLE_TIMEOUT segundos (p. ej.
+    el mosaico sin cámaras activas) el stream se cierra.
+    """
+    interval = 1.0 / fps
+    last_seq = None
+    last_jpeg = None
+    last_sent = time.monotonic()
+    idle_since = None
+    metrics.ACTIVE_VIEWERS.inc(camera=camera, stream=stream)
+    try:
         while True:
-            try:
-                # Obtener frame de la cámara
-                jpeg_data = camera.get_jpeg(quality=80)
-                
-                if jpeg_data is None:
-                    app.logger.warning(f"No se pudo obtener frame de cámara {camera_id}")
-                    time.sleep(0.1)
-                    continue
-                    
+            started = time.monotonic()
+            seq, jpeg_data = source()
+            if jpeg_data is None:
+                if idle_since is None:
+                    idle_since = started
+                    app.logger.warning("No se pudo obtener frame para el stream %s de %s", stream, camera)
+                elif started - idle_since > STREAM_IDLE_TIMEOUT:
+                    app.logger.info("Stream %s de %s sin frames durante %ss, cerrando",
+                                    stream, camera, STREAM_IDLE_TIMEOUT)
+                    return
+                seq, jpeg_data = last_seq, last_jpeg
+            else:
+                idle_since = None
+            if jpeg_data is not None and (seq != last_seq or started - last_sent >= STREAM_KEEPALIVE):
+                last_seq, last_jpeg, last_sent = seq, jpeg_data, started
                 # Enviar frame
                 yield (b'--frame\r\n'
                        b'Content-Type: image/jpeg\r\n\r\n' + jpeg_data + b'\r\n\r\n')
-                       
-            except Exception as e:
-                app.logger.error(f"Error en feed de cámara {camera_id}: {str(e)}")
-                app.logger.error(traceback.format_exc())
-                break
-                
-        app.logger.info(f"=== Feed de cámara {camera_id} terminado ===")
-            
-    return Response(generate(),
+                metrics.STREAM_BYTES.inc(len(jpeg_data), camera=camera, stream=stream)
+            time.sleep(max(0.0, (interval if idle_since is None else 0.5) - (time.monotonic() - started)))
+    finally:
+        # Se ejecuta también cuando el cliente cierra la conexión
+        metrics.ACTIVE_VIEWERS.dec(camera=camera, stream=stream)
+
+@app.route('/api/camera/<int:camera_id>/feed')
+@login_required
+def camera_feed(camera_id):
+    """
+    Proporciona el video feed de una cámara específica.
+    
+    El parámetro `profile` elige el substream (STREAM_PROFILES), p. ej.
+    'grid' para miniaturas de baja resolución; por defecto 'full'.
+    """
+    profile_name = request.args.get('profile', 'full')
+    profile = STREAM_PROFILES.get(profile_name)
+    if profile is None:
+        return jsonify({'success': False, 'error': f'Perfil de stream desconocido: {profile_name}'}), 400
+    
+    # Verificar que la cámara está activa
+    if camera_id not in active_cameras:
+        app.logger.error(f"Cámara {camera_id} no está activa")
+        return jsonify({'success': False, 'error': f'La cámara {camera_id} no está activa'}), 404
+        
+    camera = active_cameras[camera_id]
+    app.logger.info(f"Feed '{profile_name}' iniciado para cámara {camera_id}")
+    
+    def source():
+        return camera.latest_jpeg(profile['quality'], profile.get('size'))
+    
+    stream = 'feed' if profile_name == 'full' else f'feed_{profile_name}'
+    return Response(mjpeg_frames(source, profile['fps'], camera_id, stream),
                    mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/api/cameras/mosaic')
+@login_required
+def cameras_mosaic():
+    """Un solo stream con todas las cámaras activas en rejilla"""
+    return Response(mjpeg_frames(mosaic.latest_jpeg, MOSAIC_FPS, 'mosaic', 'mosaic'),
+                   mimetype='multipart/x-mixed-replace; boundary=frame')
+
+def h264_enabled():
+    return H264_STREAM_ENABLED and ffmpeg_available(FFMPEG_PATH)
+
+@app.route('/api/camera/<int:camera_id>/stream.mp4')
+@login_required
+def camera_h264_stream(camera_id):
+    """Video de la cámara en H.264 (MP4 fragmentado), codificado una vez para todos los clientes"""
+    if not h264_enabled():
+        return jsonify({'success': False, 'error': 'Stream H.264 no disponible'}), 404
+    if camera_id not in active_cameras:
+        return jsonify({'success': False, 'error': f'La cámara {camera_id} no está activa'}), 404
+    
+    encoder = get_h264_encoder(
+        active_cameras[camera_id],
+        fps=H264_STREAM_FPS,
+        bitrate=H264_STREAM_BITRATE,
+        gop_seconds=H264_GOP_SECONDS,
+        ffmpeg_path=FFMPEG_PATH,
+        idle_timeout=H264_IDLE_TIMEOUT
+    )
+    response = Response(encoder.stream(), mimetype='video/mp4')
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Stream-Codec'] = encoder.codec
+    return response
+
+@app.route('/api/camera/<int:camera_id>/clips')
+@login_required
+def camera_clips(camera_id):
+    """Clips de evidencia guardados para una cámara"""
+    return jsonify({'success': True, 'clips': list_clips(CLIPS_DIR, camera_id)})
+
+@app.route('/api/clips/<path:name>')
+@login_required
+def download_clip(name):
+    """Descarga un clip de evidencia"""
+    return send_from_directory(CLIPS_DIR, name, as_attachment=True)
+
+@app.route('/api/snapshots/<day>/<key>')
+@login_required
+def detection_snapshot(day, key):
+    """Miniatura de una detección (contenido inmutable: caché larga)"""
+    if request.if_none_match.contains(key):
+        return Response(status=304)
+    store = get_snapshot_store(SNAPSHOTS_DIR, size=SNAPSHOT_SIZE, fmt=SNAPSHOT_FORMAT,
+                               quality=SNAPSHOT_QUALITY, workers=SNAPSHOT_WORKERS,
+                               retention_days=SNAPSHOT_RETENTION_DAYS,
+                               max_bytes=SNAPSHOT_MAX_MB * 1024 * 1024,
+                               dedup_radius=SNAPSHOT_DEDUP_RADIUS)
+    data = store.get(f"{day}/{key}")
+    if data is None:
+        return jsonify({'success': False, 'error': 'Miniatura no encontrada'}), 404
+    response = Response(data, mimetype=image_mimetype(data))
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    response.set_etag(key)
+    return response
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Expone las métricas del pipeline en formato Prometheus"""
+    if not METRICS_ENABLED:
+        return Response('Métricas deshabilitadas\n', status=404, mimetype='text/plain')
+    return Response(metrics.registry.expose(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/admin/profile', methods=['POST'])
+@admin_required
+def profile_system():
+    """Muestrea las pilas de los threads durante N segundos (formato colapsado)"""
+    seconds = min(request.args.get('seconds', 10, type=float), 120)
+    # Un intervalo de 0 o negativo dejaría al muestreador sin pausas
+    interval = max(0.001, min(request.args.get('interval', 0.005, type=float), 1.0))
+    groups = request.args.get('threads')
+    
+    if not seconds > 0:
+        return jsonify({
+            'success': False,
+            'error': 'La duración debe ser mayor que 0 segundos'
+        }), 400
+    
+    if not profile_lock.acquire(blocking=False):
+        return jsonify({
+            'success': False,
+            'error': 'Ya hay una sesión de profiling en curso'
+        }), 409
+    try:
+        app.logger.info(f"Profiling de {seconds}s iniciado por {current_user.username}")
+        sampler = StackSampler(
+            interval=interval,
+            groups=groups.split(',') if groups else None
+        )
+        collapsed = sampler.run(seconds)
+    finally:
+        profile_lock.release()
+    
+    return Response(collapsed, mimetype='text/plain', headers={
+        'Content-Disposition': f'attachment; filename=profile_{int(time.time())}.folded'
+    })
+
+@app.route('/api/admin/trace', methods=['POST'])
+@admin_required
+def trace_pipeline():
+    """Registra spans por etapa durante N segundos y devuelve un Chrome Trace"""
+    seconds = min(request.args.get('seconds', 5, type=float), 60)
+    
+    if not seconds > 0:
+        return jsonify({
+            'success': False,
+            'error': 'La duración debe ser mayor que 0 segundos'
+        }), 400
+    
+    if not profile_lock.acquire(blocking=False):
+        return jsonify({
+            'success': False,
+            'error': 'Ya hay una sesión de profiling en curso'
+        }), 409
+    try:
+        app.logger.info(f"Traza de {seconds}s iniciada por {current_user.username}")
+        tracer.start(seconds)
+        time.sleep(seconds)
+        tracer.stop()
+        trace = tracer.chrome_trace()
+    finally:
+        profile_lock.release()
+    
+    return Response(trace, mimetype='application/json', headers={
+        'Content-Disposition': f'attachment; filename=trace_{int(time.time())}.json'
+    })
+
+def _rollout_targets(data):
+    """Detectores afectados: el de camera_id o todos los activos."""
+    camera_id = data.get('camera_id')
+    if camera_id is None:
+        return dict(active_detectors)
+    detector = active_detectors.get(int(camera_id))
+    return {int(camera_id): detector} if detector is not None else {}
+
+@app.route('/api/admin/models', methods=['GET'])
+@admin_required
+def models_status():
+    """Modelo activo, cambio en curso y evaluación en sombra por detector"""
+    return jsonify({
+        'success': True,
+        'detectors': [d.rollout_status() for d in list(active_detectors.values())]
+    })
+
+@app.route('/api/admin/models/registry', methods=['GET'])
+@admin_required
+def models_registry():
+    """Ejecuciones de entrenamiento indexadas con sus métricas y hash de pesos"""
+    runs = ModelRegistry(RUNS_DIR, MODEL_REGISTRY_DIR).scan()
+    return jsonify({'success': True, 'runs': runs})
+
+@app.route('/api/admin/models/swap', methods=['POST'])
+@admin_required
+def swap_model():
+    """Carga un modelo en segundo plano y lo activa entre frames sin detener la detección"""
+    data = request.get_json(silent=True) or {}
+    model_path = data.get('model_path')
+    if not model_path and data.get('family'):
+        # Último modelo de la familia que pasa el umbral del registro
+        entry = ModelRegistry(RUNS_DIR, MODEL_REGISTRY_DIR).latest(
+            data['family'], float(data.get('min_score', YOLO_MODEL_MIN_SCORE)))
+        model_path = entry['weights'] if entry else None
+    if not model_path:
+        return jsonify({'success': False, 'error': 'No se especificó model_path o ningún modelo pasa'}), 400
+    targets = _rollout_targets(data)
+    if not targets:
+        return jsonify({'success': False, 'error': 'No hay detectores activos'}), 404
+    
+    app.logger.info(f"Cambio de modelo a {model_path} solicitado por {current_user.username}")
+    started = {camera_id: detector.swap_model(model_path)
+               for camera_id, detector in targets.items()}
+    return jsonify({
+        'success': all(started.values()),
+        'started': started
+    }), 202
+
+@app.route('/api/admin/models/shadow', methods=['POST', 'DELETE'])
+@admin_required
+def shadow_model():
+    """Inicia (POST) o detiene (DELETE) la evaluación en sombra de un modelo candidato"""
+    data = request.get_json(silent=True) or {}
+    targets = _rollout_targets(data)
+    if not targets:
+        return jsonify({'success': False, 'error': 'No hay detectores activos'}), 404
+    
+    if request.method == 'DELETE':
+        reports = {camera_id: detector.stop_shadow()
+                   for camera_id, detector in targets.items()}
+        return jsonify({'success': True, 'reports': reports})
+    
+    model_path = data.get('model_path')
+    if not model_path:
+        return jsonify({'success': False, 'error': 'No se especificó model_path'}), 400
+    sample_rate = float(data.get('sample_rate', SHADOW_SAMPLE_RATE))
+    if not 0 < sample_rate <= 1:
+        return jsonify({'success': False, 'error': 'sample_rate debe estar en (0, 1]'}), 400
+    
+    app.logger.info(f"Evaluación en sombra de {model_path} solicitada por {current_user.username}")
+    started = {camera_id: detector.start_shadow(model_path, sample_rate)
+               for camera_id, detector in targets.items()}
+    return jsonify({
+        'success': all(started.values()),
+        'started': started
+    }), 202
+
 @app.route('/config')
 @login_required
 def config():
@@ -394,38 +669,70 @@ def detection_stream(camera_id):
         detector = active_detectors[camera_id]
         
         app.logger.info(f"Stream iniciado para cámara {camera_id}")
-        while True:
-            try:
-                # Obtener frame con detecciones
-                frame = camera.get_frame()
-                if frame is None:
-                    app.logger.warning(f"No se pudo obtener frame de cámara {camera_id}")
-                    time.sleep(0.1)
-                    continue
-                    
-                # Dibujar detecciones
-                frame_with_detections = detector.draw_detections(frame)
-                
-                # Codificar frame
-                success, jpg = cv2.imencode('.jpg', frame_with_detections, [cv2.IMWRITE_JPEG_QUALITY, 80])
-                if not success:
-                    app.logger.warning("Error al codificar frame")
-                    continue
+        metrics.ACTIVE_VIEWERS.inc(camera=camera_id, stream='detection')
+        try:
+            while True:
+                try:
+                    # Obtener frame con detecciones
+                    frame = camera.get_frame()
+                    if frame is None:
+                        app.logger.warning("No se pudo obtener frame de cámara %s", camera_id)
+                        time.sleep(0.1)
+                        continue
+                        
+                    # Dibujar detecciones
+                    with metrics.DRAW_SECONDS.time(camera=camera_id), \
+                            tracer.span('draw', camera=camera_id):
+                        frame_with_detections = detector.draw_detections(frame)
                     
-                # Enviar frame
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + jpg.tobytes() + b'\r\n\r\n')
-                       
-            except Exception as e:
-                app.logger.error(f"Error en stream de cámara {camera_id}: {str(e)}")
-                app.logger.error(traceback.format_exc())
-                break
+                    # Codificar frame
+                    with metrics.ENCODE_SECONDS.time(camera=camera_id), \
+                            tracer.span('encode', camera=camera_id):
+                        success, jpg = cv2.imencode('.jpg', frame_with_detections, [cv2.IMWRITE_JPEG_QUALITY, 80])
+                    if not success:
+                        app.logger.warning("Error al codificar frame")
+                        continue
+                        
+                    # Enviar frame
+                    yield (b'--frame\r\n'
+                           b'Content-Type: image/jpeg\r\n\r\n' + jpg.tobytes() + b'\r\n\r\n')
+                           
+                except Exception as e:
+                    app.logger.error(f"Error en stream de cámara {camera_id}: {str(e)}")
+                    app.logger.error(traceback.format_exc())
+                    break
+        finally:
+            metrics.ACTIVE_VIEWERS.dec(camera=camera_id, stream='detection')
                 
         app.logger.info(f"=== Stream de detección para cámara {camera_id} terminado ===")
             
     return Response(generate(),
                    mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/api/camera/<int:camera_id>/detection/overlay')
+@login_required
+def detection_overlay(camera_id):
+    """
+    Cajas del último frame procesado para dibujarlas en el cliente.
+    
+    Petición corta: espera como mucho OVERLAY_POLL_WAIT segundos un mensaje
+    posterior al frame `after` y responde 204 si no llega ninguno, para no
+    ocupar un hilo de gunicorn mientras el cliente mira el stream.
+    """
+    detector = active_detectors.get(camera_id)
+    if detector is None:
+        return jsonify({'success': False, 'error': f'No hay detector activo para la cámara {camera_id}'}), 404
+    
+    after = request.args.get('after', type=int)
+    seq, message = detector.overlay.wait(after, timeout=OVERLAY_POLL_WAIT)
+    if message is None:
+        response = Response(status=204)
+    else:
+        response = Response(message, mimetype='application/json')
+        metrics.STREAM_BYTES.inc(len(message), camera=camera_id, stream='overlay')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @app.route('/api/detection/stop', methods=['POST'])
 @login_required
 def stop_detection():
@@ -461,6 +768,8 @@ def stop_detection():
             if success:
                 # Solo eliminar del diccionario si se detuvo exitosamente
                 del active_detectors[camera_id]
+                if thread_budget is not None:
+                    thread_budget.unregister(camera_id)
                 return jsonify({
                     'success': True,
                     'message': 'Detección detenida exitosamente'
@@ -545,6 +854,8 @@ def start_detection():
                 if not active_detectors[camera_id].stop():
                     app.logger.error(f"Error al detener detector existente para cámara {camera_id}")
                 del active_detectors[camera_id]
+                if thread_budget is not None:
+                    thread_budget.unregister(camera_id)
                 app.logger.info(f"Detector anterior detenido y eliminado para cámara {camera_id}")
             except Exception as e:
                 app.logger.error(f"Error al detener detector existente: {str(e)}")
@@ -586,6 +897,9 @@ def start_detection():
                 
             app.logger.info("Detector iniciado correctamente")
             active_detectors[camera_id] = detector
+            if thread_budget is not None:
+                # Reparte los núcleos entre todos los detectores activos
+                thread_budget.register(camera_id, detector)
             
             return jsonify({
                 'success': True,
@@ -621,7 +935,7 @@ def init_db():
         admin_user = User.query.filter_by(username='admin').first()
         if not admin_user:
             print("Creando usuario admin...")
-            admin = User(username='admin')
+            admin = User(username='admin', role='admin')
             admin.set_password('admin')  # Cambiar esta contraseña en producción
             db.session.add(admin)
             try:
@@ -633,6 +947,11 @@ def init_db():
                 raise
         else:
             print("El usuario admin ya existe")
+            if admin_user.role != 'admin':
+                # Bases creadas antes de que existieran los roles
+                admin_user.role = 'admin'
+                db.session.commit()
+                print("Rol admin asignado al usuario admin")
         
         # Verificar configuración del sistema
         if not SystemConfig.query.first():
@@ -163,6 +163,27 @@ document.addEventListener('DOMContentLoaded', function() {
     let activeCamera = null;
     let retryCount = 0;
     const maxRetries = 3;
+    // Stream H.264 si el servidor lo ofrece y el navegador lo reproduce; si no, MJPEG
+    const useH264 = document.getElementById('camera-grid').dataset.h264 === 'true' && h264Supported();
+    
+    function slotInUse(slotId) {
+        return document.getElementById(`camera-${slotId}-stream`).style.display === 'block' ||
+            document.getElementById(`camera-${slotId}-video`).style.display === 'block';
+    }
+    
+    async function startH264(cameraId, slotId) {
+        const placeholder = document.getElementById(`camera-${slotId}-placeholder`);
+        const video = document.getElementById(`camera-${slotId}-video`);
+        const status = document.getElementById(`camera-${slotId}-status`);
+        const player = await playH264Stream(video, `/api/camera/${cameraId}/stream.mp4?t=${Date.now()}`, (error) => {
+            console.error('Error en el stream H.264:', error);
+            status.textContent = 'Error';
+        });
+        placeholder.style.display = 'none';
+        video.style.display = 'block';
+        status.textContent = 'Conectada';
+        return player;
+    }
     
     // Cargar la lista de cámaras al inicio
     loadAvailableCameras();
@@ -199,7 +220,7 @@ document.addEventListener('DOMContentLoaded', function() {
             if (data.success) {
                 // Encontrar el siguiente slot de cámara disponible
                 let slotId = 1;
-                while (document.getElementById(`camera-${slotId}-stream`).style.display === 'block' && slotId <= 2) {
+                while (slotId <= 2 && slotInUse(slotId)) {
                     slotId++;
                 }
                 
@@ -212,6 +233,17 @@ document.addEventListener('DOMContentLoaded', function() {
                 const placeholder = document.getElementById(`camera-${slotId}-placeholder`);
                 const stream = document.getElementById(`camera-${slotId}-stream`);
                 
+                if (useH264) {
+                    try {
+                        const player = await startH264(cameraId, slotId);
+                        activeCamera = {id: cameraId, slot: slotId, player: player};
+                        showMessage('Cámara iniciada exitosamente', 'success');
+                        return;
+                    } catch (error) {
+                        console.error('Stream H.264 no disponible, usando MJPEG:', error);
+                    }
+                }
+                
                 if (placeholder && stream) {
                     // Primero configurar los eventos
                     stream.onload = function() {
@@ -234,7 +266,7 @@ document.addEventListener('DOMContentLoaded', function() {
                             console.log(`Reintento ${retryCount} de ${maxRetries}`);
                             setTimeout(() => {
                                 console.log('Reintentando conexión...');
-                                stream.src = `/api/camera/${cameraId}/feed?retry=${retryCount}&t=${new Date().getTime()}`;
+                                stream.src = `/api/camera/${cameraId}/feed?profile=preview&retry=${retryCount}&t=${new Date().getTime()}`;
                             }, 2000);
                         } else {
                             showMessage('No se pudo establecer la conexión con la cámara después de varios intentos.', 'danger');
@@ -244,7 +276,8 @@ document.addEventListener('DOMContentLoaded', function() {
                     
                     // Luego intentar cargar el stream
                     console.log(`Intentando cargar stream de cámara ${cameraId} en slot ${slotId}...`);
-                    stream.src = `/api/camera/${cameraId}/feed?t=${new Date().getTime()}`;
+                    // Las celdas usan el substream reducido, no el stream completo
+                    stream.src = `/api/camera/${cameraId}/feed?profile=preview&t=${new Date().getTime()}`;
                     activeCamera = {id: cameraId, slot: slotId};
                     showMessage('Cámara iniciada exitosamente', 'success');
                 }
@@ -273,11 +306,16 @@ document.addEventListener('DOMContentLoaded', function() {
                     // Ocultar el stream
                     const placeholder = document.getElementById(`camera-${activeCamera.slot}-placeholder`);
                     const stream = document.getElementById(`camera-${activeCamera.slot}-stream`);
+                    const video = document.getElementById(`camera-${activeCamera.slot}-video`);
                     
+                    if (activeCamera.player) {
+                        activeCamera.player.stop();
+                    }
                     if (placeholder && stream) {
                         placeholder.style.display = 'flex';
                         stream.style.display = 'none';
                         stream.src = '';
+                        video.style.display = 'none';
                         document.getElementById(`camera-${activeCamera.slot}-status`).textContent = 'Desconectada';
                     }
                     activeCamera = null;
@@ -2,6 +2,9 @@
 let detectionActive = false;
 let selectedCamera = null;
 let statisticsInterval = null;
+let overlayPolling = false;
+let videoPlayer = null;
+let lastOverlay = null;
 
 // Elementos DOM
 const cameraSelect = document.getElementById('detection-camera');
@@ -10,6 +13,11 @@ const startButton = document.getElementById('start-detection');
 const stopButton = document.getElementById('stop-detection');
 const detectionStream = document.getElementById('detection-stream');
 const detectionPlaceholder = document.getElementById('detection-placeholder');
+const detectionVideo = document.getElementById('detection-video');
+const detectionCanvas = document.getElementById('detection-canvas');
+const cameraView = document.getElementById('camera-view');
+// 'client': stream sin superposiciones + cajas en JSON dibujadas en el canvas
+const clientOverlay = cameraView.dataset.overlayMode === 'client';
 
 // Función para actualizar la lista de cámaras
 async function updateCameraList() {
@@ -90,21 +98,12 @@ async function startDetection() {
         // Pequeño delay para asegurar que el detector esté listo
         await new Promise(resolve => setTimeout(resolve, 1000));
         
-        // Iniciar stream de video con detecciones
-        const streamUrl = `/api/camera/${cameraId}/detection/stream?t=${Date.now()}`;
-        console.log('Iniciando stream de detección:', streamUrl);
-        
-        // Asegurar que la imagen anterior se limpie
-        detectionStream.src = '';
-        
-        // Configurar manejadores de eventos para la imagen
-        detectionStream.onload = () => console.log('Stream cargado correctamente');
-        detectionStream.onerror = (e) => console.error('Error al cargar stream:', e);
-        
-        // Cargar nuevo stream
-        detectionStream.src = streamUrl;
-        detectionStream.classList.remove('d-none');
-        detectionPlaceholder.classList.add('d-none');
+        if (clientOverlay) {
+            await startClientOverlayView(cameraId);
+        } else {
+            // Stream con las detecciones dibujadas en el servidor
+            startImageStream(`/api/camera/${cameraId}/detection/stream?t=${Date.now()}`);
+        }
         
         // Iniciar actualización de estadísticas
         startStatisticsUpdate();
@@ -118,6 +117,130 @@ async function startDetection() {
     }
 }
 
+// Muestra un stream MJPEG en la imagen de la vista
+function startImageStream(streamUrl) {
+    console.log('Iniciando stream de detección:', streamUrl);
+    
+    // Asegurar que la imagen anterior se limpie
+    detectionStream.src = '';
+    
+    // Configurar manejadores de eventos para la imagen
+    detectionStream.onload = () => console.log('Stream cargado correctamente');
+    detectionStream.onerror = (e) => console.error('Error al cargar stream:', e);
+    
+    // Cargar nuevo stream
+    detectionStream.src = streamUrl;
+    detectionStream.classList.remove('d-none');
+    detectionPlaceholder.classList.add('d-none');
+}
+
+// Stream compartido de la cámara (H.264 si está disponible) y cajas dibujadas en el canvas
+async function startClientOverlayView(cameraId) {
+    let started = false;
+    if (cameraView.dataset.h264 === 'true' && h264Supported()) {
+        try {
+            videoPlayer = await playH264Stream(detectionVideo, `/api/camera/${cameraId}/stream.mp4?t=${Date.now()}`,
+                (error) => console.error('Error en el stream H.264:', error));
+            detectionVideo.classList.remove('d-none');
+            detectionPlaceholder.classList.add('d-none');
+            started = true;
+        } catch (error) {
+            console.error('Stream H.264 no disponible, usando MJPEG:', error);
+        }
+    }
+    if (!started) {
+        startImageStream(`/api/camera/${cameraId}/feed?t=${Date.now()}`);
+    }
+    
+    lastOverlay = null;
+    overlayPolling = true;
+    pollOverlay(cameraId);
+}
+
+// Consulta las cajas con peticiones cortas; el servidor responde 204 si no hay un frame nuevo
+async function pollOverlay(cameraId) {
+    while (overlayPolling && selectedCamera === cameraId) {
+        try {
+            const after = lastOverlay ? `?after=${lastOverlay.seq}` : '';
+            const response = await fetch(`/api/camera/${cameraId}/detection/overlay${after}`,
+                                         {cache: 'no-store'});
+            if (response.status === 200) {
+                lastOverlay = await response.json();
+                requestAnimationFrame(drawOverlay);
+            } else if (response.status !== 204) {
+                await new Promise(resolve => setTimeout(resolve, 1000));
+            }
+        } catch (error) {
+            console.error('Error al consultar las detecciones:', error);
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+    }
+}
+
+function stopClientOverlayView() {
+    overlayPolling = false;
+    if (videoPlayer) {
+        videoPlayer.stop();
+        videoPlayer = null;
+    }
+    detectionVideo.classList.add('d-none');
+    lastOverlay = null;
+    drawOverlay();
+}
+
+// Dibuja las cajas del último mensaje escaladas al área visible del stream (object-fit: contain)
+function drawOverlay() {
+    const width = detectionCanvas.clientWidth;
+    const height = detectionCanvas.clientHeight;
+    if (detectionCanvas.width !== width || detectionCanvas.height !== height) {
+        detectionCanvas.width = width;
+        detectionCanvas.height = height;
+    }
+    const ctx = detectionCanvas.getContext('2d');
+    ctx.clearRect(0, 0, width, height);
+    if (!lastOverlay) return;
+    
+    // Las coordenadas vienen en el frame procesado; el área visible depende del stream mostrado
+    const [frameW, frameH] = lastOverlay.size;
+    const mediaW = detectionVideo.videoWidth || detectionStream.naturalWidth || frameW;
+    const mediaH = detectionVideo.videoHeight || detectionStream.naturalHeight || frameH;
+    const fit = Math.min(width / mediaW, height / mediaH);
+    const offsetX = (width - mediaW * fit) / 2;
+    const offsetY = (height - mediaH * fit) / 2;
+    const scaleX = mediaW * fit / frameW;
+    const scaleY = mediaH * fit / frameH;
+    
+    ctx.font = '12px sans-serif';
+    ctx.textBaseline = 'bottom';
+    lastOverlay.boxes.forEach(([x1, y1, x2, y2, type, originalClass, confidence]) => {
+        const x = offsetX + x1 * scaleX;
+        const y = offsetY + y1 * scaleY;
+        const w = (x2 - x1) * scaleX;
+        const h = (y2 - y1) * scaleY;
+        // Verde para orgánico, rojo para inorgánico, con borde negro para mejor visibilidad
+        const color = type === 'organic' ? '#00ff00' : '#ff0000';
+        ctx.lineWidth = 4;
+        ctx.strokeStyle = '#000000';
+        ctx.strokeRect(x, y, w, h);
+        ctx.lineWidth = 2;
+        ctx.strokeStyle = color;
+        ctx.strokeRect(x, y, w, h);
+        
+        const label = `${type} (${originalClass}) ${confidence.toFixed(2)}`;
+        ctx.fillStyle = '#000000';
+        ctx.fillRect(x, y - 16, ctx.measureText(label).width + 6, 16);
+        ctx.fillStyle = color;
+        ctx.fillText(label, x + 3, y - 2);
+    });
+    
+    const stats = lastOverlay.stats;
+    ctx.font = '16px sans-serif';
+    ctx.textBaseline = 'top';
+    ctx.fillStyle = '#ffffff';
+    ctx.fillText(`Total: ${stats.total} | Org: ${stats.organic} | Inorg: ${stats.inorganic}`,
+                 offsetX + 10, offsetY + 10);
+}
+
 // Función para detener la detección
 async function stopDetection() {
     try {
@@ -136,6 +259,7 @@ async function stopDetection() {
         console.error('Error al detener:', error);
     } finally {
         // Limpiar UI
+        stopClientOverlayView();
         detectionActive = false;
         selectedCamera = null;
         detectionStream.src = '';
@@ -226,6 +350,7 @@ document.addEventListener('DOMContentLoaded', () => {
 });
 
 startButton.addEventListener('click', startDetection);
+window.addEventListener('resize', () => requestAnimationFrame(drawOverlay));
 stopButton.addEventListener('click', stopDetection);
 
 // Actualizar valor mostrado del umbral de confianza
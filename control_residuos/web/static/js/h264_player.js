@@ -0,0 +1,71 @@
+// Reproducción del stream H.264 (MP4 fragmentado) con Media Source Extensions
+const H264_DEFAULT_CODEC = 'avc1.42E01F';
+
+function h264Supported() {
+    return 'MediaSource' in window &&
+        MediaSource.isTypeSupported(`video/mp4; codecs="${H264_DEFAULT_CODEC}"`);
+}
+
+// Conecta el elemento <video> al stream y devuelve un objeto con stop()
+async function playH264Stream(video, url, onError) {
+    const controller = new AbortController();
+    const mediaSource = new MediaSource();
+    video.src = URL.createObjectURL(mediaSource);
+    await new Promise(resolve => mediaSource.addEventListener('sourceopen', resolve, { once: true }));
+
+    const response = await fetch(url, { signal: controller.signal });
+    if (!response.ok) {
+        throw new Error(`Error HTTP: ${response.status}`);
+    }
+    const codec = response.headers.get('X-Stream-Codec') || H264_DEFAULT_CODEC;
+    const sourceBuffer = mediaSource.addSourceBuffer(`video/mp4; codecs="${codec}"`);
+    // Los fragmentos que un cliente lento salta no dejan huecos en la línea de tiempo
+    sourceBuffer.mode = 'sequence';
+
+    const pending = [];
+    const pump = () => {
+        if (!sourceBuffer.updating && pending.length) {
+            sourceBuffer.appendBuffer(pending.shift());
+        }
+    };
+    sourceBuffer.addEventListener('updateend', () => {
+        const buffered = sourceBuffer.buffered;
+        if (buffered.length) {
+            const end = buffered.end(buffered.length - 1);
+            // Mantenerse cerca del directo
+            if (end - video.currentTime > 3) {
+                video.currentTime = end - 0.5;
+            }
+            // Liberar lo ya reproducido
+            if (video.currentTime - buffered.start(0) > 30) {
+                sourceBuffer.remove(buffered.start(0), video.currentTime - 10);
+                return;
+            }
+        }
+        pump();
+    });
+
+    const reader = response.body.getReader();
+    (async () => {
+        try {
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                pending.push(value);
+                pump();
+            }
+            if (!controller.signal.aborted && onError) onError(new Error('Stream terminado'));
+        } catch (error) {
+            if (!controller.signal.aborted && onError) onError(error);
+        }
+    })();
+
+    video.play().catch(() => {});
+    return {
+        stop() {
+            controller.abort();
+            video.removeAttribute('src');
+            video.load();
+        }
+    };
+}
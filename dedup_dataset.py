@@ -0,0 +1,101 @@
+"""
+Detección y eliminación de imágenes casi duplicadas en el dataset.
+
+Agrupa las imágenes del origen por similitud de pHash, informa de los grupos
+y de cuántos cruzan splits (fuga entre train/val/test) y, con --remove, mueve
+las copias sobrantes a una carpeta de cuarentena conservando una por grupo
+(preferentemente la de train). Después conviene ejecutar build_dataset.py.
+
+Uso:
+    python dedup_dataset.py
+    python dedup_dataset.py --radius 4 --remove
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+from pathlib import Path
+
+# Agregar el directorio de control_residuos al path
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'control_residuos'))
+
+from settings import *
+from core.dataset_builder import CLASS_NAMES, IMAGE_EXTENSIONS, load_manifest
+from core.dedup import HashCache, find_clusters, choose_keeper
+
+
+def source_images(source_dir):
+    images = []
+    for cls_name in CLASS_NAMES:
+        class_dir = Path(source_dir) / cls_name
+        if class_dir.is_dir():
+            images.extend(str(p) for p in sorted(class_dir.iterdir())
+                          if p.suffix.lower() in IMAGE_EXTENSIONS)
+    return images
+
+
+def source_splits(source_dir, build_dir):
+    """Split de cada imagen de origen según el manifiesto de build_dataset.py."""
+    files = load_manifest(build_dir).get('files', {})
+    return {str(Path(source_dir) / key): entry.get('split') for key, entry in files.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deduplicación de imágenes casi idénticas")
+    parser.add_argument('--source', default=DATASET_SOURCE_DIR)
+    parser.add_argument('--build-dir', default=DATASET_BUILD_DIR,
+                        help="Dataset construido, para conocer el split de cada imagen")
+    parser.add_argument('--radius', type=int, default=DEDUP_RADIUS,
+                        help="Distancia de Hamming máxima entre pHash (de 64 bits)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--remove', action='store_true',
+                        help="Mover las copias sobrantes a la carpeta de cuarentena")
+    parser.add_argument('--quarantine', default=DEDUP_QUARANTINE_DIR)
+    parser.add_argument('--report', default=None, help="Guardar el informe en JSON")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    images = source_images(args.source)
+    hashes = HashCache(DEDUP_CACHE_PATH).update(images, workers=args.workers)
+    clusters = find_clusters(hashes, args.radius)
+    splits = source_splits(args.source, args.build_dir)
+
+    report = []
+    leaking = 0
+    for cluster in clusters:
+        keeper = choose_keeper(cluster, splits)
+        cluster_splits = {splits.get(p) for p in cluster}
+        if len(cluster_splits - {None}) > 1:
+            leaking += 1
+        report.append({
+            'keep': keeper,
+            'duplicates': [p for p in cluster if p != keeper],
+            'splits': sorted(s for s in cluster_splits if s),
+        })
+
+    duplicates = sum(len(r['duplicates']) for r in report)
+    print(f"{len(hashes)} imágenes, {len(clusters)} grupos de casi duplicados, "
+          f"{duplicates} copias sobrantes, {leaking} grupos entre splits "
+          f"({time.perf_counter() - start:.1f}s)")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Informe guardado en {args.report}")
+
+    if args.remove:
+        for entry in report:
+            for path in entry['duplicates']:
+                target = Path(args.quarantine) / Path(path).relative_to(args.source)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(path, target)
+        print(f"✅ {duplicates} imágenes movidas a {args.quarantine}; "
+              f"ejecute build_dataset.py para actualizar los splits")
+
+
+if __name__ == '__main__':
+    main()
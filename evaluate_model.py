@@ -0,0 +1,95 @@
+"""
+Evaluación de un modelo sobre el split de test del dataset YOLO.
+
+Calcula precisión, recall y AP por clase, mAP50 / mAP50-95 y la matriz de
+confusión orgánico/inorgánico. Las predicciones crudas se guardan en caché
+por (hash del modelo, hash de la imagen, imgsz), de modo que evaluar otros
+umbrales de confianza u otro mapeo de clases no repite la inferencia.
+
+Uso:
+    python evaluate_model.py
+    python evaluate_model.py --model runs/detect/waste_detector3/weights/best.pt --conf 0.1 0.2 0.3 0.4 0.5
+    python evaluate_model.py --mapping mapeo.json --output eval.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+from ultralytics import YOLO
+
+# Agregar el directorio de control_residuos al path
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'control_residuos'))
+
+from settings import *
+from core.evaluation import load_split, predict_split, evaluate
+from core.model_registry import ModelRegistry
+
+
+def print_report(report):
+    print(f"\nConfianza {report['confidence']:.2f}: precisión={report['precision']:.3f} "
+          f"recall={report['recall']:.3f} mAP50={report['map50']:.3f} mAP50-95={report['map50_95']:.3f}")
+    print(f"{'clase':>10} {'etiquetas':>9} {'P':>6} {'R':>6} {'AP50':>6} {'AP50-95':>8}")
+    for name, m in report['classes'].items():
+        ap50 = f"{m['ap50']:.3f}" if m['ap50'] is not None else '-'
+        ap = f"{m['ap50_95']:.3f}" if m['ap50_95'] is not None else '-'
+        print(f"{name:>10} {m['labels']:>9} {m['precision']:>6.3f} {m['recall']:>6.3f} {ap50:>6} {ap:>8}")
+    print("Orgánico/inorgánico (real -> predicho):")
+    for actual, row in report['waste_type_confusion'].items():
+        print(f"  {actual:>10}: {row}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluación del modelo con predicciones en caché")
+    parser.add_argument('--model', default=YOLO_MODEL_PATH)
+    parser.add_argument('--split', default=os.path.join(DATASET_BUILD_DIR, 'images', 'test'))
+    parser.add_argument('--imgsz', type=int, default=None)
+    parser.add_argument('--conf', type=float, nargs='+', default=[YOLO_CONFIDENCE],
+                        help="Uno o varios umbrales de confianza a evaluar")
+    parser.add_argument('--mapping', default=None,
+                        help="JSON {clase: organic|inorganic} (por defecto WASTE_CLASS_MAPPING)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--batch', type=int, default=16)
+    parser.add_argument('--output', default=None, help="Guardar el informe en JSON")
+    args = parser.parse_args()
+
+    class_mapping = WASTE_CLASS_MAPPING
+    if args.mapping:
+        with open(args.mapping, 'r', encoding='utf-8') as f:
+            class_mapping = json.load(f)
+
+    samples = load_split(args.split, DATASET_BUILD_DIR)
+    if not samples:
+        print(f"❌ Error: No se encontraron imágenes en {args.split}")
+        return
+    names = {int(k): v.lower() for k, v in YOLO(args.model).names.items()}
+
+    start = time.perf_counter()
+    predictions = predict_split(args.model, samples, args.imgsz, EVAL_CACHE_DIR,
+                                workers=args.workers, batch=args.batch)
+    print(f"{len(samples)} imágenes, predicciones listas en {time.perf_counter() - start:.1f}s")
+
+    reports = [evaluate(samples, predictions, names, conf, class_mapping) for conf in args.conf]
+    for report in reports:
+        print_report(report)
+
+    if len(reports) > 1:
+        def f1(r):
+            return 2 * r['precision'] * r['recall'] / max(r['precision'] + r['recall'], 1e-9)
+        best = max(reports, key=f1)
+        print(f"\nMejor F1 con confianza {best['confidence']:.2f} ({f1(best):.3f})")
+
+    result = {'model': args.model, 'split': args.split, 'imgsz': args.imgsz, 'reports': reports}
+    ModelRegistry(RUNS_DIR, MODEL_REGISTRY_DIR).save_benchmark(
+        args.model, f"eval-{args.imgsz or 'default'}", result)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"✅ Informe guardado en {args.output}")
+
+
+if __name__ == '__main__':
+    main()
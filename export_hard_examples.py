@@ -0,0 +1,40 @@
+"""
+Exportación de los ejemplos difíciles capturados por los detectores.
+
+Copia los recortes del almacén a una carpeta por clase (formato de origen de
+build_dataset.py) para revisarlos y usarlos en el ajuste fino:
+
+    python export_hard_examples.py datasets/field_2026_10
+    python train_model.py finetune datasets/field_2026_10
+
+Las clases son las que predijo el modelo; conviene revisarlas antes de entrenar.
+"""
+
+import os
+import sys
+import argparse
+
+# Agregar el directorio de control_residuos al path
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'control_residuos'))
+
+from settings import *
+from core.hard_examples import HardExampleStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportación de ejemplos difíciles")
+    parser.add_argument('dest', help="Carpeta de destino (una subcarpeta por clase)")
+    parser.add_argument('--classes', nargs='+', default=None)
+    args = parser.parse_args()
+
+    store = HardExampleStore(HARD_EXAMPLES_DIR, HARD_EXAMPLES_MAX_MB * 1024 * 1024)
+    stats = store.stats()
+    count = store.export(args.dest, classes=args.classes)
+    store.stop()
+    print(f"✅ {count} recortes exportados a {args.dest} "
+          f"(almacén: {stats['items']} recortes, {stats['bytes'] / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
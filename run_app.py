@@ -14,11 +14,13 @@ sys.path.insert(0, BASE_DIR)
 # Agregar el directorio de control_residuos al path
 sys.path.insert(0, os.path.join(BASE_DIR, 'control_residuos'))
 
-# Importar configuración y app
+# Importar configuración (la app se importa en __main__: los procesos de
+# inferencia lanzados con 'spawn' vuelven a importar este módulo)
 from settings import *
-from web.app import app
 
 if __name__ == '__main__':
+    from web.app import app
+
     print("\n" + "="*60)
     print("SISTEMA DE CONTROL DE RESIDUOS")
     print("="*60)
@@ -0,0 +1,100 @@
+"""
+Barrido de hiperparámetros con successive halving en CPU.
+
+Ejecuta varias pruebas cortas en paralelo (con los núcleos repartidos entre
+ellas), detiene las peores en cada época de control según results.csv y
+registra el resultado de cada prueba en el registro de modelos.
+
+Uso:
+    python sweep_train.py --trials 12 --parallel 3 --max-epochs 18
+    python sweep_train.py --space espacio.json --eta 2
+"""
+
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+# Agregar el directorio de control_residuos al path
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'control_residuos'))
+
+from settings import *
+from core.sweep import SuccessiveHalvingSweep, sample_configs
+from core.model_registry import ModelRegistry
+from core.dataset_builder import build_dataset
+
+# Espacio de búsqueda por defecto (hiperparámetros de ultralytics)
+DEFAULT_SPACE = {
+    'imgsz': [320, 416, 512],
+    'batch': [8, 16],
+    'lr0': [0.001, 0.005, 0.01],
+    'mosaic': [0.0, 1.0],
+    'fliplr': [0.0, 0.5],
+    'hsv_v': [0.2, 0.4],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Barrido de hiperparámetros con successive halving")
+    parser.add_argument('--model', default='yolov8n.pt', help="Pesos de partida")
+    parser.add_argument('--space', default=None, help="JSON {parámetro: [valores]}")
+    parser.add_argument('--trials', type=int, default=12)
+    parser.add_argument('--parallel', type=int, default=max(1, (os.cpu_count() or 1) // 4))
+    parser.add_argument('--max-epochs', type=int, default=18)
+    parser.add_argument('--min-epochs', type=int, default=2)
+    parser.add_argument('--eta', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    space = DEFAULT_SPACE
+    if args.space:
+        with open(args.space, 'r', encoding='utf-8') as f:
+            space = json.load(f)
+
+    data = build_dataset(DATASET_SOURCE_DIR, DATASET_DIR, DATASET_BUILD_DIR)['yaml']
+    sweep_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+    sweep = SuccessiveHalvingSweep(
+        args.model, data,
+        sample_configs(space, args.trials, args.seed),
+        max_epochs=args.max_epochs,
+        min_epochs=args.min_epochs,
+        eta=args.eta,
+        parallel=args.parallel,
+        project=str(Path(RUNS_DIR) / 'detect'),
+        prefix=f'sweep_{sweep_id}',
+        trainer_path='core.train_cache.CachedDetectionTrainer' if TRAIN_CACHE_ENABLED else None
+    )
+    print(f"🚀 Barrido {sweep_id}: {len(sweep.trials)} pruebas, {args.parallel} en paralelo "
+          f"x {sweep.threads} threads, rungs {sweep.rungs}")
+
+    registry = ModelRegistry(RUNS_DIR, MODEL_REGISTRY_DIR)
+
+    finished = []
+
+    def report(trial):
+        finished.append(trial)
+        print(f"{trial.name}: {trial.status} {trial.as_dict()['rung_scores']}")
+
+    try:
+        ranking = sweep.run(on_finish=report)
+    finally:
+        # Un solo escaneo al final y el resultado de cada prueba terminada
+        # (también si el barrido se interrumpe)
+        registry.scan()
+        for trial in finished:
+            try:
+                registry.record(f"detect/{trial.name}", sweep=sweep_id, **trial.as_dict())
+            except KeyError:
+                print(f"⚠️ La prueba {trial.name} no generó una ejecución registrable")
+
+    print("\nResultados:")
+    for trial in ranking:
+        score = sweep.final_score(trial)
+        print(f"  {trial.name} {trial.status:>9} {sweep.metric}={score:.4f} {trial.params}")
+
+
+if __name__ == '__main__':
+    main()
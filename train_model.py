@@ -1,30 +1,25 @@
 from ultralytics import YOLO
 import os
+import sys
+import shutil
 from pathlib import Path
 from control_residuos.settings import *
 
-def setup_dataset_yaml():
-    """Crea el archivo de configuración YAML para el dataset"""
-    yaml_content = """path: ./datasets/garbage_classification
-train: Garbage classification/Garbage classification
-val: Garbage classification/Garbage classification
-test: Garbage classification/Garbage classification
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'control_residuos'))
+from core.model_registry import ModelRegistry
+from core.dataset_builder import build_dataset
+from core.model_registry import resolve_model_path, run_family
+from core.finetune import prepare_finetune_dataset
 
-names:
-  0: cardboard
-  1: glass
-  2: metal
-  3: paper
-  4: plastic
-  5: trash"""
-    
-    dataset_dir = Path('datasets/garbage_classification')
-    yaml_path = dataset_dir / 'dataset.yaml'
-    
-    with open(yaml_path, 'w') as f:
-        f.write(yaml_content)
+def setup_dataset_yaml():
+    """
+    Construye (o actualiza) el dataset en formato YOLO y devuelve su YAML.
     
-    return yaml_path
+    Solo se procesan las imágenes nuevas o modificadas desde la última vez.
+    """
+    summary = build_dataset(DATASET_SOURCE_DIR, DATASET_DIR, DATASET_BUILD_DIR)
+    print(f"Dataset: {summary['splits']} ({summary.get('built', 0)} imágenes nuevas)")
+    return Path(summary['yaml'])
 
 def train_waste_model():
     """Entrena un modelo YOLOv8 para detección de residuos"""
@@ -43,8 +38,15 @@ def train_waste_model():
             
         model = YOLO(str(base_model))
         
+        # Leer imágenes ya decodificadas y redimensionadas de la caché de shards
+        trainer = None
+        if TRAIN_CACHE_ENABLED:
+            from core.train_cache import CachedDetectionTrainer
+            trainer = CachedDetectionTrainer
+        
         # Entrenar con nuestro dataset
         results = model.train(
+            trainer=trainer,
             data=str(dataset_path),
             epochs=50,
             imgsz=CAMERA_WIDTH,  # Usar resolución de cámara configurada
@@ -54,20 +56,111 @@ def train_waste_model():
             conf=YOLO_CONFIDENCE  # Usar umbral de confianza configurado
         )
         
-        # Guardar modelo en carpeta models
+        # Guardar una copia en la carpeta models; los pesos se quedan en la
+        # ejecución para que el registro de modelos pueda indexarla
         models_dir = Path('models')
         models_dir.mkdir(exist_ok=True)
         
-        trained_model = Path('runs/detect/waste_detector/weights/best.pt')
+        trained_model = Path(model.trainer.save_dir) / 'weights' / 'best.pt'
         if trained_model.exists():
             final_path = models_dir / 'waste_detector.pt'
-            trained_model.rename(final_path)
+            shutil.copy2(trained_model, final_path)
             print(f"✅ Modelo guardado en {final_path}")
+            ModelRegistry(RUNS_DIR, MODEL_REGISTRY_DIR).scan()
+            print("✅ Registro de modelos actualizado")
         else:
             print("❌ Error: No se encontró el modelo entrenado")
             
     except Exception as e:
         print(f"❌ Error durante el entrenamiento: {str(e)}")
 
+def train_crop_classifier():
+    """
+    Entrena el clasificador compacto de recortes usado por PIPELINE_MODE='classify'.
+    
+    Usa directamente las carpetas train/val/test por clase del dataset, que es
+    el formato que espera ultralytics para clasificación.
+    """
+    print("🚀 Iniciando entrenamiento del clasificador de recortes...")
+    
+    try:
+        model = YOLO('yolov8n-cls.pt')
+        model.train(
+            data='datasets/garbage_classification',
+            epochs=30,
+            imgsz=CLASSIFIER_IMGSZ,
+            batch=32,
+            project='runs/classify',
+            name='waste_classifier',
+            device='cpu'
+        )
+        print("✅ Clasificador entrenado; configurar CLASSIFIER_MODEL_PATH si cambió la ruta")
+    except Exception as e:
+        print(f"❌ Error durante el entrenamiento del clasificador: {str(e)}")
+
+def finetune_waste_model(new_data_dir, epochs=FINETUNE_EPOCHS, replay_ratio=FINETUNE_REPLAY_RATIO):
+    """
+    Ajuste fino incremental del modelo en producción.
+    
+    Entrena unas pocas épocas con las muestras nuevas (una carpeta por clase)
+    más una muestra de repetición del dataset original, partiendo de los
+    pesos en producción, y registra la nueva ejecución.
+    
+    La ejecución se guarda en la familia de producción (ultralytics la
+    numera: waste_detector4, ...), así que el siguiente ajuste fino y
+    resolve_model_path la eligen si pasa YOLO_MODEL_MIN_SCORE. El origen del
+    ajuste queda en 'extra' del registro.
+    """
+    registry = ModelRegistry(RUNS_DIR, MODEL_REGISTRY_DIR)
+    # Sin YOLO_MODEL_FAMILY, la familia de YOLO_MODEL_PATH (runs/detect/<ejecución>/weights/best.pt)
+    family = YOLO_MODEL_FAMILY or run_family(Path(YOLO_MODEL_PATH).parent.parent.name)
+    base_weights = resolve_model_path(registry, family, YOLO_MODEL_MIN_SCORE, YOLO_MODEL_PATH)
+    if not Path(base_weights).exists():
+        print(f"❌ Error: No se encontró el modelo en producción en {base_weights}")
+        return
+    
+    try:
+        setup_dataset_yaml()  # El dataset original debe estar construido para la repetición
+        dataset = prepare_finetune_dataset(new_data_dir, DATASET_BUILD_DIR,
+                                           Path(DATASET_BUILD_DIR).parent / 'finetune',
+                                           replay_ratio=replay_ratio)
+        print(f"🚀 Ajuste fino desde {base_weights}: {dataset['new']} imágenes nuevas "
+              f"+ {dataset['replay']} de repetición, {epochs} épocas")
+        
+        trainer = None
+        if TRAIN_CACHE_ENABLED:
+            from core.train_cache import CachedDetectionTrainer
+            trainer = CachedDetectionTrainer
+        
+        model = YOLO(base_weights)
+        model.train(
+            trainer=trainer,
+            data=dataset['yaml'],
+            epochs=epochs,
+            lr0=FINETUNE_LR,
+            warmup_epochs=0,  # Los pesos ya están entrenados
+            project=str(Path(RUNS_DIR) / 'detect'),
+            name=family,
+            device='cpu',
+            conf=YOLO_CONFIDENCE
+        )
+        
+        run_dir = Path(model.trainer.save_dir)
+        registry.scan()
+        registry.record(f"detect/{run_dir.name}", finetune={
+            'base_weights': base_weights,
+            'new_data': str(new_data_dir),
+            'new_images': dataset['new'],
+            'replay_images': dataset['replay'],
+        })
+        print(f"✅ Modelo ajustado en {run_dir / 'weights' / 'best.pt'} y registrado")
+    except Exception as e:
+        print(f"❌ Error durante el ajuste fino: {str(e)}")
+
 if __name__ == '__main__':
-    train_waste_model()
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == 'classify':
+        train_crop_classifier()
+    elif len(sys.argv) > 2 and sys.argv[1] == 'finetune':
+        finetune_waste_model(sys.argv[2])
+    else:
+        train_waste_model()
\ No newline at end of file
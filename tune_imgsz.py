@@ -0,0 +1,168 @@
+"""
+Ajuste del tamaño de entrada del modelo según precisión y latencia.
+
+Evalúa el modelo configurado sobre el split de test del dataset a varios
+tamaños de entrada (imgsz) y backends, mide la precisión por imagen (clase
+con mayor confianza frente a la carpeta de la imagen) y la latencia en CPU,
+y escribe el perfil que WasteDetector usa para elegir el tamaño más pequeño
+que cumple INFERENCE_ACCURACY_FLOOR.
+
+Uso:
+    python tune_imgsz.py
+    python tune_imgsz.py --sizes 256 320 416 512 640 --backends pytorch onnx --limit 50
+"""
+
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+# Agregar el directorio de control_residuos al path
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'control_residuos'))
+
+from settings import *
+from core.utils import file_sha256
+from core.inference_profile import save_profile
+from core.inference_worker import predict
+from core.model_registry import ModelRegistry
+from core.dataset_builder import CLASS_NAMES, IMAGE_EXTENSIONS
+
+
+def split_images(split_dir):
+    """
+    Rutas de las imágenes del split agrupadas por clase.
+
+    Admite el formato de build_dataset.py (images/<split> con la clase en la
+    etiqueta YOLO de labels/<split>) y carpetas con una subcarpeta por clase.
+    """
+    split_dir = Path(split_dir)
+    by_class = {}
+    subdirs = [d for d in sorted(split_dir.iterdir()) if d.is_dir()]
+    if subdirs:
+        for class_dir in subdirs:
+            by_class[class_dir.name.lower()] = sorted(
+                p for p in class_dir.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+        return by_class
+    labels_dir = split_dir.parent.parent / 'labels' / split_dir.name
+    for path in sorted(split_dir.iterdir()):
+        label_path = labels_dir / (path.stem + '.txt')
+        if path.suffix.lower() not in IMAGE_EXTENSIONS or not label_path.exists():
+            continue
+        with open(label_path, 'r', encoding='utf-8') as f:
+            fields = f.read().split()
+        if fields:
+            by_class.setdefault(CLASS_NAMES[int(fields[0])], []).append(path)
+    return by_class
+
+
+def load_split(split_dir, limit=None):
+    """Carga en memoria las imágenes del split como (imagen, clase)."""
+    samples = []
+    for label, images in split_images(split_dir).items():
+        for path in images[:limit]:
+            img = cv2.imread(str(path))
+            if img is not None:
+                samples.append((img, label))
+    return samples
+
+
+def load_backend(registry, model_path, backend, imgsz):
+    """Devuelve un modelo YOLO para el backend pedido (exportando si hace falta)."""
+    if backend == 'pytorch':
+        model = YOLO(model_path)
+        model.fuse()
+        return model
+    # Los formatos exportados tienen tamaño de entrada fijo; el registro
+    # reutiliza la exportación si ya se hizo para estos mismos pesos
+    exported = registry.export(model_path, backend, imgsz)
+    return YOLO(exported, task='detect')
+
+
+def evaluate(model, samples, imgsz, warmup=3):
+    """
+    Precisión top-1 por imagen y latencias (ms) de inferencia en CPU.
+
+    Usa el mismo predict() que el detector (conversión BGR→RGB y
+    PREDICT_OPTIONS), para que el perfil refleje la inferencia en producción.
+    """
+    names = {int(k): v.lower() for k, v in model.names.items()}
+    for img, _ in samples[:warmup]:
+        predict(model, img, 0.01, imgsz=imgsz)
+
+    correct = 0
+    latencies = []
+    for img, label in samples:
+        start = time.perf_counter()
+        detections = predict(model, img, 0.01, imgsz=imgsz)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+
+        if len(detections):
+            best = int(detections[:, 4].argmax())
+            if names.get(int(detections[best, 5])) == label:
+                correct += 1
+
+    latencies = np.asarray(latencies)
+    return {
+        'accuracy': round(correct / len(samples), 4) if samples else 0.0,
+        'latency_p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'latency_p95_ms': round(float(np.percentile(latencies, 95)), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ajuste de imgsz por precisión y latencia")
+    parser.add_argument('--model', default=YOLO_MODEL_PATH)
+    parser.add_argument('--split', default=os.path.join(DATASET_BUILD_DIR, 'images', 'test'))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[256, 320, 416, 512, 640])
+    parser.add_argument('--backends', nargs='+', default=['pytorch'],
+                        help="pytorch y/o formatos de exportación de ultralytics (onnx, openvino...)")
+    parser.add_argument('--limit', type=int, default=None,
+                        help="Máximo de imágenes por clase")
+    parser.add_argument('--output', default=INFERENCE_PROFILE_PATH)
+    args = parser.parse_args()
+
+    print(f"Cargando split de test desde {args.split}...")
+    samples = load_split(args.split, args.limit)
+    if not samples:
+        print(f"❌ Error: No se encontraron imágenes en {args.split}")
+        return
+    print(f"{len(samples)} imágenes cargadas")
+
+    registry = ModelRegistry(RUNS_DIR, MODEL_REGISTRY_DIR)
+    entries = []
+    for backend in args.backends:
+        for imgsz in args.sizes:
+            try:
+                model = load_backend(registry, args.model, backend, imgsz)
+                result = evaluate(model, samples, imgsz)
+            except Exception as e:
+                print(f"❌ Error con backend={backend}, imgsz={imgsz}: {str(e)}")
+                continue
+            entry = {'backend': backend, 'imgsz': imgsz, **result}
+            entries.append(entry)
+            print(f"{backend:>10} imgsz={imgsz:<4} precisión={entry['accuracy']:.3f} "
+                  f"p50={entry['latency_p50_ms']} ms p95={entry['latency_p95_ms']} ms")
+
+    profile = {
+        'created': datetime.now().isoformat(),
+        'model': args.model,
+        'model_sha256': file_sha256(args.model),
+        'split': args.split,
+        'images': len(samples),
+        'cpu_count': os.cpu_count(),
+        'entries': entries,
+    }
+    save_profile(args.output, profile)
+    registry.save_benchmark(args.model, 'imgsz', profile)
+    print(f"✅ Perfil guardado en {args.output}")
+
+
+if __name__ == '__main__':
+    main()